@@ -0,0 +1 @@
+../src/batch_replace.py
\ No newline at end of file
@@ -0,0 +1 @@
+../src/conversion_cache.py
\ No newline at end of file
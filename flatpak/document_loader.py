@@ -0,0 +1 @@
+../src/document_loader.py
\ No newline at end of file
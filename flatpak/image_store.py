@@ -0,0 +1 @@
+../src/image_store.py
\ No newline at end of file
@@ -0,0 +1 @@
+../src/libreoffice_service.py
\ No newline at end of file
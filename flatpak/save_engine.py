@@ -0,0 +1 @@
+../src/save_engine.py
\ No newline at end of file
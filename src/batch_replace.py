@@ -0,0 +1,626 @@
+#!/usr/bin/env python3
+# batch_replace.py - search and replace across a folder of saved documents
+"""
+Folder-wide search and replace for the formats load_file understands
+(.html, .htm, .mht, .mhtml, .md, .markdown, .txt), without opening windows.
+
+Files are processed in a process pool. HTML is tokenized as it is read, so
+only text between tags is matched; tags, comments, scripts and styles are
+copied through untouched. Text is matched as it reads: character references
+are decoded first (so "A & B" finds "A &amp; B", and &nbsp; matches a space),
+and replacements are HTML-escaped before they are written. Files are read as
+UTF-8 with surrogate escapes, so bytes outside the matches are written back
+unchanged, references included.
+
+Results are remembered per query in an index in the user cache directory.
+A file whose size, modification time or content hash is unchanged since it
+was last scanned for the same query is not scanned again.
+
+Command line:
+    python3 batch_replace.py FOLDER SEARCH [REPLACEMENT] [--dry-run] ...
+
+The editor runs batches through run_batch_detached, in a `python -m
+batch_replace` child process: spawned pool workers import the main module,
+which in the app would be htmleditor.py with GTK and WebKit.
+"""
+
+import base64
+import bisect
+import codecs
+import email
+import email.policy
+import hashlib
+import html
+import json
+import os
+import quopri
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+SUPPORTED_EXTENSIONS = ('.html', '.htm', '.mht', '.mhtml', '.md', '.markdown', '.txt')
+HTML_EXTENSIONS = ('.html', '.htm')
+MHTML_EXTENSIONS = ('.mht', '.mhtml')
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_SNIPPETS = 5  # Preview snippets kept per file
+SNIPPET_CONTEXT = 30  # Characters shown on each side of a match
+INDEX_MAX_QUERIES = 20  # Queries remembered in the skip index
+
+RAW_TEXT_END = {
+    'script': re.compile(r'</script\s*>', re.IGNORECASE),
+    'style': re.compile(r'</style\s*>', re.IGNORECASE),
+}
+RAW_TEXT_START = re.compile(r'<(script|style)\b', re.IGNORECASE)
+CHARACTER_REFERENCE = re.compile(r'&(?:#[0-9]+;?|#[xX][0-9a-fA-F]+;?|[A-Za-z][A-Za-z0-9]*;?)')
+
+
+def _cache_dir():
+    """Return the application's directory under the XDG cache home"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'htmleditor')
+
+
+INDEX_PATH = os.path.join(_cache_dir(), 'batch-replace-index.json')
+
+
+# ---- Matching ----
+
+def compile_search(search, case_sensitive=False, whole_word=False, regex=False):
+    """Compile the query into a pattern over document text, as decode_text returns it"""
+    source = search if regex else re.escape(search)
+    if whole_word:
+        source = r'(?<!\w)(?:' + source + r')(?!\w)'
+    return re.compile(source, 0 if case_sensitive else re.IGNORECASE)
+
+
+def _replacement_function(replacement, regex, markup):
+    """Build the re.sub replacement for a query"""
+    if replacement is None:
+        return None
+    escape = (lambda text: html.escape(text, quote=False)) if markup else (lambda text: text)
+    if regex:
+        # Group references (\1, \g<name>) are expanded, then escaped like literal text
+        return lambda match: escape(match.expand(replacement))
+    text = escape(replacement)
+    return lambda match: text
+
+
+def decode_text(source):
+    """Decode the character references in a run of HTML text.
+
+    Returns (text, references): text has every reference decoded and no-break
+    spaces read as spaces, and references lists (text start, text end, source
+    start, source end) for each decoded reference, in order. Outside them,
+    offsets into text and source differ only by the references before them.
+    """
+    if '&' not in source:
+        return source.replace('\xa0', ' '), []
+    pieces = []
+    references = []
+    shift = 0  # Source offset minus text offset
+    last = 0
+    for match in CHARACTER_REFERENCE.finditer(source):
+        decoded = html.unescape(match.group(0))
+        if decoded == match.group(0):
+            continue  # Not a reference, just an ampersand
+        pieces.append(source[last:match.start()])
+        start = match.start() - shift
+        pieces.append(decoded)
+        references.append((start, start + len(decoded), match.start(), match.end()))
+        shift += len(match.group(0)) - len(decoded)
+        last = match.end()
+    pieces.append(source[last:])
+    return ''.join(pieces).replace('\xa0', ' '), references
+
+
+def _source_offset(references, starts, offset, end):
+    """Map an offset into decoded text back to the source.
+
+    starts holds the text start of each reference. An offset inside a
+    reference's decoded text maps to the start of the reference, or to its
+    end when end is true, so a reference is only ever replaced whole.
+    """
+    index = bisect.bisect_left(starts, offset) - 1
+    if index < 0:
+        return offset
+    text_start, text_end, source_start, source_end = references[index]
+    if offset < text_end:
+        return source_end if end else source_start
+    return offset + source_end - text_end
+
+
+def _snippet(text, start, end):
+    """Return (before, match, after) around a match, as plain text"""
+    parts = (text[max(0, start - SNIPPET_CONTEXT):start], text[start:end], text[end:end + SNIPPET_CONTEXT])
+    return [part.replace('\n', ' ') for part in parts]
+
+
+class _TextReplacer:
+    """Counts and replaces matches in runs of text, collecting preview snippets.
+
+    With markup, runs are HTML source: the pattern is matched against the
+    decoded text, and each match replaces the source it was decoded from.
+    """
+
+    def __init__(self, pattern, replace, markup):
+        self.pattern = pattern
+        self.replace = replace
+        self.markup = markup
+        self.count = 0
+        self.snippets = []
+
+    def __call__(self, source):
+        if not source:
+            return source
+        text, references = decode_text(source) if self.markup else (source, [])
+        starts = [reference[0] for reference in references]
+        output = []
+        last = 0
+        for match in self.pattern.finditer(text):
+            if match.end() == match.start():
+                continue
+            self.count += 1
+            if len(self.snippets) < MAX_SNIPPETS:
+                self.snippets.append(_snippet(text, match.start(), match.end()))
+            if self.replace is None:
+                continue
+            start = _source_offset(references, starts, match.start(), False)
+            end = _source_offset(references, starts, match.end(), True)
+            if start < last:
+                continue  # Shares a reference with the previous match
+            output.append(source[last:start])
+            output.append(self.replace(match))
+            last = end
+        if not output:
+            return source
+        output.append(source[last:])
+        return ''.join(output)
+
+
+# ---- HTML tokenization ----
+
+def _markup_end(buffer, start):
+    """Return the end of the markup token starting at buffer[start] ('<'), or -1 if incomplete"""
+    if buffer.startswith('<!--', start):
+        end = buffer.find('-->', start + 4)
+        return -1 if end == -1 else end + 3
+    raw = RAW_TEXT_START.match(buffer, start)
+    if raw:
+        # Script and style bodies are never document text
+        closing = RAW_TEXT_END[raw.group(1).lower()].search(buffer, raw.end())
+        return -1 if closing is None else closing.end()
+    end = buffer.find('>', start + 1)
+    return -1 if end == -1 else end + 1
+
+
+def iter_html_tokens(chunks):
+    """Split streamed HTML into ('text', str) and ('markup', str) tokens.
+
+    Tokens are produced as input arrives; a tag split across chunks is held
+    back until it is complete. Text runs may arrive in several pieces.
+    """
+    buffer = ''
+    chunks = iter(chunks)
+    final = False
+    while not final:
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
+        else:
+            buffer += chunk
+        pos = 0
+        while pos < len(buffer):
+            lt = buffer.find('<', pos)
+            if lt == -1:
+                yield 'text', buffer[pos:]
+                pos = len(buffer)
+                break
+            if lt > pos:
+                yield 'text', buffer[pos:lt]
+                pos = lt
+            if lt + 1 >= len(buffer) and not final:
+                break  # Need the next character to tell a tag from text
+            next_char = buffer[lt + 1:lt + 2]
+            if not (next_char.isalpha() or next_char in '/!?'):
+                # A bare "<" in text, as browsers read it
+                yield 'text', '<'
+                pos = lt + 1
+                continue
+            end = _markup_end(buffer, lt)
+            if end == -1:
+                if final:
+                    yield 'markup', buffer[lt:]
+                    pos = len(buffer)
+                break
+            yield 'markup', buffer[lt:end]
+            pos = end
+        buffer = buffer[pos:]
+
+
+def replace_in_html_tokens(tokens, replacer):
+    """Apply replacer to each text run between markup tokens; return the output pieces"""
+    output = []
+    text_run = []
+    for kind, value in tokens:
+        if kind == 'text':
+            text_run.append(value)
+            continue
+        if text_run:
+            output.append(replacer(''.join(text_run)))
+            text_run = []
+        output.append(value)
+    if text_run:
+        output.append(replacer(''.join(text_run)))
+    return output
+
+
+# ---- Per-file processing (runs in the pool) ----
+
+def _read_chunks(path, digest):
+    """Yield decoded chunks of a file, feeding the raw bytes to digest"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='surrogateescape')
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+            if digest is not None:
+                digest.update(data)
+            yield decoder.decode(data)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def file_hash(path):
+    """Return the SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def atomic_write(path, data):
+    """Replace path with data so readers see either the old or the new file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _replace_mhtml(data, pattern, replace):
+    """Replace in the HTML parts of an MHTML archive; returns (new bytes or None, replacer)"""
+    message = email.message_from_bytes(data, policy=email.policy.compat32)
+    replacer = _TextReplacer(pattern, replace, markup=True)
+    changed = False
+    for part in message.walk():
+        if part.get_content_type() != 'text/html':
+            continue
+        charset = part.get_content_charset() or 'utf-8'
+        payload = part.get_payload(decode=True) or b''
+        before = replacer.count
+        text = payload.decode(charset, errors='surrogateescape')
+        pieces = replace_in_html_tokens(iter_html_tokens([text]), replacer)
+        if replace is None or replacer.count == before:
+            continue
+        body = ''.join(pieces).encode(charset, errors='surrogateescape')
+        encoding = (part.get('Content-Transfer-Encoding') or '').lower()
+        if encoding == 'quoted-printable':
+            body = quopri.encodestring(body)
+        elif encoding == 'base64':
+            body = base64.encodebytes(body)
+        part.set_payload(body.decode('ascii', errors='surrogateescape'))
+        changed = True
+    return (message.as_bytes() if changed else None), replacer
+
+
+def process_file(path, options, known=None):
+    """Scan one file, and replace in it unless options['dry_run'] is set.
+
+    known is the file's entry from the skip index, if any. Returns a result
+    dict with the match count, preview snippets and the file's hash.
+    """
+    result = {'path': path, 'matches': 0, 'snippets': [], 'replaced': False,
+              'skipped': False, 'error': None}
+    try:
+        stat = os.stat(path)
+        result['size'] = stat.st_size
+        result['mtime_ns'] = stat.st_mtime_ns
+        dry_run = options.get('dry_run', False)
+        ext = os.path.splitext(path)[1].lower()
+        markup = ext in HTML_EXTENSIONS or ext in MHTML_EXTENSIONS
+
+        # Unchanged content needs no second look, unless it has matches to replace
+        result['sha256'] = file_hash(path)
+        if known and known.get('sha256') == result['sha256'] and (dry_run or not known.get('matches')):
+            result.update(matches=known.get('matches', 0), snippets=known.get('snippets', []), skipped=True)
+            return result
+
+        pattern = compile_search(options['search'], options.get('case_sensitive', False),
+                                 options.get('whole_word', False), options.get('regex', False))
+        replace = None if dry_run else _replacement_function(options.get('replacement'),
+                                                               options.get('regex', False), markup)
+
+        if ext in MHTML_EXTENSIONS:
+            with open(path, 'rb') as f:
+                new_data, replacer = _replace_mhtml(f.read(), pattern, replace)
+        else:
+            replacer = _TextReplacer(pattern, replace, markup)
+            if ext in HTML_EXTENSIONS:
+                pieces = replace_in_html_tokens(iter_html_tokens(_read_chunks(path, None)), replacer)
+            else:
+                pieces = [replacer(''.join(_read_chunks(path, None)))]
+            new_data = ''.join(pieces).encode('utf-8', errors='surrogateescape') if replace else None
+
+        result['matches'] = replacer.count
+        result['snippets'] = replacer.snippets
+        if replace is not None and replacer.count and new_data is not None:
+            atomic_write(path, new_data)
+            result['replaced'] = True
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+# ---- Skip index ----
+
+def _query_key(options):
+    return json.dumps([options['search'], bool(options.get('case_sensitive')),
+                       bool(options.get('whole_word')), bool(options.get('regex'))])
+
+
+def load_index(path=INDEX_PATH):
+    """Load the skip index, or an empty one"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if isinstance(index.get('queries'), dict):
+            return index
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'version': 1, 'queries': {}}
+
+
+def save_index(index, path=INDEX_PATH):
+    """Write the skip index, keeping only the most recent queries"""
+    queries = index['queries']
+    while len(queries) > INDEX_MAX_QUERIES:
+        del queries[next(iter(queries))]
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, json.dumps(index).encode('utf-8'))
+    except OSError as e:
+        print(f"Warning: Could not save batch replace index: {e}")
+
+
+# ---- Batch driver ----
+
+def find_documents(folder, extensions=SUPPORTED_EXTENSIONS):
+    """List supported files under folder, skipping hidden files and directories"""
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if not name.startswith('.') and os.path.splitext(name)[1].lower() in extensions:
+                paths.append(os.path.join(root, name))
+    return paths
+
+
+def run_batch(folder, options, jobs=None, on_result=None, cancel_event=None, index_path=INDEX_PATH):
+    """Search (and unless options['dry_run'], replace) in every document under folder.
+
+    options: search, replacement, case_sensitive, whole_word, regex, dry_run.
+    on_result is called with each file's result as it completes (from this
+    thread). Setting cancel_event stops scheduling further files.
+    Returns a summary dict.
+    """
+    dry_run = options.get('dry_run', False)
+    index = load_index(index_path)
+    key = _query_key(options)
+    known_files = index['queries'].pop(key, {})  # Re-inserted below as most recent
+    summary = {'files': 0, 'matched_files': 0, 'matches': 0, 'replaced_files': 0,
+               'skipped': 0, 'errors': 0, 'cancelled': False}
+
+    def record(result):
+        summary['files'] += 1
+        if result['error']:
+            summary['errors'] += 1
+        elif result['matches']:
+            summary['matched_files'] += 1
+            summary['matches'] += result['matches']
+        if result['replaced']:
+            summary['replaced_files'] += 1
+        if result['skipped']:
+            summary['skipped'] += 1
+
+        # Remember what a scan found; replaced files must be looked at again
+        path = result['path']
+        if result['error'] or result['replaced']:
+            known_files.pop(path, None)
+        elif 'sha256' in result:
+            known_files[path] = {key_name: result[key_name] for key_name in
+                                 ('size', 'mtime_ns', 'sha256', 'matches', 'snippets')}
+        if on_result:
+            on_result(result)
+
+    pending = []
+    for path in find_documents(folder):
+        known = known_files.get(path)
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            record({'path': path, 'matches': 0, 'snippets': [], 'replaced': False,
+                    'skipped': False, 'error': str(e)})
+            continue
+        # Same size and timestamp: trust the indexed result without reading
+        if (known and known.get('size') == stat.st_size and known.get('mtime_ns') == stat.st_mtime_ns
+                and (dry_run or not known.get('matches'))):
+            record({'path': path, 'matches': known.get('matches', 0), 'snippets': known.get('snippets', []),
+                    'replaced': False, 'skipped': True, 'error': None, **known})
+            continue
+        pending.append((path, known))
+
+    if pending:
+        # Spawned workers: forking a process that runs GTK threads is unsafe
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count(), mp_context=context) as executor:
+            futures = [executor.submit(process_file, path, options, known) for path, known in pending]
+            for future in as_completed(futures):
+                if cancel_event is not None and cancel_event.is_set():
+                    summary['cancelled'] = True
+                    for other in futures:
+                        other.cancel()
+                    break
+                record(future.result())
+
+    index['queries'][key] = known_files
+    save_index(index, index_path)
+    return summary
+
+
+def run_batch_detached(folder, options, jobs=None, on_result=None, cancel_event=None):
+    """run_batch in a `python -m batch_replace` child process
+
+    For callers whose main module is expensive to import, such as the GUI:
+    the child's pool workers then import only this module. Results come back
+    as JSON lines and on_result is called with each. Setting cancel_event
+    closes the child's stdin, which cancels it like run_batch's cancel_event.
+    Returns the summary dict.
+    """
+    cmd = [sys.executable, '-m', 'batch_replace', '--json', '--cancel-on-eof']
+    if options.get('dry_run') or options.get('replacement') is None:
+        cmd.append('--dry-run')
+    if options.get('case_sensitive'):
+        cmd.append('--case-sensitive')
+    if options.get('whole_word'):
+        cmd.append('--whole-word')
+    if options.get('regex'):
+        cmd.append('--regex')
+    if jobs:
+        cmd.append(f'--jobs={jobs}')
+    cmd += ['--', folder, options['search']]
+    if options.get('replacement') is not None:
+        cmd.append(options['replacement'])
+
+    env = dict(os.environ)
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [module_dir, env.get('PYTHONPATH')]))
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+                               encoding='utf-8', errors='surrogateescape')
+
+    def watch_cancel():
+        while process.poll() is None:
+            if cancel_event.wait(0.2):
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+                return
+
+    if cancel_event is not None:
+        threading.Thread(target=watch_cancel, daemon=True).start()
+
+    summary = None
+    for line in process.stdout:
+        try:
+            data = json.loads(line)
+        except ValueError:
+            print(line, end='')  # A warning printed by the child
+            continue
+        if 'summary' in data:
+            summary = data['summary']
+        elif on_result:
+            on_result(data)
+    process.wait()
+    if summary is None:
+        raise RuntimeError(f"batch replace exited with status {process.returncode}")
+    return summary
+
+
+# ---- Command line ----
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Search and replace text in the HTML, MHTML, Markdown and text files under a folder")
+    parser.add_argument('folder', help="folder to process (searched recursively)")
+    parser.add_argument('search', help="text to find")
+    parser.add_argument('replacement', nargs='?', help="replacement text (omit for a dry run)")
+    parser.add_argument('-n', '--dry-run', action='store_true', help="only report matches; change nothing")
+    parser.add_argument('-c', '--case-sensitive', action='store_true', help="match case")
+    parser.add_argument('-w', '--whole-word', action='store_true', help="match whole words only")
+    parser.add_argument('-r', '--regex', action='store_true',
+                        help="treat SEARCH as a regular expression (REPLACEMENT may use \\1)")
+    parser.add_argument('-j', '--jobs', type=int, help="worker processes (default: CPU count)")
+    parser.add_argument('--json', action='store_true', help="print results as JSON lines")
+    parser.add_argument('--cancel-on-eof', action='store_true',
+                        help="stop scheduling files once standard input is closed")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        parser.error(f"not a folder: {args.folder}")
+
+    options = {
+        'search': args.search,
+        'replacement': args.replacement,
+        'case_sensitive': args.case_sensitive,
+        'whole_word': args.whole_word,
+        'regex': args.regex,
+        'dry_run': args.dry_run or args.replacement is None,
+    }
+    try:
+        compile_search(args.search, args.case_sensitive, args.whole_word, args.regex)
+    except re.error as e:
+        parser.error(f"invalid regular expression: {e}")
+
+    def print_result(result):
+        if args.json:
+            print(json.dumps(result), flush=True)
+        elif result['error']:
+            print(f"{result['path']}: error: {result['error']}", file=sys.stderr)
+        elif result['matches']:
+            action = "replaced" if result['replaced'] else "matches"
+            print(f"{result['path']}: {result['matches']} {action}")
+            for before, match, after in result['snippets']:
+                print(f"    …{before}[{match}]{after}…")
+
+    cancel_event = None
+    if args.cancel_on_eof:
+        cancel_event = threading.Event()
+
+        def wait_for_eof():
+            sys.stdin.read()
+            cancel_event.set()
+
+        threading.Thread(target=wait_for_eof, daemon=True).start()
+
+    summary = run_batch(args.folder, options, jobs=args.jobs, on_result=print_result,
+                        cancel_event=cancel_event)
+    if args.json:
+        print(json.dumps({'summary': summary}))
+    else:
+        changed = "dry run" if options['dry_run'] else f"{summary['replaced_files']} changed"
+        print(f"{summary['matches']} matches in {summary['matched_files']} of {summary['files']} files "
+              f"({changed}, {summary['skipped']} unchanged since last scan, {summary['errors']} errors)")
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
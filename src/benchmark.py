@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Startup and time-to-editable benchmark for HTMLEditorApp.
+
+Launches the editor on a private headless display (Xvfb, or the GTK broadway
+backend when Xvfb is not installed), drives it through a fixed scenario and
+prints the timings as JSON:
+
+    python3 benchmark.py                    # JSON on stdout
+    python3 benchmark.py -o bench.json      # JSON written to a file
+    python3 benchmark.py --display current  # use the running session instead
+
+Scenario (all times in milliseconds):
+  first_window      process spawn -> first window created and presented
+  create_window     time spent inside create_window(), with the toolbar
+                    builders it calls broken out separately
+  load_finished     create_window() start -> WebView load-finished
+  first_keystroke   text inserted into the editor -> editorState reaching
+                    Python with modified=True (a synthetic keystroke: the
+                    text goes through execCommand('insertText'), which fires
+                    the same input path as typing)
+  second_window     create_window() -> load-finished for a second window
+  open_files        load_file() -> document fully inserted, for generated
+                    10 KB, 1 MB and 20 MB HTML files
+"""
+
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD_T0 = time.perf_counter()
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+FILE_SIZES = [("10KB", 10 * 1024), ("1MB", 1024 * 1024), ("20MB", 20 * 1024 * 1024)]
+TOOLBAR_BUILDERS = ['setup_headerbar_content', 'create_find_bar', 'create_table_toolbar']
+DEFAULT_TIMEOUT = 120  # seconds for the whole scenario
+
+
+def elapsed_ms(start, end=None):
+    """Milliseconds between two perf_counter readings, rounded for output"""
+    if end is None:
+        end = time.perf_counter()
+    return round((end - start) * 1000, 2)
+
+
+# ---------------------------------------------------------------------------
+# Parent side: start a headless display and run the scenario in a child
+# ---------------------------------------------------------------------------
+
+def start_display(kind):
+    """Start a private display server. Returns (process, extra_env) or (None, None)."""
+    display_num = 90 + os.getpid() % 100
+    if kind in ('auto', 'xvfb') and shutil.which('Xvfb'):
+        proc = subprocess.Popen(['Xvfb', f':{display_num}', '-screen', '0', '1280x1024x24', '-nolisten', 'tcp'],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        time.sleep(0.5)  # Xvfb has no readiness notification; give it a moment
+        return proc, {'DISPLAY': f':{display_num}', 'GDK_BACKEND': 'x11', 'WAYLAND_DISPLAY': ''}
+    if kind in ('auto', 'broadway'):
+        broadwayd = shutil.which('gtk4-broadwayd') or shutil.which('broadwayd')
+        if broadwayd:
+            proc = subprocess.Popen([broadwayd, f':{display_num}'],
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            time.sleep(0.5)
+            return proc, {'BROADWAY_DISPLAY': f':{display_num}', 'GDK_BACKEND': 'broadway',
+                          'WAYLAND_DISPLAY': ''}
+    return None, None
+
+
+def run_parent(args):
+    """Run the scenario in a child process and collect its JSON report"""
+    display_proc = None
+    env = dict(os.environ)
+    if args.display != 'current':
+        display_proc, display_env = start_display(args.display)
+        if display_proc is None:
+            print("Error: no headless display available (install Xvfb or gtk4-broadwayd, "
+                  "or pass --display current)", file=sys.stderr)
+            return 2
+        env.update(display_env)
+
+    # Keep the child's accessibility bus and GSettings from reaching the host session
+    env.setdefault('NO_AT_BRIDGE', '1')
+    env['HTMLEDITOR_BENCH_SPAWN'] = repr(time.time())
+
+    try:
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), '--child',
+                                '--timeout', str(args.timeout)],
+                               cwd=SRC_DIR, env=env, stdout=subprocess.PIPE,
+                               timeout=args.timeout + 30)
+    except subprocess.TimeoutExpired:
+        print("Error: benchmark child did not finish in time", file=sys.stderr)
+        return 1
+    finally:
+        if display_proc:
+            display_proc.send_signal(signal.SIGTERM)
+            display_proc.wait()
+
+    # The editor prints diagnostics on stdout; the report is the last line
+    lines = [line for line in child.stdout.decode('utf-8', 'replace').splitlines() if line.strip()]
+    try:
+        report = json.loads(lines[-1])
+    except (IndexError, ValueError):
+        print("Error: benchmark child produced no report", file=sys.stderr)
+        return 1
+    report['display'] = env.get('GDK_BACKEND', 'current')
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0 if 'error' not in report else 1
+
+
+# ---------------------------------------------------------------------------
+# Child side: drive the real application and time each phase
+# ---------------------------------------------------------------------------
+
+def write_sample_document(path, size):
+    """Write an HTML file of roughly `size` bytes made of ordinary paragraphs"""
+    paragraph = ("<p>The quick brown fox jumps over the lazy dog. "
+                 "<b>Pack my box</b> with five dozen <i>liquor jugs</i>.</p>\n")
+    count = max(1, size // len(paragraph))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"></head><body>\n")
+        for _ in range(count):
+            f.write(paragraph)
+        f.write("</body></html>\n")
+
+
+class BenchmarkRun:
+    """Steps through the scenario using GLib callbacks on the app's main loop"""
+
+    def __init__(self, app, timeout):
+        self.app = app
+        self.timeout = timeout
+        self.report = {'startup_marks': {}}
+        self.tmpdir = tempfile.mkdtemp(prefix='htmleditor-bench-')
+        self.first_window = None
+        self.keystroke_start = None
+        self.create_window_calls = []
+        self.builder_times = {}
+
+        spawn = os.environ.get('HTMLEDITOR_BENCH_SPAWN')
+        self.spawn_time = float(spawn) if spawn else None
+
+        self._wrap_create_window()
+        self._wrap_apply_editor_state()
+        app.connect("activate", self.on_activate)
+
+    # -- instrumentation --------------------------------------------------
+
+    def _wrap_create_window(self):
+        app = self.app
+        original = app.create_window
+
+        for name in TOOLBAR_BUILDERS:
+            builder = getattr(app, name, None)
+            if builder is None:
+                continue
+
+            def timed_builder(*args, _builder=builder, _name=name, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return _builder(*args, **kwargs)
+                finally:
+                    self.builder_times[_name] = self.builder_times.get(_name, 0) + elapsed_ms(start)
+
+            setattr(app, name, timed_builder)
+
+        def timed_create_window():
+            self.builder_times = {}
+            start = time.perf_counter()
+            win = original()
+            win.bench_created = start
+            self.create_window_calls.append({
+                'total': elapsed_ms(start),
+                'toolbars': dict(self.builder_times),
+            })
+            return win
+
+        app.create_window = timed_create_window
+
+    def _wrap_apply_editor_state(self):
+        app = self.app
+        original = app._apply_editor_state
+
+        def apply_editor_state(win, state):
+            original(win, state)
+            if self.keystroke_start is not None and state.get('modified'):
+                self.report['first_keystroke'] = elapsed_ms(self.keystroke_start)
+                self.keystroke_start = None
+                GLib.idle_add(self.open_second_window)
+
+        app._apply_editor_state = apply_editor_state
+
+    def wait_for_load(self, win, callback):
+        """Call callback(win) once the window's WebView finishes loading"""
+        def on_load_changed(webview, event):
+            if event == WebKit.LoadEvent.FINISHED:
+                webview.disconnect(handler_id)
+                callback(win)
+
+        handler_id = win.webview.connect("load-changed", on_load_changed)
+
+    def wait_for_document(self, win, callback):
+        """Poll the page until loadDocument() has finished inserting the file"""
+        def on_result(webview, result):
+            try:
+                value = webview.evaluate_javascript_finish(result)
+                loaded = value.to_string() == 'true'
+            except Exception:
+                loaded = False
+            if loaded:
+                callback(win)
+            else:
+                GLib.timeout_add(10, poll)
+
+        def poll():
+            win.webview.evaluate_javascript("(window.documentsLoaded || 0) > 0",
+                                            -1, None, None, None, on_result)
+            return False
+
+        poll()
+
+    # -- scenario ---------------------------------------------------------
+
+    def on_activate(self, app):
+        # on_activate in the app has already created and presented the window
+        self.first_window = app.windows[0]
+        if self.spawn_time is not None:
+            self.report['first_window'] = round((time.time() - self.spawn_time) * 1000, 2)
+        self.report['first_window_in_process'] = elapsed_ms(CHILD_T0)
+        self.report['create_window'] = self.create_window_calls[0]
+        GLib.timeout_add_seconds(self.timeout, self.on_timeout)
+        self.wait_for_load(self.first_window, self.on_first_load)
+
+    def on_first_load(self, win):
+        self.report['load_finished'] = elapsed_ms(win.bench_created)
+        # Type once the editor's DOMContentLoaded handler has run
+        GLib.timeout_add(50, self.send_keystroke)
+
+    def send_keystroke(self):
+        self.keystroke_start = time.perf_counter()
+        self.app.execute_js(self.first_window,
+                            "document.getElementById('editor').focus();"
+                            "document.execCommand('insertText', false, 'x');")
+        return False
+
+    def open_second_window(self):
+        win = self.app.create_window()
+        win.present()
+        self.wait_for_load(win, self.on_second_load)
+        return False
+
+    def on_second_load(self, win):
+        self.report['second_window'] = elapsed_ms(win.bench_created)
+        self.close_window(win)
+        self.report['open_files'] = {}
+        self.pending_sizes = list(FILE_SIZES)
+        GLib.idle_add(self.open_next_file)
+
+    def open_next_file(self):
+        if not self.pending_sizes:
+            self.collect_keystroke_stats()
+            return False
+        label, size = self.pending_sizes.pop(0)
+        path = os.path.join(self.tmpdir, f"sample-{label}.html")
+        write_sample_document(path, size)
+
+        win = self.app.create_window()
+        win.present()
+
+        def on_loaded(win):
+            self.app.load_file(win, path)
+            start = time.perf_counter()
+
+            def on_document(win):
+                self.report['open_files'][label] = {
+                    'bytes': os.path.getsize(path),
+                    'ms': elapsed_ms(start),
+                }
+                self.close_window(win)
+                GLib.idle_add(self.open_next_file)
+
+            self.wait_for_document(win, on_document)
+
+        self.wait_for_load(win, on_loaded)
+        return False
+
+    def collect_keystroke_stats(self):
+        def on_result(webview, result):
+            try:
+                value = webview.evaluate_javascript_finish(result)
+                self.report['keystroke_stats'] = json.loads(value.to_string())
+            except Exception as e:
+                self.report['keystroke_stats'] = {'error': str(e)}
+            self.finish()
+
+        self.first_window.webview.evaluate_javascript("JSON.stringify(getKeystrokeStats())",
+                                                      -1, None, None, None, on_result)
+
+    def close_window(self, win):
+        self.app.remove_window(win)
+        win.destroy()
+
+    def on_timeout(self):
+        self.report['error'] = f"scenario did not finish within {self.timeout}s"
+        self.finish()
+        return False
+
+    def finish(self):
+        for name, mark in self.app.startup_marks:
+            self.report['startup_marks'][name] = elapsed_ms(CHILD_T0, mark)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        print(json.dumps(self.report), flush=True)
+        self.app.quit()
+
+
+def run_child(args):
+    global Gio, GLib, WebKit
+    sys.path.insert(0, SRC_DIR)
+    import gi
+    gi.require_version('Adw', '1')
+    gi.require_version('WebKit', '6.0')
+    from gi.repository import Adw, Gio, GLib, WebKit
+    import htmleditor
+
+    Adw.init()
+    app = htmleditor.HTMLEditorApp()
+    app.profile_startup = True  # Collect the app's own startup marks too
+    # Never hand the scenario over to an editor already running in the session
+    app.set_flags(app.get_flags() | Gio.ApplicationFlags.NON_UNIQUE)
+    BenchmarkRun(app, args.timeout)
+    return app.run([sys.argv[0]])
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark HTML Editor startup and time-to-editable")
+    parser.add_argument('-o', '--output', help="write the JSON report to this file")
+    parser.add_argument('--display', choices=['auto', 'xvfb', 'broadway', 'current'], default='auto',
+                        help="display to run on (default: Xvfb, falling back to broadway)")
+    parser.add_argument('--timeout', type=int, default=DEFAULT_TIMEOUT,
+                        help="seconds before the scenario is abandoned")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+    return run_parent(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
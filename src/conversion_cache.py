@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# conversion_cache.py - reuse LibreOffice conversions of unchanged documents
+"""
+A content-addressed cache of imported LibreOffice conversions in the user
+cache directory.
+
+Each entry holds the finished import: the document body after its images were
+moved into the image store, and those images under their blob ids. Entries
+are keyed by the source file's SHA-256, the output format, CACHE_VERSION and
+the LibreOffice installation. Renaming or touching a document keeps the same
+key, while editing it or upgrading LibreOffice does not. A hit therefore skips
+the conversion, the HTML parsing and the image pass: the body is copied into a
+fresh temporary directory, so the window owns its file exactly as after a real
+conversion, and the images are handed to the window's store by id, unhashed.
+
+Entries are evicted least recently used first once the cache grows past
+MAX_CACHE_BYTES; an entry's directory modification time records its last use.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from functools import lru_cache
+
+CACHE_VERSION = 2  # Bump when the cached import changes shape
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+META_FILE = 'meta.json'
+FILES_DIR = 'files'
+BLOBS_DIR = 'blobs'
+
+
+def cache_dir():
+    """Return the directory conversions are cached in"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'htmleditor', 'conversions')
+
+
+@lru_cache(maxsize=None)
+def converter_version():
+    """Identify the installed LibreOffice by its binary, without starting it"""
+    path = shutil.which('soffice') or shutil.which('libreoffice')
+    if not path:
+        return 'none'
+    real_path = os.path.realpath(path)
+    try:
+        stat = os.stat(real_path)
+    except OSError:
+        return real_path
+    return f'{real_path}:{stat.st_size}:{int(stat.st_mtime)}'
+
+
+def cache_key(path, output_format):
+    """Return the cache key for converting path to output_format"""
+    digest = hashlib.sha256()
+    digest.update(f'{CACHE_VERSION}\0{converter_version()}\0{output_format}\0'.encode('utf-8'))
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def _read_meta(entry):
+    with open(os.path.join(entry, META_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def lookup(key):
+    """Return (body file, directory, {blob id: image file}) for a cached import,
+    or None on a miss
+
+    The body file is a fresh copy in a new temporary directory; the image
+    files stay in the cache and are to be copied into an image store.
+    """
+    entry = os.path.join(cache_dir(), key)
+    if not os.path.isdir(entry):
+        return None
+    temp_dir = None
+    try:
+        meta = _read_meta(entry)
+        blobs = {blob_id: os.path.join(entry, BLOBS_DIR, blob_id) for blob_id in meta['blobs']}
+        if not all(os.path.isfile(path) for path in blobs.values()):
+            raise ValueError("missing images")
+        temp_dir = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(entry, FILES_DIR), temp_dir, dirs_exist_ok=True)
+        os.utime(entry)  # Mark as recently used
+        return os.path.join(temp_dir, meta['output']), temp_dir, blobs
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring damaged conversion cache entry {key}: {e}")
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        shutil.rmtree(entry, ignore_errors=True)
+        return None
+
+
+def _tree_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def store(key, body, output_name, blobs, source_name=''):
+    """Cache a finished import: its body (str) and {blob id: image file}"""
+    root = cache_dir()
+    os.makedirs(root, exist_ok=True)
+    entry = os.path.join(root, key)
+    if os.path.isdir(entry):
+        return
+    staging = tempfile.mkdtemp(prefix='.store-', dir=root)
+    try:
+        os.makedirs(os.path.join(staging, FILES_DIR))
+        with open(os.path.join(staging, FILES_DIR, output_name), 'w', encoding='utf-8') as f:
+            f.write(body)
+        os.makedirs(os.path.join(staging, BLOBS_DIR))
+        for blob_id, path in blobs.items():
+            shutil.copyfile(path, os.path.join(staging, BLOBS_DIR, blob_id))
+        meta = {
+            'output': output_name,
+            'blobs': sorted(blobs),
+            'source': source_name,
+            'size': _tree_size(staging),
+            'created': time.time(),
+        }
+        with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        # The entry appears whole or not at all
+        os.rename(staging, entry)
+    except OSError:
+        # Another conversion of the same file got there first
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.isdir(entry):
+            raise
+    evict()
+
+
+def _entries():
+    """Return (last used, size, path) for every complete cache entry"""
+    root = cache_dir()
+    entries = []
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return entries
+    for name in names:
+        path = os.path.join(root, name)
+        if name.startswith('.'):
+            continue
+        try:
+            entries.append((os.stat(path).st_mtime, _read_meta(path).get('size', 0), path))
+        except (OSError, ValueError):
+            continue
+    return entries
+
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """Remove least recently used entries until the cache fits in max_bytes"""
+    entries = sorted(_entries())
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def cache_size():
+    """Return the total size of the cached conversions in bytes"""
+    return sum(size for _, size, _ in _entries())
+
+
+def clear():
+    """Remove every cached conversion"""
+    shutil.rmtree(cache_dir(), ignore_errors=True)
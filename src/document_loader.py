@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# document_loader.py - read documents for the editor without blocking the UI
+"""
+Reading and decoding for the files load_file opens directly (.html, .htm,
+.mht, .mhtml, .md, .markdown, .txt) and for LibreOffice's HTML output.
+
+These functions run on a worker thread. The encoding is decided from a
+bounded prefix of the file: a byte order mark, then an HTML charset
+declaration, then chardet's incremental detector when it is installed. The
+file is then decoded in chunks, and for HTML the body is cut out by a scanner
+that stops reading at </body>. Progress is reported per chunk and a cancel
+event is checked between chunks.
+"""
+
+import codecs
+import email
+import os
+import re
+
+READ_CHUNK_SIZE = 256 * 1024
+DETECT_PREFIX_SIZE = 64 * 1024  # Bytes looked at to choose an encoding
+DETECT_CONFIDENCE = 0.7  # chardet guesses below this fall back to UTF-8
+
+# UTF-32 marks are checked first: the UTF-32-LE mark starts with the UTF-16-LE one
+BYTE_ORDER_MARKS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9._:-]+)', re.IGNORECASE)
+
+BODY_START = re.compile(r'<body[^>]*>', re.IGNORECASE)
+BODY_START_PREFIX = re.compile(r'<body', re.IGNORECASE)
+BODY_END = re.compile(r'</body>', re.IGNORECASE)
+
+
+class LoadCancelled(Exception):
+    """Raised when a load is cancelled before it finishes"""
+
+
+def detect_encoding(prefix, chardet=None):
+    """Return the encoding to decode a file with, judged from its first bytes"""
+    for mark, name in BYTE_ORDER_MARKS:
+        if prefix.startswith(mark):
+            return name
+
+    match = META_CHARSET.search(prefix)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode('ascii')).name
+        except LookupError:
+            pass
+
+    if chardet is not None:
+        detector = chardet.universaldetector.UniversalDetector()
+        for start in range(0, len(prefix), 4096):
+            detector.feed(prefix[start:start + 4096])
+            if detector.done:
+                break
+        detector.close()
+        result = detector.result
+        if result.get('encoding') and (result.get('confidence') or 0) > DETECT_CONFIDENCE:
+            try:
+                name = codecs.lookup(result['encoding']).name
+            except LookupError:
+                name = None
+            # A prefix that is plain ASCII says nothing about the rest of the file
+            if name and name != 'ascii':
+                return name
+    return 'utf-8'
+
+
+def iter_text(path, encoding, progress=None, cancel=None):
+    """Yield the decoded text of a file in chunks
+
+    progress is called with (bytes read, file size) after each chunk. Raises
+    LoadCancelled once cancel (a threading.Event) is set, and
+    UnicodeDecodeError if the file is not valid in encoding.
+    """
+    size = os.path.getsize(path)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    done = 0
+    with open(path, 'rb') as f:
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise LoadCancelled()
+            data = f.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+            done += len(data)
+            text = decoder.decode(data)
+            if progress is not None:
+                progress(done, size)
+            if text:
+                yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _read_decoded(path, chardet, read, progress, cancel):
+    """Run read over the file's text chunks, falling back to Latin-1 if the
+    detected encoding turns out not to fit"""
+    with open(path, 'rb') as f:
+        prefix = f.read(DETECT_PREFIX_SIZE)
+    encoding = detect_encoding(prefix, chardet)
+    try:
+        return read(iter_text(path, encoding, progress, cancel))
+    except UnicodeDecodeError:
+        return read(iter_text(path, 'latin-1', progress, cancel))
+
+
+def extract_body(chunks):
+    """Return the stripped text between <body ...> and the first </body>
+
+    Same result as re.search(r'<body[^>]*>(.*?)</body>', text, re.DOTALL |
+    re.IGNORECASE), taking the whole text when there is no match, but the
+    chunks are scanned once and none are consumed after </body>.
+    """
+    before = []  # Text up to and including the body start tag
+    body = None  # Text after it, once that tag has been seen
+    pending = ''  # Unscanned text that may hold the start of a tag
+    for chunk in chunks:
+        pending += chunk
+        if body is None:
+            match = BODY_START.search(pending)
+            if not match:
+                # Keep an unfinished "<body ..." (or what could become one)
+                partial = BODY_START_PREFIX.search(pending)
+                keep = partial.start() if partial else max(0, len(pending) - len('<body') + 1)
+                before.append(pending[:keep])
+                pending = pending[keep:]
+                continue
+            before.append(pending[:match.end()])
+            body = []
+            pending = pending[match.end():]
+
+        match = BODY_END.search(pending)
+        if match:
+            body.append(pending[:match.start()])
+            return ''.join(body).strip()
+        keep = max(0, len(pending) - len('</body>') + 1)
+        body.append(pending[:keep])
+        pending = pending[keep:]
+    return ''.join(before) + ''.join(body or []) + pending
+
+
+def read_text(path, chardet=None, progress=None, cancel=None):
+    """Return the whole decoded text of a file"""
+    return _read_decoded(path, chardet, ''.join, progress, cancel)
+
+
+def read_html_body(path, chardet=None, progress=None, cancel=None):
+    """Return the body of an HTML file (or all of it if it has no body element)"""
+    return _read_decoded(path, chardet, extract_body, progress, cancel)
+
+
+def read_mhtml_body(path, progress=None, cancel=None, add_image=None):
+    """Return the body of the HTML part of an MHTML file
+
+    add_image(data, mime_type), when given, receives each image part and
+    returns the URI the HTML should use for it instead of the part's
+    Content-Location or cid: reference.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        message = email.message_from_binary_file(f)
+    if cancel is not None and cancel.is_set():
+        raise LoadCancelled()
+    if progress is not None:
+        progress(size, size)
+
+    content = None
+    images = {}
+    for part in message.walk():
+        content_type = part.get_content_type()
+        if content_type == 'text/html' and content is None:
+            payload = part.get_payload(decode=True) or b''
+            charset = part.get_content_charset() or 'utf-8'
+            try:
+                content = payload.decode(charset)
+            except (LookupError, UnicodeDecodeError):
+                content = payload.decode('latin-1')
+        elif add_image is not None and content_type.startswith('image/'):
+            payload = part.get_payload(decode=True)
+            if not payload:
+                continue
+            references = []
+            if part['Content-Location']:
+                references.append(part['Content-Location'].strip())
+            if part['Content-ID']:
+                references.append('cid:' + part['Content-ID'].strip().strip('<>'))
+            if references:
+                uri = add_image(payload, content_type)
+                for reference in references:
+                    images[reference] = uri
+
+    if content is not None:
+        for reference, uri in images.items():
+            if reference != uri:
+                content = content.replace(f'"{reference}"', f'"{uri}"').replace(f"'{reference}'", f"'{uri}'")
+        return extract_body([content])
+
+    # Not a multipart archive; treat it as plain HTML
+    with open(path, 'rb') as f:
+        return extract_body([f.read().decode('utf-8', errors='replace')])
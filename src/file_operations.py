@@ -4,26 +4,52 @@ import os
 import re
 import subprocess
 import tempfile
+import threading
 import time
 import shutil
+import importlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime
 from gi.repository import Gtk, GLib, Gio, WebKit, Pango, Adw, GObject
+# The editor's own helper modules use only the standard library at import
+# time and are imported eagerly; their heavier dependencies load on first use
+import document_loader
+import libreoffice_service
+import conversion_cache
+import image_store
+import save_engine
+
+# Optional converters are probed and imported on first use, not at startup
+_optional_modules = {}
+
+def import_optional(module_name):
+    """Import an optional module on demand; returns None if it is missing"""
+    if module_name not in _optional_modules:
+        try:
+            _optional_modules[module_name] = importlib.import_module(module_name)
+        except ImportError:
+            _optional_modules[module_name] = None
+    return _optional_modules[module_name]
+
+def is_optional_available(module_name):
+    """Check whether an optional module can be used, without importing it
+
+    A module that failed to import counts as unavailable even if it is
+    installed; _optional_modules holds that answer, so nothing else is cached.
+    """
+    if module_name in _optional_modules:
+        return _optional_modules[module_name] is not None
+    return importlib.util.find_spec(module_name) is not None
+
+def is_markdown_available():
+    """Check if the markdown package can be used for Markdown to HTML"""
+    return is_optional_available('markdown')
 
-# Check if markdown package is available
-MARKDOWN_AVAILABLE = False
-try:
-    import markdown
-    MARKDOWN_AVAILABLE = True
-except ImportError:
-    pass
-
-# Check if html2text package is available (for HTML to Markdown conversion)
-HTML2TEXT_AVAILABLE = False
-try:
-    import html2text
-    HTML2TEXT_AVAILABLE = True
-except ImportError:
-    pass
+def is_html2text_available():
+    """Check if the html2text package can be used for HTML to Markdown"""
+    return is_optional_available('html2text')
 
 # LibreOffice document formats
 LIBREOFFICE_INPUT_FORMATS = {
@@ -61,23 +87,44 @@ OUTPUT_FORMATS = [
     {"extension": ".docx", "name": "Microsoft Word", "mime": "application/vnd.openxmlformats-officedocument.wordprocessingml.document"},
 ]
 
-# Check if LibreOffice is available
+# Check if LibreOffice is available; probed on first use and cached
+@lru_cache(maxsize=None)
 def is_libreoffice_available():
     """Check if LibreOffice is installed and available"""
-    try:
-        result = subprocess.run(['which', 'libreoffice'], 
-                               stdout=subprocess.PIPE, 
-                               stderr=subprocess.PIPE,
-                               text=True)
-        return result.returncode == 0
-    except Exception:
-        return False
-
-# Cache the result to avoid repeated checks
-LIBREOFFICE_AVAILABLE = is_libreoffice_available()
-
-def show_loading_dialog(self, win, message="Loading document..."):
-    """Show a loading dialog with a progress spinner"""
+    return shutil.which('libreoffice') is not None
+
+# Direct reads faster than this finish without showing the loading dialog
+LOAD_DIALOG_DELAY_MS = 300
+
+# Documents are read in one pool and converted in another. LibreOffice runs
+# one conversion at a time, so conversions get only enough threads to keep
+# it busy while the previous result is read, and cannot fill the read pool.
+LOAD_POOL_SIZE = os.cpu_count() or 2
+CONVERSION_POOL_SIZE = 2
+_load_pool = None
+_conversion_pool = None
+
+def get_load_pool():
+    """Return the thread pool documents are read in"""
+    global _load_pool
+    if _load_pool is None:
+        _load_pool = ThreadPoolExecutor(max_workers=LOAD_POOL_SIZE, thread_name_prefix='load')
+    return _load_pool
+
+def get_conversion_pool():
+    """Return the thread pool documents are converted with LibreOffice in"""
+    global _conversion_pool
+    if _conversion_pool is None:
+        _conversion_pool = ThreadPoolExecutor(max_workers=CONVERSION_POOL_SIZE, thread_name_prefix='convert')
+    return _conversion_pool
+
+def show_loading_dialog(self, win, message="Loading document...", on_cancel=None):
+    """Show a loading dialog with a progress spinner
+
+    With on_cancel, the dialog also has a Cancel button and a progress bar
+    (dialog.progress_bar, hidden until a fraction is set); on_cancel is called
+    when the dialog is cancelled or dismissed.
+    """
     dialog = Adw.Dialog.new()
     dialog.set_content_width(300)
     
@@ -101,6 +148,18 @@ def show_loading_dialog(self, win, message="Loading document..."):
     spinner.set_margin_top(12)
     content_box.append(spinner)
     
+    dialog.progress_bar = None
+    if on_cancel:
+        dialog.progress_bar = Gtk.ProgressBar()
+        dialog.progress_bar.set_visible(False)
+        content_box.append(dialog.progress_bar)
+        
+        cancel_button = Gtk.Button(label="Cancel")
+        cancel_button.set_halign(Gtk.Align.CENTER)
+        cancel_button.connect("clicked", lambda button: dialog.close())
+        content_box.append(cancel_button)
+        dialog.connect("closed", lambda d: on_cancel())
+    
     dialog.set_child(content_box)
     dialog.present(win)
     
@@ -126,18 +185,19 @@ def is_libreoffice_format(file_path):
     # Check if it's a LibreOffice-convertible format
     return ext in get_all_supported_extensions()
 
-def convert_with_libreoffice(self, input_file, output_format="html"):
+def convert_with_libreoffice(self, input_file, output_format="html", cancel=None):
     """
     Convert a document using LibreOffice in headless mode with improved image handling
     
     Args:
         input_file: Path to the input file
         output_format: Format to convert to (default: html)
+        cancel: Optional threading.Event; setting it abandons the conversion
         
     Returns:
         Tuple of (path to the converted file, directory containing image files) or (None, None) if conversion failed
     """
-    if not LIBREOFFICE_AVAILABLE:
+    if not is_libreoffice_available():
         print("LibreOffice not available for document conversion")
         return None, None
         
@@ -147,7 +207,7 @@ def convert_with_libreoffice(self, input_file, output_format="html"):
         if file_ext == '.pdf' and output_format != "pdf":
             print("PDF import is disabled")
             return None, None
-            
+        
         # Create a temporary directory for the output
         temp_dir = tempfile.mkdtemp()
         
@@ -157,41 +217,67 @@ def convert_with_libreoffice(self, input_file, output_format="html"):
         # Prepare the command - specify the actual output filename
         base_name = os.path.splitext(os.path.basename(input_file))[0]
         
-        # Use the correct command format for LibreOffice
-        # The format should be: output_format:output_filter
-        if output_format == "html":
-            conversion_format = "html:HTML (StarWriter)"
-        elif output_format == "pdf":
-            conversion_format = "pdf:writer_pdf_Export"
+        # Convert through the long-lived LibreOffice service when it is
+        # available; a one-shot soffice process is the fallback
+        try:
+            converted = libreoffice_service.convert(input_abs_path, temp_dir, output_format, cancel=cancel)
+        except libreoffice_service.ConversionFailed as e:
+            # The service ran it; a one-shot run would fail or hang again
+            print(e)
+            return None, None
+        if converted:
+            print(f"Converted {input_abs_path} with the LibreOffice service")
+        elif cancel is not None and cancel.is_set():
+            return None, None
         else:
-            conversion_format = output_format
-        
-        cmd = [
-            'libreoffice',
-            '--headless',
-            '--convert-to', conversion_format,
-            '--outdir', temp_dir,
-            input_abs_path
-        ]
-    
-        print(f"Running conversion command: {' '.join(cmd)}")
-        
-        # Run the conversion process
-        process = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=60  # 60 second timeout
-        )
+            # Use the correct command format for LibreOffice
+            # The format should be: output_format:output_filter
+            if output_format == "html":
+                conversion_format = "html:HTML (StarWriter)"
+            elif output_format == "pdf":
+                conversion_format = "pdf:writer_pdf_Export"
+            else:
+                conversion_format = output_format
         
-        # Debug output
-        print(f"LibreOffice stdout: {process.stdout}")
-        print(f"LibreOffice stderr: {process.stderr}")
+            cmd = [
+                'libreoffice',
+                '--headless',
+                '--convert-to', conversion_format,
+                '--outdir', temp_dir,
+                input_abs_path
+            ]
+    
+            print(f"Running conversion command: {' '.join(cmd)}")
         
-        if process.returncode != 0:
-            print(f"LibreOffice conversion failed with return code {process.returncode}: {process.stderr}")
-            return None, None
+            # Run the conversion process, checking for a cancel while it runs
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+            deadline = time.monotonic() + 60  # 60 second timeout
+            while True:
+                try:
+                    stdout, stderr = process.communicate(timeout=0.25)
+                    break
+                except subprocess.TimeoutExpired:
+                    cancelled = cancel is not None and cancel.is_set()
+                    if cancelled or time.monotonic() > deadline:
+                        process.kill()
+                        process.communicate()
+                        if cancelled:
+                            print(f"Cancelled converting {input_abs_path}")
+                            return None, None
+                        raise
+        
+            # Debug output
+            print(f"LibreOffice stdout: {stdout}")
+            print(f"LibreOffice stderr: {stderr}")
+        
+            if process.returncode != 0:
+                print(f"LibreOffice conversion failed with return code {process.returncode}: {stderr}")
+                return None, None
             
         # Find the converted file - it could be named differently than we expect
         converted_files = [f for f in os.listdir(temp_dir) if f.endswith(f".{output_format}")]
@@ -213,7 +299,7 @@ def convert_with_libreoffice(self, input_file, output_format="html"):
         if os.path.getsize(output_file) == 0:
             print(f"LibreOffice created an empty output file: {output_file}")
             return None, None
-            
+        
         return output_file, temp_dir
         
     except subprocess.TimeoutExpired:
@@ -311,7 +397,7 @@ def on_open_new_window_response(self, win, dialog, result):
             self.update_window_menu()
     except GLib.Error as e:
         if e.domain != 'gtk-dialog-error-quark' or e.code != 2:  # Ignore cancel
-            self.show_error_dialog(f"Error opening file: {e}")
+            self.show_error_dialog(win, f"Error opening file: {e}")
 
 def on_open_current_window_response(self, win, dialog, result):
     """Handle open file dialog response to open in current window"""
@@ -323,7 +409,152 @@ def on_open_current_window_response(self, win, dialog, result):
             win.statusbar.set_text(f"Opened {os.path.basename(filepath)}")
     except GLib.Error as e:
         if e.domain != 'gtk-dialog-error-quark' or e.code != 2:  # Ignore cancel
-            self.show_error_dialog(f"Error opening file: {e}")
+            self.show_error_dialog(win, f"Error opening file: {e}")
+
+class DocumentLoadJob:
+    """One file of a multi-file open, shown as a row in the shared progress dialog"""
+    
+    def __init__(self, filepath, on_finished):
+        self.filepath = filepath
+        self.cancel = threading.Event()
+        self.started = False  # Set by the pool thread when it picks the job up
+        self.done = False
+        self.failed = False
+        self.on_finished = on_finished
+        self.status_label = None
+        self.progress_bar = None
+        self.cancel_button = None
+    
+    def set_status(self, text):
+        if self.status_label and not self.done:
+            self.status_label.set_text(text)
+        return False
+    
+    def set_progress(self, fraction):
+        if self.progress_bar and not self.done:
+            self.progress_bar.set_fraction(fraction)
+        return False
+    
+    def request_cancel(self):
+        """Cancel the load; one still waiting in the pool is dropped straight away"""
+        self.cancel.set()
+        if not self.started:
+            self.finish("Cancelled")
+        else:
+            self.set_status("Cancelling…")
+    
+    def finish(self, text, failed=False):
+        if self.done:
+            return False
+        if self.status_label:
+            self.status_label.set_text(text)
+        if self.progress_bar and not failed and text == "Opened":
+            self.progress_bar.set_fraction(1.0)
+        if self.cancel_button:
+            self.cancel_button.set_sensitive(False)
+        self.done = True
+        self.failed = failed
+        self.on_finished(self)
+        return False
+
+def open_files(self, filepaths):
+    """Open several documents, each in its own window
+    
+    The files are read in the shared load pool, at most LOAD_POOL_SIZE at a
+    time, and converted CONVERSION_POOL_SIZE at a time. Each window appears as soon as its document is
+    ready, and a dialog lists every file with its status and a button to
+    cancel it.
+    """
+    dialog = Adw.Dialog.new()
+    dialog.set_title(f"Opening {len(filepaths)} Documents")
+    dialog.set_content_width(480)
+    
+    content_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=12)
+    content_box.set_margin_top(24)
+    content_box.set_margin_bottom(24)
+    content_box.set_margin_start(24)
+    content_box.set_margin_end(24)
+    
+    file_list = Gtk.ListBox()
+    file_list.set_selection_mode(Gtk.SelectionMode.NONE)
+    file_list.add_css_class("boxed-list")
+    scrolled = Gtk.ScrolledWindow()
+    scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+    scrolled.set_propagate_natural_height(True)
+    scrolled.set_max_content_height(360)
+    scrolled.set_child(file_list)
+    content_box.append(scrolled)
+    
+    button_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
+    button_box.set_halign(Gtk.Align.END)
+    cancel_all_button = Gtk.Button(label="Cancel All")
+    button_box.append(cancel_all_button)
+    content_box.append(button_box)
+    dialog.set_child(content_box)
+    
+    jobs = []
+    
+    # Keep the application running while no window is open yet
+    self.hold()
+    
+    def on_job_finished(job):
+        if not all(j.done for j in jobs):
+            return
+        self.release()
+        if any(j.failed for j in jobs):
+            # Leave the errors on screen until the dialog is dismissed
+            cancel_all_button.set_label("Close")
+        else:
+            dialog.close()
+    
+    def on_cancel_all(button):
+        if all(j.done for j in jobs):
+            dialog.close()
+            return
+        for job in jobs:
+            if not job.done:
+                job.request_cancel()
+    
+    cancel_all_button.connect("clicked", on_cancel_all)
+    
+    for filepath in filepaths:
+        job = DocumentLoadJob(filepath, on_job_finished)
+        jobs.append(job)
+        
+        row_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=12)
+        row_box.set_margin_top(8)
+        row_box.set_margin_bottom(8)
+        row_box.set_margin_start(12)
+        row_box.set_margin_end(8)
+        
+        text_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
+        text_box.set_hexpand(True)
+        name_label = Gtk.Label(label=os.path.basename(filepath))
+        name_label.set_halign(Gtk.Align.START)
+        name_label.set_ellipsize(Pango.EllipsizeMode.MIDDLE)
+        job.status_label = Gtk.Label(label="Waiting…")
+        job.status_label.set_halign(Gtk.Align.START)
+        job.status_label.add_css_class("dim-label")
+        job.status_label.set_ellipsize(Pango.EllipsizeMode.END)
+        job.progress_bar = Gtk.ProgressBar()
+        text_box.append(name_label)
+        text_box.append(job.status_label)
+        text_box.append(job.progress_bar)
+        row_box.append(text_box)
+        
+        job.cancel_button = Gtk.Button.new_from_icon_name("process-stop-symbolic")
+        job.cancel_button.add_css_class("flat")
+        job.cancel_button.set_valign(Gtk.Align.CENTER)
+        job.cancel_button.set_tooltip_text("Cancel")
+        job.cancel_button.connect("clicked", lambda button, job=job: job.request_cancel())
+        row_box.append(job.cancel_button)
+        
+        file_list.append(row_box)
+    
+    dialog.present(self.get_active_window())
+    
+    for job in jobs:
+        self.load_file(None, job.filepath, job)
 
 def _simple_markdown_to_html(content):
     """Static method for simple markdown to HTML conversion as fallback"""
@@ -361,24 +592,8 @@ def on_save_clicked(self, win, button):
         
     # Normal save operation for non-converted documents
     if win.current_file:
-        # Get the file path
-        file_path = win.current_file.get_path()
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
         # Save based on file extension
-        if file_ext in ['.mht', '.mhtml']:
-            self.save_as_mhtml(win, win.current_file)
-        elif file_ext in ['.html', '.htm']:
-            self.save_as_html(win, win.current_file)
-        elif file_ext in ['.md', '.markdown']:
-            self.save_as_markdown(win, win.current_file)
-        elif file_ext in ['.txt']:
-            self.save_as_text(win, win.current_file)
-        elif file_ext == '.pdf':
-            self.save_as_pdf(win, win.current_file)
-        else:
-            # For unknown extensions, save as MHTML by default
-            self.save_as_mhtml(win, win.current_file)
+        self.save_to_file(win, win.current_file)
     else:
         # Show custom save dialog for new file
         self.show_custom_save_dialog(win)
@@ -471,25 +686,11 @@ def _on_save_dialog_response(self, dialog, result, win):
                 file = Gio.File.new_for_path(file_path)
             
             # Save based on file extension
-            file_ext = os.path.splitext(file_path)[1].lower()
-            
-            if file_ext in ['.mht', '.mhtml']:
-                self.save_as_mhtml(win, file)
-            elif file_ext in ['.html', '.htm']:
-                self.save_as_html(win, file)
-            elif file_ext in ['.md', '.markdown']:
-                self.save_as_markdown(win, file)
-            elif file_ext in ['.txt']:
-                self.save_as_text(win, file)
-            elif file_ext == '.pdf':
-                self.save_as_pdf(win, file)
-            else:
-                # For unknown extensions, save as MHTML by default (changed from HTML)
-                self.save_as_mhtml(win, file)
+            self.save_to_file(win, file)
     except GLib.Error as error:
         # Handle errors (e.g., user cancelled)
         if not error.matches(Gtk.DialogError.quark(), Gtk.DialogError.DISMISSED):
-            self.show_error_dialog(win, "Error saving file", str(error))
+            self.show_error_dialog(win, f"Error saving file: {error}")
             
 def on_save_as_clicked(self, win, button):
     """Show custom save as dialog to save current document with a new filename"""
@@ -534,12 +735,13 @@ def _create_custom_save_dialog(self, win, initial_name="", current_format=None):
     formats = [
         {"extension": ".mht", "name": "MHTML Document", "mime": "message/rfc822"},
         {"extension": ".html", "name": "HTML Document", "mime": "text/html"},
+        {"extension": ".html", "name": "HTML with Images Folder", "mime": "text/html", "images": "folder"},
         {"extension": ".txt", "name": "Plain Text", "mime": "text/plain"},
         {"extension": ".pdf", "name": "PDF Document", "mime": "application/pdf"},
     ]
     
     # Add markdown if html2text is available
-    if HTML2TEXT_AVAILABLE:
+    if is_html2text_available():
         formats.append(
             {"extension": ".md", "name": "Markdown Document", "mime": "text/markdown"}
         )
@@ -588,9 +790,10 @@ def _create_custom_save_dialog(self, win, initial_name="", current_format=None):
     string_list = Gtk.StringList()
     selected_index = 0
     
+    image_mode = getattr(win, 'html_image_mode', 'inline')
     for i, fmt in enumerate(formats):
         string_list.append(f"{fmt['name']} ({fmt['extension']})")
-        if fmt['extension'] == ext:
+        if fmt['extension'] == ext and fmt.get('images', 'inline') == image_mode:
             selected_index = i
     
     format_dropdown.set_model(string_list)
@@ -644,6 +847,12 @@ def _create_custom_save_dialog(self, win, initial_name="", current_format=None):
     
     grid.attach(location_box, 1, 2, 1, 1)
     
+    # Inserted images are resampled to their display size; this writes the originals
+    full_resolution_check = Gtk.CheckButton(label="Export images at full resolution")
+    full_resolution_check.set_active(getattr(win, 'export_full_resolution', False))
+    grid.attach(full_resolution_check, 1, 3, 1, 1)
+    dialog_data["full_resolution_check"] = full_resolution_check
+    
     # Add the grid to the content area
     content_area.append(grid)
     
@@ -688,22 +897,13 @@ def _on_dialog_response(self, dialog, response_id, dialog_data, win):
         if filepath:
             file = Gio.File.new_for_path(filepath)
             
-            # Determine file type and call appropriate save method
-            file_ext = os.path.splitext(filepath)[1].lower()
+            # Whether HTML inlines its images or writes them to a folder beside it
+            selected_format = dialog_data["formats"][dialog_data["format_dropdown"].get_selected()]
+            win.html_image_mode = selected_format.get("images", "inline")
+            win.export_full_resolution = dialog_data["full_resolution_check"].get_active()
             
-            if file_ext in ['.mht', '.mhtml']:
-                self.save_as_mhtml(win, file)
-            elif file_ext in ['.html', '.htm']:
-                self.save_as_html(win, file)
-            elif file_ext in ['.md', '.markdown']:
-                self.save_as_markdown(win, file)
-            elif file_ext in ['.txt']:
-                self.save_as_text(win, file)
-            elif file_ext == '.pdf':
-                self.save_as_pdf(win, file)
-            else:
-                # For unknown extensions, save as MHTML by default
-                self.save_as_mhtml(win, file)
+            # Determine file type and call appropriate save method
+            self.save_to_file(win, file)
     
     # Destroy the dialog when done
     dialog.destroy()
@@ -738,33 +938,131 @@ def _get_file_path_from_dialog(self, dialog_data):
     # Build full path
     return os.path.join(dialog_data["current_folder"], filename + extension)
 
-def save_as_mhtml(self, win, file):
-    """Save document as MHTML using WebKit's save method"""
+_save_engine = None
+
+def get_save_engine():
+    """Return the engine every document save goes through"""
+    global _save_engine
+    if _save_engine is None:
+        _save_engine = save_engine.SaveEngine(dispatch=GLib.idle_add)
+    return _save_engine
+
+def save_to_file(self, win, file, on_done=None):
+    """Save the document to file in the format its extension names
+
+    on_done(success, error) is called once the file is written or the save
+    has failed.
+    """
+    file_ext = os.path.splitext(file.get_path())[1].lower()
+    if file_ext in ['.html', '.htm']:
+        self.save_as_html(win, file, on_done)
+    elif file_ext in ['.md', '.markdown']:
+        self.save_as_markdown(win, file, on_done)
+    elif file_ext in ['.txt']:
+        self.save_as_text(win, file, on_done)
+    elif file_ext == '.pdf':
+        self.save_as_pdf(win, file, on_done)
+    else:
+        # MHTML, and the default for unknown extensions
+        self.save_as_mhtml(win, file, on_done)
+
+def save_document(self, win, file, produce, on_done=None):
+    """Write produce() to file through the save engine
+
+    produce runs on a worker thread and returns the bytes to write. The
+    outcome is reported to on_document_saved, then to on_done(success, error).
+    """
+    get_save_engine().save(
+        file.get_path(), produce,
+        lambda success, error: self.on_document_saved(win, file, success, error, on_done))
+
+def on_document_saved(self, win, file, success, error=None, on_done=None):
+    """Report the outcome of a save, whichever format and path it came from"""
+    try:
+        if success:
+            win.current_file = file
+            win.modified = False
+            # A converted document saved under its own name is no longer a conversion
+            if getattr(win, 'is_converted_file', False):
+                win.is_converted_file = False
+            self.update_window_title(win)
+            win.statusbar.set_text(f"Saved: {file.get_path()}")
+        else:
+            win.statusbar.set_text(f"Error saving {os.path.basename(file.get_path())}: {error}")
+    except Exception as e:
+        print(f"Error completing save: {e}")
+    if on_done:
+        on_done(success, error)
+    return False
+
+def _editor_content(js_result):
+    """Return the string value of an evaluate_javascript result"""
+    if hasattr(js_result, 'get_js_value'):
+        return js_result.get_js_value().to_string()
+    return js_result.to_string()
+
+def start_export_stream(self, win):
+    """Have the page stream the editor content; returns a ChunkStream of str
+
+    The page posts the serialized HTML in pieces to the exportChunk handler
+    (on_export_chunk), which hands them to the stream as they arrive.
+    """
+    win.export_count = getattr(win, 'export_count', 0) + 1
+    export_id = str(win.export_count)
+    stream = save_engine.ChunkStream()
+    if getattr(win, 'export_streams', None) is None:
+        win.export_streams = {}
+    win.export_streams[export_id] = stream
+    
+    def on_evaluated(webview, result):
+        try:
+            webview.evaluate_javascript_finish(result)
+        except GLib.Error as e:
+            if win.export_streams.pop(export_id, None) is not None:
+                stream.fail(f"Could not read the document: {e.message}")
+    
+    win.webview.evaluate_javascript(
+        f"exportDocument('{export_id}');",
+        -1, None, None, None,
+        lambda webview, result, data: on_evaluated(webview, result),
+        None
+    )
+    return stream
+
+def on_export_chunk(self, win, manager, result):
+    """Pass a piece of streamed document content to the save waiting for it"""
     try:
-        # Get the file URI
-        file_uri = file.get_uri()
-        
-        # Check which WebKit version and methods are available
-        if hasattr(win.webview, 'save_to_file'):
-            # WebKit 6.0+ method
-            win.webview.save_to_file(file, WebKit.SaveMode.MHTML, None, 
-                                  lambda webview, result: self.save_webkit_callback(win, file, result))
-        elif hasattr(win.webview, 'save'):
-            # Older WebKit method
-            win.webview.save(WebKit.SaveMode.MHTML, None,  # No cancellable
-                          lambda webview, result: self.save_webkit_callback(win, file, result))
+        if hasattr(result, 'get_js_value'):
+            message = result.get_js_value().to_string()
         else:
-            # Fallback for even older WebKit versions
-            print("WebKit save methods not available, falling back to HTML")
-            self.save_as_html(win, file)
+            message = result.to_string()
+        
+        header, _, data = message.partition('\n')
+        export_id, _, kind = header.partition(' ')
+        streams = getattr(win, 'export_streams', None) or {}
+        stream = streams.get(export_id)
+        if stream is None:
             return
-            
-        win.statusbar.set_text(f"Saving MHTML file: {file.get_path()}")
+        if kind == 'chunk':
+            stream.put(data)
+        elif kind == 'done':
+            del streams[export_id]
+            stream.close()
+        else:
+            del streams[export_id]
+            stream.fail(data or "Could not read the document")
     except Exception as e:
-        print(f"Error saving as MHTML: {e}")
-        win.statusbar.set_text(f"Error saving MHTML: {e}")
-        # Fallback to manual saving
-        self.save_as_html(win, file)
+        print(f"Error handling exported content: {e}")
+
+def save_as_mhtml(self, win, file, on_done=None):
+    """Save document as MHTML, with the images from the blob store as parts
+
+    The archive is built from the editor content rather than with WebKit's
+    page save, which would also capture the editor's own page and scripts.
+    """
+    stream = self.start_export_stream(win)
+    self.save_document(win, file, lambda: _mhtml_chunks(win, stream, file), on_done)
+    win.statusbar.set_text(f"Saving MHTML file: {file.get_path()}")
 
 def save_webkit_callback(self, win, file, result):
     """Handle WebKit save result"""
@@ -796,16 +1094,88 @@ def save_webkit_callback(self, win, file, result):
         # Fallback to manual saving
         self.save_as_html(win, file)
 
-def save_as_html(self, win, file):
-    """Save document as HTML by extracting just the editor content"""
-    # We only want to get the editor content, not the entire HTML document
-    win.webview.evaluate_javascript(
-        "document.getElementById('editor').innerHTML",
-        -1, None, None, None,
-        # Use _on_get_html_content instead of save_html_callback
-        lambda webview, result, data: self._on_get_html_content(win, webview, result, file),
-        None
-    )
+def _html_document(body_content):
+    """Wrap editor content in a complete HTML document"""
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <title>HTML Document</title>
+    <meta charset="utf-8">
+</head>
+<body>
+{body_content}
+</body>
+</html>"""
+
+def get_image_store(self, win):
+    """Return the blob store holding the images of the document in win"""
+    if getattr(win, 'image_store', None) is None:
+        win.image_store = image_store.ImageStore()
+    return win.image_store
+
+def _export_images(win, editor_content, file):
+    """Write the images of editor content out for an HTML file and point it at them"""
+    file_path = file.get_path()
+    full_resolution = getattr(win, 'export_full_resolution', False)
+    if getattr(win, 'html_image_mode', 'inline') == 'folder':
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        return image_store.package_blobs(editor_content, os.path.dirname(file_path), f"{name}_files",
+                                         full_resolution)
+    return image_store.inline_blobs(editor_content, full_resolution)
+
+def _html_chunks(win, chunks, file):
+    """Yield the bytes of an HTML file for editor content arriving in chunks"""
+    head, tail = _html_document('\0').split('\0')
+    yield head.encode('utf-8')
+    for chunk in chunks:
+        # Chunks end between nodes, so no blob URI is ever split
+        yield _export_images(win, chunk, file).encode('utf-8')
+    yield tail.encode('utf-8')
+
+def _mhtml_chunks(win, chunks, file):
+    """Yield the bytes of an MHTML file for editor content arriving in chunks"""
+    head, tail = _html_document('\0').split('\0')
+    name = os.path.splitext(os.path.basename(file.get_path()))[0]
+
+    def document():
+        yield head
+        yield from chunks
+        yield tail
+
+    return image_store.mhtml_chunks(document(), name, getattr(win, 'export_full_resolution', False))
+
+def export_document(self, win, editor_content, file):
+    """Return the bytes to write for editor content saved as file
+
+    Images are only written out here: MHTML gets them as archive parts, HTML
+    gets them inlined as data: URLs, or copied into a "<name>_files" folder
+    beside the file when the window saves HTML with an images folder. Resampled
+    images are replaced by their originals when the window exports at full
+    resolution.
+    """
+    name, file_ext = os.path.splitext(os.path.basename(file.get_path()))
+    if file_ext.lower() in ['.mht', '.mhtml']:
+        return image_store.build_mhtml(_html_document(editor_content), name,
+                                       getattr(win, 'export_full_resolution', False))
+    return _html_document(_export_images(win, editor_content, file)).encode('utf-8')
+
+def save_html_content(self, win, editor_content, file, callback=None):
+    """Save editor content to file; callback gets (success, error)
+
+    HTML and MHTML are written from editor_content. Other formats need the
+    document in another form, so they are saved afresh through save_to_file.
+    """
+    file_ext = os.path.splitext(file.get_path())[1].lower()
+    if file_ext not in ['.html', '.htm', '.mht', '.mhtml']:
+        self.save_to_file(win, file, callback)
+        return
+    self.save_document(win, file, lambda: self.export_document(win, editor_content, file), callback)
+
+def save_as_html(self, win, file, on_done=None):
+    """Save document as HTML, streaming the editor content into the file"""
+    # Only the editor content is wanted, not the entire editor page
+    stream = self.start_export_stream(win)
+    self.save_document(win, file, lambda: _html_chunks(win, stream, file), on_done)
     win.statusbar.set_text(f"Saving HTML file: {file.get_path()}")
     return True  # Return success status
     
@@ -831,49 +1201,7 @@ def save_html_body_callback(self, win, webview, result, file):
     try:
         js_result = webview.evaluate_javascript_finish(result)
         if js_result:
-            # Get the body HTML content
-            if hasattr(js_result, 'get_js_value'):
-                body_content = js_result.get_js_value().to_string()
-            else:
-                body_content = js_result.to_string()
-            
-            # Create a complete HTML document
-            html_content = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>HTML Document</title>
-    <meta charset="utf-8">
-</head>
-<body>
-{body_content}
-</body>
-</html>"""
-
-            # Convert the string to bytes
-            content_bytes = html_content.encode('utf-8')
-            
-            # Use the simpler replace_contents method
-            try:
-                success, etag = file.replace_contents(
-                    content_bytes,
-                    None,  # etag
-                    False,  # make_backup
-                    Gio.FileCreateFlags.REPLACE_DESTINATION,
-                    None   # cancellable
-                )
-                
-                if success:
-                    win.current_file = file
-                    win.modified = False
-                    self.update_window_title(win)
-                    win.statusbar.set_text(f"Saved: {file.get_path()}")
-                else:
-                    win.statusbar.set_text("File save was not successful")
-                    
-            except GLib.Error as e:
-                print(f"Error writing file: {e.message}")
-                win.statusbar.set_text(f"Error writing file: {e.message}")
-                
+            self.save_html_content(win, _editor_content(js_result), file)
         else:
             print("Failed to get HTML content from webview")
             win.statusbar.set_text("Failed to get HTML content for saving")
@@ -881,123 +1209,96 @@ def save_html_body_callback(self, win, webview, result, file):
         print(f"Error processing HTML body for save: {e}")
         win.statusbar.set_text(f"Error saving HTML: {e}")
 
-def save_as_text(self, win, file):
+def save_as_text(self, win, file, on_done=None):
     """Save document as plain text by extracting text content from the webview"""
     win.webview.evaluate_javascript(
         "document.body.innerText || document.body.textContent",
         -1, None, None, None,
-        lambda webview, result, data: self.save_text_callback(win, webview, result, file),
+        lambda webview, result, data: self.save_text_callback(win, webview, result, file, on_done),
         None
     )
     win.statusbar.set_text(f"Saving text file: {file.get_path()}")
 
-def save_text_callback(self, win, webview, result, file):
+def save_text_callback(self, win, webview, result, file, on_done=None):
     """Process text content from webview and save to file"""
     try:
         js_result = webview.evaluate_javascript_finish(result)
         if js_result:
-            text_content = js_result.get_js_value().to_string() if hasattr(js_result, 'get_js_value') else js_result.to_string()
-            
-            # Replace the file with the new content
-            file.replace_contents_async(
-                text_content.encode('utf-8'),
-                None,
-                False,
-                Gio.FileCreateFlags.REPLACE_DESTINATION,
-                None,
-                lambda file, result: self.save_completion_callback(win, file, result)
-            )
+            text_content = _editor_content(js_result)
+            self.save_document(win, file, lambda: text_content.encode('utf-8'), on_done)
     except Exception as e:
         print(f"Error processing text for save: {e}")
         win.statusbar.set_text(f"Error saving text: {e}")
+        self.on_document_saved(win, file, False, str(e), on_done)
 
-def save_as_markdown(self, win, file):
+def save_as_markdown(self, win, file, on_done=None):
     """Save document as Markdown using html2text if available"""
-    if not HTML2TEXT_AVAILABLE:
+    if not is_html2text_available():
         win.statusbar.set_text("html2text library not available for Markdown conversion")
         # Fallback to HTML
-        self.save_as_html(win, file)
+        self.save_as_html(win, file, on_done)
         return
         
-    win.webview.evaluate_javascript(
-        "document.documentElement.outerHTML",
-        -1, None, None, None,
-        lambda webview, result, data: self.save_markdown_callback(win, webview, result, file),
-        None
-    )
+    # Conversion and image copies happen on the save worker as content streams in
+    stream = self.start_export_stream(win)
+    self.save_document(win, file, lambda: _markdown_document(win, stream, file), on_done)
     win.statusbar.set_text(f"Saving Markdown file: {file.get_path()}")
 
-def save_markdown_callback(self, win, webview, result, file):
+def _markdown_document(win, chunks, file):
+    """Convert editor content to Markdown bytes, writing its images beside file
+
+    chunks is the editor HTML in pieces (a ChunkStream, or a list); each is
+    fed to the converter as it arrives.
+    """
+    html2text = import_optional('html2text')
+    
+    # Markdown cannot embed images, so they go in a folder beside the file
+    name = os.path.splitext(os.path.basename(file.get_path()))[0]
+    image_dir = os.path.dirname(file.get_path())
+    full_resolution = getattr(win, 'export_full_resolution', False)
+    
+    # Convert HTML to Markdown
+    h2t = html2text.HTML2Text()
+    h2t.unicode_snob = True        # Use Unicode
+    h2t.body_width = 0             # Don't wrap lines
+    h2t.ignore_links = False       # Preserve links
+    h2t.ignore_images = False      # Preserve images
+    h2t.ignore_tables = False      # Try to handle tables
+    
+    for chunk in chunks:
+        h2t.feed(image_store.package_blobs(chunk, image_dir, f"{name}_files", full_resolution))
+    # handle() finishes the parse of everything fed so far
+    return h2t.handle('').encode('utf-8')
+
+def save_markdown_callback(self, win, webview, result, file, on_done=None):
     """Convert HTML to Markdown and save to file"""
     try:
         js_result = webview.evaluate_javascript_finish(result)
-        if js_result and HTML2TEXT_AVAILABLE:
-            html_content = js_result.get_js_value().to_string() if hasattr(js_result, 'get_js_value') else js_result.to_string()
-            
-            # Convert HTML to Markdown
-            h2t = html2text.HTML2Text()
-            h2t.unicode_snob = True        # Use Unicode
-            h2t.body_width = 0             # Don't wrap lines
-            h2t.ignore_links = False       # Preserve links
-            h2t.ignore_images = False      # Preserve images
-            h2t.ignore_tables = False      # Try to handle tables
-            
-            markdown_content = h2t.handle(html_content)
-            
-            # Replace the file with the new content
-            file.replace_contents_async(
-                markdown_content.encode('utf-8'),
-                None,
-                False,
-                Gio.FileCreateFlags.REPLACE_DESTINATION,
-                None,
-                lambda file, result: self.save_completion_callback(win, file, result)
-            )
+        if js_result:
+            html_content = _editor_content(js_result)
+            # Conversion and image copies happen on the save worker
+            self.save_document(win, file, lambda: _markdown_document(win, [html_content], file), on_done)
     except Exception as e:
         print(f"Error converting to Markdown for save: {e}")
         win.statusbar.set_text(f"Error saving Markdown: {e}")
-        # Fallback to HTML
-        self.save_as_html(win, file)
+        self.on_document_saved(win, file, False, str(e), on_done)
 
 def save_completion_callback(self, win, file, result):
-    """Handle save completion"""
+    """Handle completion of a Gio or WebKit save started outside the save engine"""
     try:
-        # For WebKit save operations, the result might be None or not a valid GIO task
         if result is None:
-            # WebKit's direct save doesn't provide a result to finish
             success = True
+        elif hasattr(result, 'get_web_error'):
+            error = result.get_web_error()
+            success = error is None
+            if not success:
+                print(f"WebKit save error: {error.get_message()}")
         else:
-            try:
-                # Check if this is a WebKit result (which is different from a GIO result)
-                if hasattr(result, 'get_web_error'):
-                    # WebKit result handling
-                    error = result.get_web_error()
-                    success = (error is None)
-                    if not success:
-                        print(f"WebKit save error: {error.get_message()}")
-                elif hasattr(file, 'replace_contents_finish'):
-                    # Standard GIO result
-                    success, _ = file.replace_contents_finish(result)
-                else:
-                    # Fallback - assume success unless we have evidence otherwise
-                    success = True
-            except GLib.Error as e:
-                print(f"Error finishing file operation: {e}")
-                success = False
-            except Exception as e:
-                print(f"Unexpected error in save completion: {e}")
-                success = False
-                
-        if success:
-            win.current_file = file
-            win.modified = False
-            self.update_window_title(win)
-            win.statusbar.set_text(f"Saved: {file.get_path()}")
-        else:
-            win.statusbar.set_text("File save was not successful")
-    except Exception as e:
-        print(f"Error completing save: {e}")
-        win.statusbar.set_text(f"Error completing save: {e}")
+            success, _ = file.replace_contents_finish(result)
+        self.on_document_saved(win, file, success, None if success else "File save was not successful")
+    except GLib.Error as e:
+        print(f"Error finishing file operation: {e}")
+        self.on_document_saved(win, file, False, str(e))
 
 # Legacy aliases for backward compatibility
 def _on_save_response(self, win, dialog, result):
@@ -1008,212 +1309,194 @@ def _on_save_as_response(self, win, dialog, result):
     """Backward compatibility method"""
     return self.save_dialog_callback(win, dialog, result)
     
-def _on_get_html_content(self, win, webview, result, file):
+def _on_get_html_content(self, win, webview, result, file, on_done=None):
     """Process HTML content from webview and save to file"""
     try:
         js_result = webview.evaluate_javascript_finish(result)
         if js_result:
-            # Get the content based on the available API
-            if hasattr(js_result, 'get_js_value'):
-                editor_content = js_result.get_js_value().to_string()
-            else:
-                editor_content = js_result.to_string()
-            
-            # Wrap the content in a proper HTML document
-            html_content = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>HTML Document</title>
-    <meta charset="utf-8">
-</head>
-<body>
-{editor_content}
-</body>
-</html>"""
-
-            # Convert the string to bytes
-            content_bytes = html_content.encode('utf-8')
-            
-            # Use the synchronous replace_contents method
-            try:
-                success, etag = file.replace_contents(
-                    content_bytes,
-                    None,  # etag
-                    False,  # make_backup
-                    Gio.FileCreateFlags.REPLACE_DESTINATION,
-                    None   # cancellable
-                )
-                
-                if success:
-                    win.current_file = file
-                    win.modified = False
-                    
-                    # If this was a converted file, update the status
-                    if hasattr(win, 'is_converted_file') and win.is_converted_file:
-                        win.is_converted_file = False
-                        
-                    self.update_window_title(win)
-                    win.statusbar.set_text(f"Saved: {file.get_path()}")
-                else:
-                    win.statusbar.set_text("File save was not successful")
-                    
-            except GLib.Error as e:
-                print(f"Error writing file: {e.message if hasattr(e, 'message') else str(e)}")
-                win.statusbar.set_text(f"Error writing file: {str(e)}")
-                
+            # Wrapping, image export and the write happen on the save worker
+            self.save_html_content(win, _editor_content(js_result), file, on_done)
     except Exception as e:
         print(f"Error processing HTML for save: {e}")
         win.statusbar.set_text(f"Error saving HTML: {e}")
+        self.on_document_saved(win, file, False, str(e), on_done)
         
     
 def _on_file_saved(self, win, file, result):
     """Backward compatibility method"""
     return self.save_completion_callback(win, file, result)
 
-def load_file(self, win, filepath):
-    """Load file content into editor with enhanced format support and image handling"""
+def read_document_content(self, filepath, file_ext, progress=None, cancel=None, store=None):
+    """Read a directly supported document and return its content as HTML
+
+    Runs on a worker thread: decoding, body extraction and Markdown
+    conversion all happen here. Raises document_loader.LoadCancelled when
+    cancel is set before the file has been read. With store, the document's
+    images (MHTML parts, data: URLs and files next to it) are moved into it
+    and referenced by blob URI.
+    """
+    if file_ext in ['.mht', '.mhtml']:
+        content = document_loader.read_mhtml_body(filepath, progress, cancel,
+                                                  add_image=store.add_image if store else None)
+        return image_store.absorb_data_urls(content, store) if store else content
+    
+    chardet = import_optional('chardet')
+    if file_ext in ['.html', '.htm']:
+        content = document_loader.read_html_body(filepath, chardet, progress, cancel)
+        if store:
+            content = image_store.absorb_data_urls(content, store)
+            content = image_store.absorb_file_images(content, os.path.dirname(filepath), store)
+        return content
+    
+    content = document_loader.read_text(filepath, chardet, progress, cancel)
+    if file_ext in ['.md', '.markdown']:
+        # Convert markdown to HTML
+        markdown = import_optional('markdown')
+        if markdown:
+            try:
+                # Get available extensions
+                available_extensions = []
+                for ext in ['tables', 'fenced_code', 'codehilite', 'nl2br', 'sane_lists', 'smarty', 'attr_list']:
+                    try:
+                        # Test if extension can be loaded
+                        markdown.markdown("test", extensions=[ext])
+                        available_extensions.append(ext)
+                    except (ImportError, ValueError):
+                        pass
+                
+                # Convert markdown to HTML
+                content = markdown.markdown(content, extensions=available_extensions)
+            except Exception as e:
+                print(f"Error converting markdown: {e}")
+                # Fallback to simple conversion
+                content = _simple_markdown_to_html(content)
+        else:
+            # Use simplified markdown conversion
+            content = _simple_markdown_to_html(content)
+        if store:
+            content = image_store.absorb_data_urls(content, store)
+            content = image_store.absorb_file_images(content, os.path.dirname(filepath), store)
+    elif file_ext == '.txt':
+        # Convert plain text to HTML
+        content = content.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        content = f"<div>{content.replace(chr(10), '<br>')}</div>"
+    return content
+
+def load_file(self, win, filepath, job=None):
+    """Load file content into editor with enhanced format support and image handling
+
+    Reading, decoding and conversion run in the shared load pool and the
+    window is filled in from the main loop once the content is ready. Loads
+    that take a while show a dialog with progress and a Cancel button.
+
+    With job (a DocumentLoadJob from open_files), progress and the outcome go
+    to the job's row in the shared dialog instead, and win may be None: the
+    window is then created when the content is ready.
+    """
+    state = {'dialog': None, 'done': False, 'fraction': 0.0}
+    
+    def close_loading_dialog():
+        state['done'] = True
+        if state['dialog']:
+            try:
+                state['dialog'].close()
+            except Exception as e:
+                print(f"Warning: Could not close loading dialog: {e}")
+            state['dialog'] = None
+    
     try:
         # Check if file exists
         if not os.path.exists(filepath):
-            self.show_error_dialog("File not found")
+            if job:
+                job.finish("File not found", failed=True)
+            else:
+                self.show_error_dialog(win, "File not found")
             return
-            
-        # Store the original file path format for reference
-        win.original_format = os.path.splitext(filepath)[1].lower()
-        win.original_filepath = filepath
-        
-        # Show loading dialog for potentially slow conversions
-        loading_dialog = None
-        if is_libreoffice_format(filepath) and win.original_format not in ['.html', '.htm', '.txt', '.md', '.markdown']:
-            loading_dialog = self.show_loading_dialog(win)
         
         # Process the file based on its format
         file_ext = os.path.splitext(filepath)[1].lower()
+        needs_conversion = is_libreoffice_format(filepath) and file_ext not in ['.html', '.htm', '.txt', '.md', '.markdown']
+        
+        # Images go to the window's blob store, or a new one for a new window
+        store = self.get_image_store(win) if win is not None else image_store.ImageStore()
+        
+        # A newer load into the same window replaces one still running
+        cancel = job.cancel if job else threading.Event()
+        if win is not None:
+            if getattr(win, 'load_cancel', None):
+                win.load_cancel.set()
+            win.load_cancel = cancel
+        
+        # Cancel or Escape in the dialog; closing it when the load is done is not a cancel
+        def cancel_loading():
+            if not state['done']:
+                cancel.set()
         
-        # Function to continue loading after potential conversion
-        def continue_loading(html_content=None, converted_path=None, image_dir=None):
+        def show_progress_dialog():
+            if not state['done'] and not cancel.is_set():
+                state['dialog'] = self.show_loading_dialog(win, f"Loading {os.path.basename(filepath)}...",
+                                                           on_cancel=cancel_loading)
+                update_progress()
+            return False
+        
+        def update_progress():
+            if job:
+                return job.set_progress(state['fraction'])
+            dialog = state['dialog']
+            if dialog and dialog.progress_bar and state['fraction'] > 0:
+                dialog.progress_bar.set_visible(True)
+                dialog.progress_bar.set_fraction(state['fraction'])
+            return False
+        
+        # Called from the worker thread; the dialog is updated at most once per percent
+        def report_progress(done, total):
+            fraction = done / total if total else 1.0
+            if fraction - state['fraction'] >= 0.01 or fraction >= 1.0:
+                state['fraction'] = fraction
+                GLib.idle_add(update_progress)
+        
+        # Function to continue loading once the content has been read
+        def continue_loading(content, converted_path=None, image_dir=None, image_metrics=None):
+            nonlocal win
             try:
-                # Close loading dialog if it was shown
-                if loading_dialog:
-                    try:
-                        loading_dialog.close()
-                    except Exception as e:
-                        print(f"Warning: Could not close loading dialog: {e}")
+                cancelled = cancel.is_set()
+                close_loading_dialog()
+                if cancelled:
+                    if job:
+                        job.finish("Cancelled")
+                    if win is None:
+                        store.cleanup()
+                    return False
                 
-                # Initialize content variable
-                content = ""
+                if win is None:
+                    win = self.create_window()
+                    win.image_store = store
+                    win.present()
+                    self.update_window_menu()
                 
-                # If we already have HTML content from conversion, use it
-                if html_content:
-                    content = html_content
-                else:
-                    # Try to detect file encoding
-                    encoding = 'utf-8'  # Default encoding
-                    try:
-                        import chardet
-                        with open(filepath, 'rb') as raw_file:
-                            raw_content = raw_file.read()
-                            detected = chardet.detect(raw_content)
-                            if detected['confidence'] > 0.7:
-                                encoding = detected['encoding']
-                    except ImportError:
-                        pass  # Fallback to utf-8 if chardet not available
-                        
-                    # Now read the file with the detected encoding
-                    try:
-                        with open(filepath, 'r', encoding=encoding) as f:
-                            content = f.read()
-                    except UnicodeDecodeError:
-                        # If there's a decode error, try a fallback encoding
-                        with open(filepath, 'r', encoding='latin-1') as f:
-                            content = f.read()
+                # Store the original file path format for reference
+                win.original_format = file_ext
+                win.original_filepath = filepath
                 
-                # Process content based on file type
-                if file_ext in ['.mht', '.mhtml']:
-                    # Handle MHTML files - extract the HTML content
-                    try:
-                        import email
-                        message = email.message_from_string(content)
-                        for part in message.walk():
-                            if part.get_content_type() == 'text/html':
-                                content = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8')
-                                break
-                    except ImportError:
-                        # Fallback to regex extraction if email module not ideal
-                        body_match = re.search(r'Content-Type: text/html.*?charset=["\']?([\w-]+)["\']?.*?(?:\r?\n){2}(.*?)(?:\r?\n){1,2}--', 
-                                              content, re.DOTALL | re.IGNORECASE)
-                        if body_match:
-                            charset, html_content = body_match.groups()
-                            content = html_content
-                            
-                    # Extract body content from the HTML
-                    body_match = re.search(r'<body[^>]*>(.*?)</body>', content, re.DOTALL | re.IGNORECASE)
-                    if body_match:
-                        content = body_match.group(1).strip()
-                        
-                elif file_ext in ['.html', '.htm']:
-                    # Handle HTML content
-                    body_match = re.search(r'<body[^>]*>(.*?)</body>', content, re.DOTALL | re.IGNORECASE)
-                    if body_match:
-                        content = body_match.group(1).strip()
-                        
-                elif file_ext in ['.md', '.markdown']:
-                    # Convert markdown to HTML
-                    if MARKDOWN_AVAILABLE:
-                        try:
-                            # Get available extensions
-                            available_extensions = []
-                            for ext in ['tables', 'fenced_code', 'codehilite', 'nl2br', 'sane_lists', 'smarty', 'attr_list']:
-                                try:
-                                    # Test if extension can be loaded
-                                    markdown.markdown("test", extensions=[ext])
-                                    available_extensions.append(ext)
-                                except (ImportError, ValueError):
-                                    pass
-                            
-                            # Convert markdown to HTML
-                            content = markdown.markdown(content, extensions=available_extensions)
-                        except Exception as e:
-                            print(f"Error converting markdown: {e}")
-                            # Fallback to simple conversion
-                            content = self._simple_markdown_to_html(content)
-                    else:
-                        # Use simplified markdown conversion
-                        content = self._simple_markdown_to_html(content)
-                elif file_ext == '.txt':
-                    # Convert plain text to HTML
-                    content = content.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-                    content = f"<div>{content.replace(chr(10), '<br>')}</div>"
+                if converted_path:
+                    # Mark this as a converted file
+                    win.is_converted_file = True
                 
-                # Process image references for converted LibreOffice documents
-                if converted_path and image_dir and os.path.exists(image_dir):
-                    # Look for an 'images' subfolder that LibreOffice might have created
-                    images_folder = os.path.join(image_dir, 'images')
-                    if os.path.exists(images_folder) and os.path.isdir(images_folder):
-                        print(f"Found images folder: {images_folder}")
-                        # Store the image directory for reference
-                        win.image_dir = images_folder
-                        
-                        # Process the image references in the content
-                        content = self._process_image_references(content, images_folder)
-                    else:
-                        # Check for any image files in the main output directory
-                        image_files = [f for f in os.listdir(image_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
-                        if image_files:
-                            print(f"Found {len(image_files)} image files in output directory")
-                            win.image_dir = image_dir
-                            content = self._process_image_references(content, image_dir)
-                        else:
-                            print(f"No images folder or image files found in {image_dir}")
+                # Images extracted by the conversion were stored by the worker
+                if image_dir:
+                    win.image_dir = image_dir
+                if image_metrics:
+                    win.image_import_metrics = image_metrics
+                    if getattr(self, 'profile_startup', False):
+                        print(f"Image import: {image_metrics}")
                 
                 # Ensure content is properly wrapped in a div if not already
                 if not (content.strip().startswith('<div') or content.strip().startswith('<p') or 
                        content.strip().startswith('<h')):
                     content = f"<div>{content}</div>"
                 
-                # Escape for JavaScript
-                content = content.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
-                js_code = f'setContent("{content}");'
+                # Hand the body to the page out of band rather than as a JS literal
+                js_code = self.stage_document_content(win, content)
                 
                 # Check WebView load status and execute JS accordingly
                 def execute_when_ready():
@@ -1238,7 +1521,7 @@ def load_file(self, win, filepath):
                 GLib.timeout_add(50, execute_when_ready)
                 
                 # Update file information - CHANGED BEHAVIOR HERE
-                if converted_path and is_libreoffice_format(filepath) and win.original_format not in ['.html', '.htm', '.txt', '.md', '.markdown']:
+                if converted_path:
                     # For LibreOffice files that were converted, use the HTML file as the current file
                     win.current_file = Gio.File.new_for_path(converted_path)
                     win.statusbar.set_text(f"Opened {os.path.basename(filepath)} (converted to HTML)")
@@ -1251,72 +1534,97 @@ def load_file(self, win, filepath):
                 
                 win.modified = False
                 self.update_window_title(win)
+                if job:
+                    job.finish("Opened")
                         
             except Exception as e:
-                # Close loading dialog if it was shown
-                if loading_dialog:
-                    try:
-                        loading_dialog.close()
-                    except:
-                        pass
+                close_loading_dialog()
                 print(f"Error processing file content: {str(e)}")
+                if job:
+                    job.finish(f"Error: {e}", failed=True)
+                    return False
                 win.statusbar.set_text(f"Error processing file: {str(e)}")
-                self.show_error_dialog(f"Error processing file: {e}")
+                self.show_error_dialog(win, f"Error processing file: {e}")
+            return False
         
-        # Check if file needs LibreOffice conversion
-        if is_libreoffice_format(filepath) and file_ext not in ['.html', '.htm', '.txt', '.md', '.markdown']:
-            # Start the conversion in a separate thread to keep UI responsive
-            def convert_thread():
-                try:
-                    # Convert the file to HTML using LibreOffice
-                    converted_file, image_dir = self.convert_with_libreoffice(filepath, "html")
+        def loading_failed(message):
+            close_loading_dialog()
+            if win is None:
+                store.cleanup()
+            if job:
+                return job.finish(message, failed=True)
+            win.statusbar.set_text(message)
+            self.show_error_dialog(win, message)
+            return False
+        
+        def loading_cancelled():
+            close_loading_dialog()
+            if win is None:
+                store.cleanup()
+            if job:
+                return job.finish("Cancelled")
+            if win is not None:
+                win.statusbar.set_text(f"Cancelled opening {os.path.basename(filepath)}")
+            return False
+        
+        def read_thread():
+            try:
+                if cancel.is_set():
+                    raise document_loader.LoadCancelled()
+                if job:
+                    job.started = True
+                    GLib.idle_add(job.set_status, "Converting…" if needs_conversion else "Reading…")
+                if needs_conversion:
+                    # An unchanged document reuses its earlier import whole
+                    cache_key = _conversion_cache_key(filepath)
+                    cached = _cached_conversion(cache_key, store)
+                    if cached:
+                        print(f"Using cached conversion of {filepath}")
+                        GLib.idle_add(continue_loading, *cached)
+                        return
                     
-                    if converted_file:
-                        # Read the converted HTML file
-                        try:
-                            with open(converted_file, 'r', encoding='utf-8') as f:
-                                html_content = f.read()
-                                
-                            # Extract body content
-                            body_match = re.search(r'<body[^>]*>(.*?)</body>', html_content, re.DOTALL | re.IGNORECASE)
-                            if body_match:
-                                html_content = body_match.group(1).strip()
-
-                            # Mark this as a converted file
-                            win.is_converted_file = True
-                                                        
-                            # Schedule continuing in the main thread with the HTML content
-                            GLib.idle_add(lambda: continue_loading(html_content, converted_file, image_dir))
-                        except Exception as e:
-                            print(f"Error reading converted file: {e}")
-                            GLib.idle_add(lambda: self.show_error_dialog(f"Error reading converted file: {e}"))
-                            GLib.idle_add(lambda: loading_dialog.close() if loading_dialog else None)
-                    else:
-                        # Conversion failed
-                        GLib.idle_add(lambda: self.show_error_dialog("Failed to convert document with LibreOffice. Please check if LibreOffice is installed correctly."))
-                        GLib.idle_add(lambda: loading_dialog.close() if loading_dialog else None)
-                except Exception as e:
-                    print(f"Error in conversion thread: {e}")
-                    GLib.idle_add(lambda: self.show_error_dialog(f"Conversion error: {e}"))
-                    GLib.idle_add(lambda: loading_dialog.close() if loading_dialog else None)
-                
-                return False  # Don't repeat
-            
-            # Start the conversion thread
-            GLib.idle_add(lambda: GLib.Thread.new(None, convert_thread) and False)
-        else:
-            # Continue with normal loading for directly supported formats
-            continue_loading()
+                    # Convert the file to HTML using LibreOffice
+                    converted_file, image_dir = self.convert_with_libreoffice(filepath, "html", cancel)
+                    if cancel.is_set():
+                        raise document_loader.LoadCancelled()
+                    if not converted_file:
+                        GLib.idle_add(loading_failed, "Failed to convert document with LibreOffice. Please check if LibreOffice is installed correctly.")
+                        return
+                    content = document_loader.read_html_body(converted_file, progress=report_progress, cancel=cancel)
+                    # Move the images LibreOffice extracted into the blob store
+                    image_metrics = {}
+                    if image_dir and os.path.isdir(image_dir):
+                        content = self._process_image_references(content, image_dir, store, image_metrics)
+                    _cache_conversion(cache_key, content, converted_file, store, filepath)
+                    GLib.idle_add(continue_loading, content, converted_file, image_dir, image_metrics)
+                else:
+                    content = self.read_document_content(filepath, file_ext, report_progress, cancel, store)
+                    GLib.idle_add(continue_loading, content)
+            except document_loader.LoadCancelled:
+                GLib.idle_add(loading_cancelled)
+            except Exception as e:
+                print(f"Error loading file: {e}")
+                GLib.idle_add(loading_failed, f"Error loading file: {e}")
+        
+        # Conversions are always slow enough for the dialog; direct reads only
+        # get it if they are still running after LOAD_DIALOG_DELAY_MS. Jobs
+        # report to the shared dialog instead.
+        if job is None:
+            if needs_conversion:
+                show_progress_dialog()
+            else:
+                GLib.timeout_add(LOAD_DIALOG_DELAY_MS, show_progress_dialog)
+        
+        (get_conversion_pool() if needs_conversion else get_load_pool()).submit(read_thread)
             
     except Exception as e:
-        if loading_dialog:
-            try:
-                loading_dialog.close()
-            except:
-                pass
+        close_loading_dialog()
         print(f"Error loading file: {str(e)}")
+        if job:
+            job.finish(f"Error: {e}", failed=True)
+            return
         win.statusbar.set_text(f"Error loading file: {str(e)}")
-        self.show_error_dialog(f"Error loading file: {e}")
+        self.show_error_dialog(win, f"Error loading file: {e}")
 
 def show_conversion_notification(self, win, original_path, html_path):
     """Show a notification that the file was converted"""
@@ -1389,94 +1697,162 @@ def update_window_title(self, win):
     
     win.set_title(title)
 
-def _process_image_references(self, html_content, image_dir):
-    """Process image references in HTML content converted from LibreOffice documents"""
+# Images extracted by a conversion are read this many at a time; mostly I/O
+IMAGE_POOL_SIZE = min(8, (os.cpu_count() or 2) * 2)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp')
+
+def _conversion_cache_key(filepath):
+    """Return the conversion cache key for importing filepath, or None"""
+    try:
+        return conversion_cache.cache_key(filepath, "html")
+    except OSError as e:
+        print(f"Conversion cache unavailable: {e}")
+        return None
+
+def _cached_conversion(cache_key, store):
+    """Return (content, converted file, its directory, metrics) for a cached
+    import, with its images put into store, or None on a miss"""
+    if not cache_key:
+        return None
+    started = time.perf_counter()
+    cached = conversion_cache.lookup(cache_key)
+    if not cached:
+        return None
+    converted_file, temp_dir, blobs = cached
+    try:
+        for blob_id, path in blobs.items():
+            store.adopt_file(blob_id, path)
+        with open(converted_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except (OSError, ValueError) as e:
+        print(f"Could not use cached conversion: {e}")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        return None
+    metrics = {'cached': True, 'images': len(blobs),
+               'seconds': round(time.perf_counter() - started, 3)}
+    return content, converted_file, temp_dir, metrics
+
+def _cache_conversion(cache_key, content, converted_file, store, filepath):
+    """Cache a finished import: its body and the images it references"""
+    if not cache_key:
+        return
+    blobs = {}
+    for blob_id in dict.fromkeys(image_store.BLOB_URI.findall(content)):
+        path = store.path(blob_id)
+        if path:
+            blobs[blob_id] = path
+    try:
+        conversion_cache.store(cache_key, content, os.path.basename(converted_file),
+                               blobs, os.path.basename(filepath))
+    except OSError as e:
+        print(f"Could not cache conversion: {e}")
+
+def _build_image_index(image_dir):
+    """Index the image files under image_dir by relative path, name and stem
+
+    Built once per conversion so resolving a reference is a dictionary
+    lookup instead of a filesystem probe and a scan over every file.
+    """
+    index = {'paths': {}, 'names': {}, 'stems': {}}
+    for root, dirs, files in os.walk(image_dir):
+        for name in files:
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            index['paths'][os.path.relpath(path, image_dir)] = path
+            # The first file found wins, as the old directory scan did
+            index['names'].setdefault(name.lower(), path)
+            index['stems'].setdefault(os.path.splitext(name)[0].lower(), path)
+    return index
+
+def _resolve_image(src, image_dir, index):
+    """Return (file for an <img> src, how it matched) from an image index"""
+    import urllib.parse
+    # LibreOffice URL-encodes the names it writes
+    decoded_src = urllib.parse.unquote(src)
+    path = index['paths'].get(os.path.normpath(decoded_src))
+    if path:
+        return path, 'path'
+    name = os.path.basename(decoded_src).lower()
+    path = index['names'].get(name)
+    if path:
+        return path, 'name'
+    path = index['stems'].get(os.path.splitext(name)[0])
+    if path:
+        return path, 'stem'
+    return None, 'missing'
+
+def _process_image_references(self, html_content, image_dir, store=None, metrics=None):
+    """Process image references in HTML content converted from LibreOffice documents
+
+    Found images are moved into store and referenced by blob URI; without a
+    store they are embedded as data: URLs. References are resolved through an
+    index of image_dir, the images are read concurrently and the HTML is
+    rewritten in one pass. Counts and timings go into metrics when given.
+    """
+    started = time.perf_counter()
+    if metrics is None:
+        metrics = {}
+    
+    def image_url(img_path):
+        mime_type = self._get_mime_type(img_path)
+        if store is not None:
+            return image_store.blob_uri(store.add_file(img_path, mime_type))
+        import base64
+        with open(img_path, 'rb') as img_file:
+            img_data = base64.b64encode(img_file.read()).decode('utf-8')
+        return f"data:{mime_type};base64,{img_data}"
+    
     try:
-        import urllib.parse  # Add this import for URL decoding
-        print(f"Processing image references from directory: {image_dir}")
+        index = _build_image_index(image_dir)
         
-        # Find all image tags in the HTML
-        image_tags = re.findall(r'<img[^>]+src="([^"]+)"[^>]*>', html_content)
-        print(f"Found {len(image_tags)} image references in HTML")
+        # Each distinct reference is resolved once, however often it appears
+        sources = dict.fromkeys(match.group(3) for match in image_store.IMG_SRC.finditer(html_content))
+        matched = {'path': 0, 'name': 0, 'stem': 0, 'missing': 0}
+        resolved = {}
+        for src in sources:
+            # Skip already processed or external images
+            if src.startswith(('http://', 'https://', 'data:', image_store.BLOB_URI_PREFIX)):
+                continue
+            path, how = _resolve_image(src, image_dir, index)
+            matched[how] += 1
+            if path:
+                resolved[src] = path
         
-        # List all files in the image directory
-        image_files = os.listdir(image_dir)
-        print(f"Found {len(image_files)} files in image directory: {image_files}")
+        # Read (and hash or encode) every image file once, in parallel
+        paths = list(dict.fromkeys(resolved.values()))
+        urls = {}
+        failed = 0
+        if paths:
+            with ThreadPoolExecutor(max_workers=min(IMAGE_POOL_SIZE, len(paths)),
+                                    thread_name_prefix='images') as pool:
+                futures = {path: pool.submit(image_url, path) for path in paths}
+                for path, future in futures.items():
+                    try:
+                        urls[path] = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"Error storing image {path}: {e}")
         
-        # Function to process an image tag
-        def process_image_ref(match):
-            img_tag = match.group(0)
-            src = match.group(1)
-            
-            print(f"Processing image reference: {src}")
-            
-            # Skip already processed or external images
-            if src.startswith(('http://', 'https://', 'data:')):
-                print(f"Skipping external image: {src}")
-                return img_tag
-            
-            # URL decode the source - this is key to handling LibreOffice's encoding
-            decoded_src = urllib.parse.unquote(src)
-            print(f"Decoded source: {decoded_src}")
-                
-            # If the src is relative, try to find the image in the image directory
-            img_path = os.path.join(image_dir, decoded_src)
-            if not os.path.exists(img_path):
-                # Try removing any directory prefix
-                img_path = os.path.join(image_dir, os.path.basename(decoded_src))
-                
-            print(f"Looking for image at: {img_path}")
-            
-            if os.path.exists(img_path):
-                print(f"Found image at: {img_path}")
-                
-                # Convert the image to a data URL to embed it directly
-                try:
-                    with open(img_path, 'rb') as img_file:
-                        import base64
-                        img_data = base64.b64encode(img_file.read()).decode('utf-8')
-                        mime_type = self._get_mime_type(img_path)
-                        data_url = f"data:{mime_type};base64,{img_data}"
-                        
-                        # Replace the src attribute with the data URL
-                        new_tag = img_tag.replace(f'src="{src}"', f'src="{data_url}"')
-                        print(f"Converted image to data URL")
-                        return new_tag
-                except Exception as e:
-                    print(f"Error creating data URL for image {img_path}: {e}")
-            else:
-                # Search for any image file with a similar name pattern
-                base_name = os.path.splitext(os.path.basename(decoded_src))[0].lower()
-                print(f"Image not found, searching for similar names with base: {base_name}")
-                
-                for file in image_files:
-                    if base_name in file.lower():
-                        img_path = os.path.join(image_dir, file)
-                        print(f"Found potential match: {img_path}")
-                        
-                        try:
-                            with open(img_path, 'rb') as img_file:
-                                import base64
-                                img_data = base64.b64encode(img_file.read()).decode('utf-8')
-                                mime_type = self._get_mime_type(img_path)
-                                data_url = f"data:{mime_type};base64,{img_data}"
-                                
-                                # Replace the src attribute with the data URL
-                                new_tag = img_tag.replace(f'src="{src}"', f'src="{data_url}"')
-                                print(f"Used similar image as data URL")
-                                return new_tag
-                        except Exception as e:
-                            print(f"Error creating data URL for similar image {img_path}: {e}")
-                            break
-                
-                print(f"No matching image found for {src}")
-                    
-            # If we couldn't process the image, return the original tag
-            return img_tag
+        def replace_src(match):
+            url = urls.get(resolved.get(match.group(3)))
+            if url is None:
+                return match.group(0)
+            return f'{match.group(1)}{match.group(2)}{url}{match.group(2)}'
         
-        # Find and process all image tags
-        processed_html = re.sub(r'<img[^>]+src="([^"]+)"[^>]*>', process_image_ref, html_content)
+        processed_html = image_store.IMG_SRC.sub(replace_src, html_content)
         
+        metrics.update({
+            'files_indexed': len(index['paths']),
+            'references': len(sources),
+            'matched_by_path': matched['path'],
+            'matched_by_name': matched['name'],
+            'matched_by_stem': matched['stem'],
+            'missing': matched['missing'],
+            'images_stored': len(urls),
+            'failed': failed,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+        })
         return processed_html
     except Exception as e:
         print(f"Error processing image references: {e}")
@@ -1505,9 +1881,27 @@ def cleanup_temp_files(self, win):
             shutil.rmtree(win.image_dir)
         except Exception as e:
             print(f"Error cleaning up image directory: {e}")
+    
+    # Images pasted into other windows were copied into their own stores, so
+    # the window's store goes too, once no save is still exporting from it
+    store = getattr(win, 'image_store', None)
+    if store is not None:
+        win.image_store = None
+        path = win.current_file.get_path() if getattr(win, 'current_file', None) else None
+        
+        def remove_store():
+            if path and get_save_engine().is_saving(path):
+                return True  # Check again shortly
+            store.cleanup()
+            return False
+        
+        if remove_store():
+            GLib.timeout_add(500, remove_store)
 
-def save_as_pdf(self, win, file):
+def save_as_pdf(self, win, file, on_done=None):
     """Save document as PDF with page setup options"""
+    # Reported when printing finishes, after the page setup dialog
+    win.pdf_save_done = on_done
     # First show page setup dialog
     self.show_page_setup_dialog(win, file)
     return True
@@ -1665,12 +2059,19 @@ def show_page_setup_dialog(self, win, file):
 
 def _generate_pdf_with_settings(self, win, file, paper_size_name, orientation, 
                                top_margin, right_margin, bottom_margin, left_margin):
-    """Generate PDF with specified page settings"""
+    """Generate PDF with specified page settings
+
+    WebKit prints into a temporary file next to the target; the save engine
+    moves it into place once printing has finished, so success is reported
+    only for a complete PDF.
+    """
     # Show a loading dialog since PDF conversion can take time
     loading_dialog = self.show_loading_dialog(win, "Saving document as PDF...")
     
     # Get the file path for the PDF output
     output_path = file.get_path()
+    fd, print_path = tempfile.mkstemp(dir=os.path.dirname(output_path), prefix='.print-', suffix='.pdf')
+    os.close(fd)
     
     try:
         # Create print settings for PDF output
@@ -1678,7 +2079,7 @@ def _generate_pdf_with_settings(self, win, file, paper_size_name, orientation,
         
         # Configure settings - using WebKit 6.0 style 
         print_settings.set(Gtk.PRINT_SETTINGS_OUTPUT_FILE_FORMAT, "pdf")
-        print_settings.set(Gtk.PRINT_SETTINGS_OUTPUT_URI, f"file://{output_path}")
+        print_settings.set(Gtk.PRINT_SETTINGS_OUTPUT_URI, Gio.File.new_for_path(print_path).get_uri())
         print_settings.set(Gtk.PRINT_SETTINGS_PRINTER, "Print to File")
         
         # Create page setup with specified settings
@@ -1702,64 +2103,68 @@ def _generate_pdf_with_settings(self, win, file, paper_size_name, orientation,
         print_operation.set_print_settings(print_settings)
         print_operation.set_page_setup(page_setup)
         
-        # For headless printing (no dialog), we use the print method directly
-        result = print_operation.print_()
-        
-        # Success handling doesn't need a callback with this approach
-        if loading_dialog:
-            loading_dialog.close()
-            
-        # Update file info - the PDF is now saved
-        win.current_file = file
-        win.modified = False
-        self.update_window_title(win)
-        win.statusbar.set_text(f"PDF saved to: {output_path}")
+        # "failed" is followed by "finished"; only a clean finish saves the file
+        state = {'error': None}
+        print_operation.connect("failed", lambda operation, error: state.update(error=error))
+        print_operation.connect("finished", lambda operation: (
+            self._on_pdf_print_failed(win, state['error'], loading_dialog, file, print_path) if state['error']
+            else self._on_pdf_print_finished(win, file, loading_dialog, print_path)))
         
+        # Printing runs asynchronously and ends with one of the signals above
+        win.pdf_print_operation = print_operation
+        print_operation.print_()
+        win.statusbar.set_text(f"Printing PDF: {output_path}")
         return True
         
     except Exception as e:
-        # Handle any errors
-        if loading_dialog:
-            loading_dialog.close()
-        
-        print(f"Error saving PDF: {e}")
-        win.statusbar.set_text(f"Error saving PDF: {e}")
-        self.show_error_dialog(f"Failed to save PDF: {e}")
+        self._on_pdf_print_failed(win, e, loading_dialog, file, print_path)
         return False
 
-def _on_pdf_print_finished(self, win, file, loading_dialog):
-    """Handle successful PDF print operation"""
-    try:
-        # Close loading dialog
+def _on_pdf_print_finished(self, win, file, loading_dialog, print_path=None):
+    """Move a finished PDF into place through the save engine"""
+    win.pdf_print_operation = None
+    on_done = getattr(win, 'pdf_save_done', None)
+    win.pdf_save_done = None
+    
+    def produce():
+        try:
+            with open(print_path, 'rb') as f:
+                return f.read()
+        finally:
+            os.unlink(print_path)
+    
+    def saved(success, error):
         if loading_dialog:
             loading_dialog.close()
-        
-        # Update file info and UI
-        win.current_file = file
-        win.modified = False
-        self.update_window_title(win)
-        win.statusbar.set_text(f"PDF saved successfully: {file.get_path()}")
-        
-    except Exception as e:
-        print(f"Error handling PDF print completion: {e}")
-        win.statusbar.set_text(f"Error saving PDF: {e}")
+        if success:
+            win.statusbar.set_text(f"PDF saved to: {file.get_path()}")
+        else:
+            self.show_error_dialog(win, f"Failed to save PDF: {error}")
+        if on_done:
+            on_done(success, error)
+    
+    self.save_document(win, file, produce, saved)
 
-def _on_pdf_print_failed(self, win, error, loading_dialog):
+def _on_pdf_print_failed(self, win, error, loading_dialog, file=None, print_path=None):
     """Handle failed PDF print operation"""
-    try:
-        # Close loading dialog
-        if loading_dialog:
-            loading_dialog.close()
-        
-        # Show error message
-        error_message = error.message if hasattr(error, 'message') else str(error)
-        print(f"PDF print failed: {error_message}")
+    win.pdf_print_operation = None
+    on_done = getattr(win, 'pdf_save_done', None)
+    win.pdf_save_done = None
+    if loading_dialog:
+        loading_dialog.close()
+    if print_path:
+        try:
+            os.unlink(print_path)
+        except OSError:
+            pass
+    
+    error_message = error.message if hasattr(error, 'message') else str(error)
+    print(f"PDF print failed: {error_message}")
+    self.show_error_dialog(win, f"Failed to save PDF: {error_message}")
+    if file is not None:
+        self.on_document_saved(win, file, False, error_message, on_done)
+    else:
         win.statusbar.set_text(f"Error saving PDF: {error_message}")
-        self.show_error_dialog(f"Failed to save PDF: {error_message}")
-        
-    except Exception as e:
-        print(f"Error handling PDF print failure: {e}")
-        win.statusbar.set_text("PDF conversion failed")
 
 def show_format_selection_dialog(self, win):
     """Show dialog to choose the file format"""
@@ -1796,7 +2201,7 @@ def show_format_selection_dialog(self, win):
     ]
     
     # Add markdown if available
-    if HTML2TEXT_AVAILABLE:
+    if is_html2text_available():
         formats.append({"id": "md", "name": "Markdown (.md)", "description": "Markup language with simple syntax"})
     
     for fmt in formats:
@@ -1884,7 +2289,7 @@ def _on_format_selection_response(self, win, dialog):
     elif selected_format == "txt":
         # For TXT format
         self.show_text_save_dialog(win)
-    elif selected_format == "md" and HTML2TEXT_AVAILABLE:
+    elif selected_format == "md" and is_html2text_available():
         # For Markdown format
         self.show_markdown_save_dialog(win)
     else:
@@ -1928,7 +2333,7 @@ def _on_pdf_save_response(self, win, dialog, result):
             self.save_as_pdf(win, file)
     except GLib.Error as e:
         if e.domain != 'gtk-dialog-error-quark' or e.code != 2:  # Ignore cancel
-            self.show_error_dialog(f"Error saving PDF: {e}")    
+            self.show_error_dialog(win, f"Error saving PDF: {e}")    
             
             
 def show_page_setup_dialog(self, win, file):
@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 import gi
+import os
 import re
-from gi.repository import Gtk, Gdk, GLib
+import threading
+from gi.repository import Gtk, Adw, Gdk, GLib, Gio, Pango
+
+import batch_replace
 
 # This module contains find-related methods for the HTML Editor application
 
+FIND_DEBOUNCE_MS = 60  # Coalesce find-as-you-type keystrokes
+ALL_DOCUMENTS_RESULT_LIMIT = 200  # Matches listed per document when searching all windows
+PAGE_CALL_TIMEOUT = 120  # Seconds before a search or replace in one window is given up
+
 def create_find_bar(self, win):
     """Create find/replace bar with revealer for smooth animations"""
     # Create a revealer to animate the find bar
@@ -56,6 +64,13 @@ def create_find_bar(self, win):
     
     
     find_bar.append(nav_box)
+    
+    # Live match counter, updated while a search is still scanning
+    win.match_count_label = Gtk.Label()
+    win.match_count_label.set_width_chars(9)
+    win.match_count_label.set_xalign(0)
+    win.match_count_label.add_css_class("dim-label")
+    find_bar.append(win.match_count_label)
 
     # Add case-sensitive toggle button with uppercase icon
     win.case_sensitive_button = Gtk.ToggleButton()
@@ -66,6 +81,31 @@ def create_find_bar(self, win):
     win.case_sensitive_button.connect("toggled", lambda btn: self.on_case_sensitive_toggled(win, btn))
     find_bar.append(win.case_sensitive_button)
     
+    # Whole-word toggle
+    win.whole_word_button = Gtk.ToggleButton()
+    whole_word_label = Gtk.Label()
+    whole_word_label.set_markup("<u>ab</u>")
+    win.whole_word_button.set_child(whole_word_label)
+    win.whole_word_button.set_tooltip_text("Match whole words")
+    win.whole_word_button.add_css_class("flat")
+    win.whole_word_button.connect("toggled", lambda btn: self.on_search_mode_toggled(win, btn))
+    find_bar.append(win.whole_word_button)
+    
+    # Regular expression toggle
+    win.regex_button = Gtk.ToggleButton(label=".*")
+    win.regex_button.set_tooltip_text("Regular expression")
+    win.regex_button.add_css_class("flat")
+    win.regex_button.connect("toggled", lambda btn: self.on_search_mode_toggled(win, btn))
+    find_bar.append(win.regex_button)
+    
+    # Search every open document instead of just this one
+    win.all_documents_button = Gtk.ToggleButton()
+    win.all_documents_button.set_child(Gtk.Image.new_from_icon_name("view-list-symbolic"))
+    win.all_documents_button.set_tooltip_text("Search all open documents")
+    win.all_documents_button.add_css_class("flat")
+    win.all_documents_button.connect("toggled", lambda btn: self.on_all_documents_toggled(win, btn))
+    find_bar.append(win.all_documents_button)
+    
     # Create a separator
     separator = Gtk.Separator(orientation=Gtk.Orientation.VERTICAL)
     separator.set_margin_start(0)
@@ -108,13 +148,15 @@ def create_find_bar(self, win):
 
 
     # Replace All button with icon
-    replace_all_button = Gtk.Button(icon_name="replace-all-symbolic")
-    replace_all_button.set_tooltip_text("Replace All")
-    replace_all_button.add_css_class("linked")
-    replace_all_button.connect("clicked", lambda btn: self.on_replace_all_clicked(win, btn))
+    win.replace_all_button = Gtk.Button(icon_name="replace-all-symbolic")
+    win.replace_all_button.set_tooltip_text("Replace All")
+    win.replace_all_button.add_css_class("linked")
+    win.replace_all_button.connect("clicked", lambda btn: self.on_replace_all_clicked(win, btn))
+    win.replace_all_running = False
+    win.all_documents_replacing = False
 
     rep_box.append(replace_button)
-    rep_box.append(replace_all_button)
+    rep_box.append(win.replace_all_button)
 
     find_bar.append(rep_box)
         
@@ -139,8 +181,29 @@ def create_find_bar(self, win):
     close_button.set_margin_end(6)
     #find_bar.append(close_button)
     
+    # Results from all open documents, shown below the find bar
+    win.search_results_list = Gtk.ListBox()
+    win.search_results_list.set_selection_mode(Gtk.SelectionMode.SINGLE)
+    win.search_results_list.add_css_class("navigation-sidebar")
+    win.search_results_list.connect("row-activated",
+                                    lambda listbox, row: self.on_search_result_activated(win, row))
+    results_scroller = Gtk.ScrolledWindow()
+    results_scroller.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+    results_scroller.set_max_content_height(200)
+    results_scroller.set_propagate_natural_height(True)
+    results_scroller.set_child(win.search_results_list)
+    win.search_results_revealer = Gtk.Revealer()
+    win.search_results_revealer.set_transition_type(Gtk.RevealerTransitionType.SLIDE_DOWN)
+    win.search_results_revealer.set_reveal_child(False)
+    win.search_results_revealer.set_child(results_scroller)
+    win.all_documents_generation = 0
+    
+    find_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=0)
+    find_box.append(find_bar)
+    find_box.append(win.search_results_revealer)
+    
     # Set the find bar as the child of the revealer
-    win.find_bar_revealer.set_child(find_bar)
+    win.find_bar_revealer.set_child(find_box)
     
     return win.find_bar_revealer
 
@@ -271,6 +334,7 @@ def on_close_find_clicked(self, win, button, param=None):
         # Clear any highlighting
         js_code = "clearSearch();"
         win.webview.evaluate_javascript(js_code, -1, None, None, None, None)
+        self._clear_all_documents_results(win)
         win.webview.grab_focus()
         win.statusbar.set_text("Find and replace closed")
 
@@ -288,42 +352,93 @@ def on_case_sensitive_toggled(self, win, button):
     status_text = "Case-sensitive search enabled" if is_case_sensitive else "Case-sensitive search disabled"
     win.statusbar.set_text(status_text)
 
+def on_search_mode_toggled(self, win, button):
+    """Handle the whole-word and regular expression toggles"""
+    if win.find_entry.get_text():
+        self.on_find_text_changed(win, win.find_entry)
+    
+    state = "enabled" if button.get_active() else "disabled"
+    win.statusbar.set_text(f"{button.get_tooltip_text()} {state}")
+
 def on_find_text_changed(self, win, entry):
-    """Handle find text changes with support for multi-line text"""
+    """Handle find text changes, searching once typing pauses briefly"""
+    if getattr(win, 'find_timeout_id', None):
+        GLib.source_remove(win.find_timeout_id)
+    win.find_timeout_id = GLib.timeout_add(FIND_DEBOUNCE_MS, self._run_find, win, entry)
+
+def _run_find(self, win, entry):
+    """Search for the find entry's text with support for multi-line text"""
+    win.find_timeout_id = None
     search_text = entry.get_text()
-    if search_text:
-        # Get the case sensitivity setting
-        is_case_sensitive = win.case_sensitive_button.get_active() if hasattr(win, 'case_sensitive_button') else False
-        
+    if not search_text:
+        win.webview.evaluate_javascript("clearSearch();", -1, None, None, None, None)
+        self._clear_all_documents_results(win)
+        win.status_label.set_text("")
+        win.match_count_label.set_text("")
+    elif win.all_documents_button.get_active():
+        self.search_all_documents(win, search_text)
+    else:
         # Properly escape for JavaScript including newlines
         import json
         search_text_json = json.dumps(search_text)  # This properly escapes all special chars including newlines
         
         js_code = f"""
-        searchAndHighlight({search_text_json}, {str(is_case_sensitive).lower()});
+        startSearch({search_text_json}, {json.dumps(self._get_search_options(win))});
         """
         win.webview.evaluate_javascript(js_code, -1, None, None, None, 
                                     lambda webview, result: self.on_search_result(win, webview, result))
+    return False
+
+def _get_search_options(self, win):
+    """Return the find bar's mode toggles as options for the page's search functions"""
+    return {
+        'caseSensitive': win.case_sensitive_button.get_active() if hasattr(win, 'case_sensitive_button') else False,
+        'wholeWord': win.whole_word_button.get_active() if hasattr(win, 'whole_word_button') else False,
+        'regex': win.regex_button.get_active() if hasattr(win, 'regex_button') else False,
+    }
 
 def on_search_result(self, win, webview, result):
-    """Handle search result"""
+    """Handle search result; scans run in the search worker report through on_search_progress"""
     try:
         js_result = webview.evaluate_javascript_finish(result)
         if js_result and not js_result.is_null():
-            count = js_result.to_int32()
-            if count > 0:
-                status_message = f"Found {count} matches"
-                win.status_label.set_text(status_message)
-                win.statusbar.set_text(status_message)  # Also update the statusbar
-            else:
-                status_message = "No matches found"
-                win.status_label.set_text(status_message)
-                win.statusbar.set_text(status_message)  # Also update the statusbar
+            self._show_match_count(win, js_result.to_int32())
     except Exception as e:
         print(f"Error in search: {e}")
-        status_message = "Search error"
-        win.status_label.set_text(status_message)
-        win.statusbar.set_text(status_message)  # Also update the statusbar
+        self._show_match_count(win, 0, error="Search error")
+
+def on_search_progress(self, win, manager, result):
+    """Handle a batch of matches streamed from the search worker"""
+    try:
+        if hasattr(result, 'get_js_value'):
+            message = result.get_js_value().to_string()
+        else:
+            message = result.to_string()
+        
+        import json
+        progress = json.loads(message)
+        self._show_match_count(win, progress.get('count', 0), progress.get('done', True),
+                               progress.get('error'))
+    except Exception as e:
+        print(f"Error handling search progress: {e}")
+
+def _show_match_count(self, win, count, done=True, error=None):
+    """Show the match count in the find bar and statusbar"""
+    if error:
+        counter_text = "Error"
+        status_message = f"Search error: {error}"
+    elif not done:
+        counter_text = f"{count}…"
+        status_message = f"Searching… {count} matches so far"
+    elif count > 0:
+        counter_text = f"{count}"
+        status_message = f"Found {count} matches"
+    else:
+        counter_text = "0"
+        status_message = "No matches found"
+    win.match_count_label.set_text(counter_text)
+    win.status_label.set_text(status_message)
+    win.statusbar.set_text(status_message)  # Also update the statusbar
 
 def on_find_next_clicked(self, win, button):
     """Move to next search result"""
@@ -349,26 +464,34 @@ def on_replace_clicked(self, win, button):
     win.webview.evaluate_javascript(js_code, -1, None, None, None, None)
 
 def on_replace_all_clicked(self, win, button):
-    """Replace all instances of search text with replace text"""
+    """Replace all instances of search text with replace text, or cancel a running Replace All"""
+    if win.replace_all_running:
+        win.webview.evaluate_javascript("cancelReplaceAll();", -1, None, None, None, None)
+        return
+    
     search_text = win.find_entry.get_text()
     replace_text = win.replace_entry.get_text()
     
     if not search_text:
         return
     
+    if win.all_documents_button.get_active():
+        self.replace_all_documents(win, search_text, replace_text)
+        return
+    
     # Properly escape for JavaScript including newlines
     import json
     search_text_json = json.dumps(search_text)
     replace_text_json = json.dumps(replace_text)
     
     js_code = f"""
-    replaceAll({search_text_json}, {replace_text_json});
+    replaceAll({search_text_json}, {replace_text_json}, {json.dumps(self._get_search_options(win))});
     """
     win.webview.evaluate_javascript(js_code, -1, None, None, None, 
                                 lambda webview, result: self.on_replace_all_result(win, webview, result))
 
 def on_replace_all_result(self, win, webview, result):
-    """Handle replace all result"""
+    """Handle replace all result; long runs report through on_replace_progress instead"""
     try:
         js_result = webview.evaluate_javascript_finish(result)
         if js_result and not js_result.is_null():
@@ -380,6 +503,416 @@ def on_replace_all_result(self, win, webview, result):
         status_message = "Replace error"
         win.statusbar.set_text(status_message)
 
+def on_replace_progress(self, win, manager, result):
+    """Handle progress from a Replace All that runs across several frames"""
+    try:
+        if hasattr(result, 'get_js_value'):
+            message = result.get_js_value().to_string()
+        else:
+            message = result.to_string()
+        
+        import json
+        progress = json.loads(message)
+        replaced = progress.get('replaced', 0)
+        total = progress.get('total', 0)
+        done = progress.get('done', True)
+        
+        self._set_replace_all_running(win, not done)
+        if not done:
+            win.match_count_label.set_text(f"{replaced}/{total}")
+            status_message = f"Replacing… {replaced} of {total}"
+        elif progress.get('cancelled'):
+            win.match_count_label.set_text("")
+            status_message = "Replace All cancelled"
+        else:
+            win.match_count_label.set_text("")
+            status_message = f"Replaced {replaced} occurrences"
+        win.statusbar.set_text(status_message)
+    except Exception as e:
+        print(f"Error handling replace progress: {e}")
+
+def _set_replace_all_running(self, win, running):
+    """Turn the Replace All button into a cancel button while a run is in progress"""
+    if win.replace_all_running == running:
+        return
+    win.replace_all_running = running
+    if running:
+        win.replace_all_button.set_icon_name("process-stop-symbolic")
+        win.replace_all_button.set_tooltip_text("Cancel Replace All")
+    else:
+        win.replace_all_button.set_icon_name("replace-all-symbolic")
+        win.replace_all_button.set_tooltip_text("Replace All")
+
+# ---- SEARCH ALL OPEN DOCUMENTS ----
+def on_all_documents_toggled(self, win, button):
+    """Switch between searching this document and all open documents"""
+    if button.get_active():
+        win.statusbar.set_text("Searching all open documents")
+    else:
+        self._clear_all_documents_results(win)
+        win.statusbar.set_text("Searching this document")
+    if win.find_entry.get_text():
+        self.on_find_text_changed(win, win.find_entry)
+
+def _call_page_function(self, webview, body, arguments, callback, timeout=PAGE_CALL_TIMEOUT):
+    """Run an async function body in a page, passing string arguments
+
+    The call is cancelled after timeout seconds, so callback always runs:
+    finishing a cancelled call raises, like any other failure.
+    """
+    variant = GLib.Variant('a{sv}', {name: GLib.Variant('s', value) for name, value in arguments.items()})
+    cancellable = Gio.Cancellable()
+    
+    def on_timeout():
+        print(f"Page call timed out after {timeout} seconds")
+        cancellable.cancel()
+        return False
+    
+    timeout_id = GLib.timeout_add_seconds(timeout, on_timeout)
+    
+    def on_finished(source, result):
+        if not cancellable.is_cancelled():
+            GLib.source_remove(timeout_id)
+        callback(source, result)
+    
+    webview.call_async_javascript_function(body, -1, variant, None, None, cancellable, on_finished)
+
+def _clear_all_documents_results(self, win):
+    """Empty the all-documents results list"""
+    win.all_documents_generation += 1
+    win.search_results_list.remove_all()
+    win.search_results_revealer.set_reveal_child(False)
+
+def search_all_documents(self, win, search_text):
+    """Search every open window at once and stream the matches into one list
+
+    The other windows are only read: their own searches and highlights are
+    left as they are, and each result carries the offsets to jump to.
+    """
+    import json
+    self._clear_all_documents_results(win)
+    generation = win.all_documents_generation
+    targets = list(self.windows)
+    win.all_documents_pending = len(targets)
+    win.all_documents_total = 0
+    win.all_documents_hits = 0
+    win.search_results_revealer.set_reveal_child(True)
+    self._show_match_count(win, 0, done=False)
+    
+    arguments = {
+        'searchText': search_text,
+        'options': json.dumps(self._get_search_options(win)),
+        'limit': str(ALL_DOCUMENTS_RESULT_LIMIT),
+    }
+    for target in targets:
+        self._call_page_function(
+            target.webview,
+            "return await listSearchMatches(searchText, JSON.parse(options), parseInt(limit));",
+            arguments,
+            lambda webview, result, target=target: self._on_document_matches(win, target, generation, webview, result))
+
+def _on_document_matches(self, win, target, generation, webview, result):
+    """Add one document's matches to the results list"""
+    import json
+    if generation != win.all_documents_generation:
+        return  # A newer search has started
+    win.all_documents_pending -= 1
+    try:
+        found = json.loads(webview.call_async_javascript_function_finish(result).to_string())
+    except Exception as e:
+        print(f"Error searching {target.get_title()}: {e}")
+        found = {'count': 0, 'matches': []}
+    
+    if found['count'] > 0:
+        win.all_documents_total += found['count']
+        win.all_documents_hits += 1
+        title = GLib.markup_escape_text(target.get_title() or "Untitled")
+        for match in found['matches']:
+            label = Gtk.Label()
+            label.set_xalign(0)
+            label.set_ellipsize(Pango.EllipsizeMode.END)
+            label.set_markup(f"<b>{title}</b>  {GLib.markup_escape_text(match['before'])}"
+                             f"<span background='#FFFF00' foreground='#000000'>"
+                             f"{GLib.markup_escape_text(match['match'])}</span>"
+                             f"{GLib.markup_escape_text(match['after'])}")
+            row = Gtk.ListBoxRow()
+            row.set_child(label)
+            row.target_window = target
+            row.match_start = match['start']
+            row.match_end = match['end']
+            win.search_results_list.append(row)
+        if found['count'] > len(found['matches']):
+            more = Gtk.Label(label=f"{found['count'] - len(found['matches'])} more in {target.get_title()}")
+            more.set_xalign(0)
+            more.add_css_class("dim-label")
+            row = Gtk.ListBoxRow(activatable=False, selectable=False)
+            row.set_child(more)
+            win.search_results_list.append(row)
+    
+    done = win.all_documents_pending == 0
+    self._show_match_count(win, win.all_documents_total, done=done)
+    if done and win.all_documents_total > 0:
+        status_message = f"Found {win.all_documents_total} matches in {win.all_documents_hits} documents"
+        win.status_label.set_text(status_message)
+        win.statusbar.set_text(status_message)
+
+def on_search_result_activated(self, win, row):
+    """Jump to a match from the all-documents results list"""
+    target = getattr(row, 'target_window', None)
+    if target is None or target not in self.windows:
+        return
+    target.present()
+    target.webview.evaluate_javascript(f"selectDocumentRange({row.match_start}, {row.match_end});",
+                                       -1, None, None, None, None)
+    target.webview.grab_focus()
+
+def replace_all_documents(self, win, search_text, replace_text):
+    """Replace all matches in every open window as one batch; each document gets its own undo entry
+
+    Replace All stays insensitive until every window has answered, so a
+    second click cannot start an overlapping pass.
+    """
+    import json
+    if win.all_documents_replacing:
+        return
+    win.all_documents_replacing = True
+    win.replace_all_button.set_sensitive(False)
+    targets = list(self.windows)
+    batch = {'pending': len(targets), 'replaced': 0, 'documents': 0}
+    arguments = {
+        'searchText': search_text,
+        'replaceText': replace_text,
+        'options': json.dumps(self._get_search_options(win)),
+    }
+    win.statusbar.set_text(f"Replacing in {len(targets)} documents…")
+    
+    def on_document_replaced(webview, result, target):
+        batch['pending'] -= 1
+        try:
+            count = webview.call_async_javascript_function_finish(result).to_int32()
+        except Exception as e:
+            print(f"Error replacing in {target.get_title()}: {e}")
+            count = 0
+        if count > 0:
+            batch['replaced'] += count
+            batch['documents'] += 1
+        if batch['pending'] == 0:
+            win.all_documents_replacing = False
+            win.replace_all_button.set_sensitive(True)
+            self._clear_all_documents_results(win)
+            win.match_count_label.set_text("")
+            win.statusbar.set_text(f"Replaced {batch['replaced']} occurrences in {batch['documents']} documents")
+    
+    for target in targets:
+        self._call_page_function(
+            target.webview,
+            "return await replaceAllInDocument(searchText, replaceText, JSON.parse(options));",
+            arguments,
+            lambda webview, result, target=target: on_document_replaced(webview, result, target))
+
+# ---- FOLDER-WIDE SEARCH AND REPLACE ----
+def on_batch_replace(self, action, param):
+    """Show the folder-wide search and replace dialog"""
+    if not self.windows:
+        return
+    active_win = next((win for win in self.windows if win.is_active()), self.windows[0])
+    self.show_batch_replace_dialog(active_win)
+
+def show_batch_replace_dialog(self, win):
+    """Dialog for batch_replace: choose a folder, preview matches, then replace"""
+    dialog = Adw.Dialog.new()
+    dialog.set_title("Replace in Folder")
+    dialog.set_content_width(560)
+    dialog.set_content_height(520)
+    
+    # Start in the current document's folder
+    current_path = win.current_file.get_path() if getattr(win, 'current_file', None) else None
+    state = {
+        'folder': os.path.dirname(current_path) if current_path else os.path.expanduser("~"),
+        'cancel': None,
+    }
+    
+    content_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=8)
+    content_box.set_margin_top(24)
+    content_box.set_margin_bottom(24)
+    content_box.set_margin_start(24)
+    content_box.set_margin_end(24)
+    
+    # Folder row
+    folder_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
+    folder_label = Gtk.Label(label=state['folder'])
+    folder_label.set_hexpand(True)
+    folder_label.set_xalign(0)
+    folder_label.set_ellipsize(Pango.EllipsizeMode.START)
+    browse_button = Gtk.Button(label="Choose Folder…")
+    folder_box.append(folder_label)
+    folder_box.append(browse_button)
+    content_box.append(folder_box)
+    
+    def on_folder_chosen(file_dialog, result):
+        try:
+            folder = file_dialog.select_folder_finish(result)
+            if folder:
+                state['folder'] = folder.get_path()
+                folder_label.set_text(state['folder'])
+        except GLib.Error as e:
+            # Ignore cancellation
+            if e.domain != 'gtk-dialog-error-quark' or e.code != 2:
+                print(f"Error selecting folder: {e}")
+    
+    def on_browse(button):
+        file_dialog = Gtk.FileDialog.new()
+        file_dialog.set_title("Select Folder")
+        file_dialog.set_initial_folder(Gio.File.new_for_path(state['folder']))
+        file_dialog.select_folder(win, None, on_folder_chosen)
+    
+    browse_button.connect("clicked", on_browse)
+    
+    # Search and replace entries, prefilled from the find bar
+    search_entry = Gtk.Entry()
+    search_entry.set_placeholder_text("Search")
+    search_entry.set_text(win.find_entry.get_text())
+    content_box.append(search_entry)
+    replace_entry = Gtk.Entry()
+    replace_entry.set_placeholder_text("Replace with")
+    replace_entry.set_text(win.replace_entry.get_text())
+    content_box.append(replace_entry)
+    
+    options_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=12)
+    case_check = Gtk.CheckButton(label="Match case")
+    case_check.set_active(win.case_sensitive_button.get_active())
+    word_check = Gtk.CheckButton(label="Whole words")
+    word_check.set_active(win.whole_word_button.get_active())
+    regex_check = Gtk.CheckButton(label="Regular expression")
+    regex_check.set_active(win.regex_button.get_active())
+    for check in (case_check, word_check, regex_check):
+        options_box.append(check)
+    content_box.append(options_box)
+    
+    # Per-file results
+    results_list = Gtk.ListBox()
+    results_list.set_selection_mode(Gtk.SelectionMode.NONE)
+    results_scroller = Gtk.ScrolledWindow()
+    results_scroller.set_vexpand(True)
+    results_scroller.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+    results_scroller.set_child(results_list)
+    content_box.append(results_scroller)
+    
+    progress_label = Gtk.Label()
+    progress_label.set_xalign(0)
+    progress_label.add_css_class("dim-label")
+    content_box.append(progress_label)
+    
+    # Dialog buttons
+    button_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
+    button_box.set_halign(Gtk.Align.END)
+    button_box.set_margin_top(12)
+    close_button = Gtk.Button(label="Close")
+    preview_button = Gtk.Button(label="Preview")
+    replace_button = Gtk.Button(label="Replace All")
+    replace_button.add_css_class("destructive-action")
+    for button in (close_button, preview_button, replace_button):
+        button_box.append(button)
+    content_box.append(button_box)
+    
+    def add_result_row(result):
+        if not result['matches'] and not result['error']:
+            return
+        name = GLib.markup_escape_text(os.path.relpath(result['path'], state['folder']))
+        if result['error']:
+            markup = f"<b>{name}</b>: {GLib.markup_escape_text(result['error'])}"
+        else:
+            action_text = "replaced" if result['replaced'] else "matches"
+            lines = [f"<b>{name}</b> — {result['matches']} {action_text}"]
+            for before, match, after in result['snippets']:
+                lines.append(f"<small>…{GLib.markup_escape_text(before)}<b>{GLib.markup_escape_text(match)}</b>"
+                             f"{GLib.markup_escape_text(after)}…</small>")
+            markup = "\n".join(lines)
+        label = Gtk.Label()
+        label.set_markup(markup)
+        label.set_xalign(0)
+        label.set_ellipsize(Pango.EllipsizeMode.END)
+        label.set_margin_top(4)
+        label.set_margin_bottom(4)
+        results_list.append(label)
+    
+    def set_running(running):
+        preview_button.set_sensitive(not running)
+        replace_button.set_sensitive(not running)
+        close_button.set_label("Cancel" if running else "Close")
+    
+    def on_finished(summary, dry_run):
+        state['cancel'] = None
+        set_running(False)
+        if summary.get('error'):
+            progress_label.set_text(f"Error: {summary['error']}")
+            return False
+        verb = "found" if dry_run else "replaced"
+        text = (f"{summary['matches']} matches {verb} in {summary['matched_files']} of "
+                f"{summary['files']} files")
+        if summary['skipped']:
+            text += f" ({summary['skipped']} unchanged since the last scan)"
+        if summary['cancelled']:
+            text += " — cancelled"
+        progress_label.set_text(text)
+        if not dry_run and summary['replaced_files']:
+            win.statusbar.set_text(f"Replaced text in {summary['replaced_files']} files; "
+                                   "reload open copies to see the changes")
+        return False
+    
+    def start(dry_run):
+        search_text = search_entry.get_text()
+        if not search_text:
+            progress_label.set_text("Enter text to search for")
+            return
+        options = {
+            'search': search_text,
+            'replacement': replace_entry.get_text(),
+            'case_sensitive': case_check.get_active(),
+            'whole_word': word_check.get_active(),
+            'regex': regex_check.get_active(),
+            'dry_run': dry_run,
+        }
+        try:
+            batch_replace.compile_search(search_text, options['case_sensitive'],
+                                         options['whole_word'], options['regex'])
+        except re.error as e:
+            progress_label.set_text(f"Invalid regular expression: {e}")
+            return
+        
+        results_list.remove_all()
+        progress_label.set_text("Previewing…" if dry_run else "Replacing…")
+        set_running(True)
+        cancel_event = threading.Event()
+        state['cancel'] = cancel_event
+        folder = state['folder']
+        
+        def worker():
+            try:
+                summary = batch_replace.run_batch_detached(
+                    folder, options, cancel_event=cancel_event,
+                    on_result=lambda result: GLib.idle_add(add_result_row, result))
+            except Exception as e:
+                summary = {'error': str(e)}
+            GLib.idle_add(on_finished, summary, dry_run)
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def on_close(button):
+        if state['cancel'] is not None:
+            state['cancel'].set()
+            progress_label.set_text("Cancelling…")
+        else:
+            dialog.close()
+    
+    preview_button.connect("clicked", lambda btn: start(True))
+    replace_button.connect("clicked", lambda btn: start(False))
+    close_button.connect("clicked", on_close)
+    dialog.connect("closed", lambda d: state['cancel'] and state['cancel'].set())
+    
+    dialog.set_child(content_box)
+    dialog.present(win)
+
 def on_find_key_pressed(self, win, controller, keyval, keycode, state):
     """Handle key presses in the find bar"""
     # Check if Escape key was pressed
@@ -464,136 +997,439 @@ def _on_get_selection_for_find(self, win, webview, result):
         print(f"Error getting selection for find: {e}")
         
 def search_functions_js(self):
-    """JavaScript for search and replace functionality with improved handling of replacements and formatting."""
+    """JavaScript for search and replace. Matches are kept as document offsets and
+    only the ones near the viewport are drawn, with the CSS Custom Highlight API,
+    so searching never modifies the document."""
     # Use Python raw string to avoid escape sequence issues
     return r"""
     // Search variables
-    var searchResults = [];
+    var searchResults = [];  // { start, end } document offsets, in order
+    var searchResultsVersion = -1;  // Text index version the offsets belong to
     var searchIndex = -1;
     var currentSearchText = "";
-    var originalFormattingInfo = []; // Store information about original formatting
-    var replacedSegments = new Set(); // Track which segments have been replaced
+    var searchHighlightsSupported = typeof Highlight !== 'undefined' && !!(window.CSS && CSS.highlights);
 
-    // Search functions
-    function clearSearch() {
-        searchResults = [];
-        searchIndex = -1;
-        currentSearchText = "";
-        
-        // Remove all highlighting while preserving formatting
-        let editor = document.getElementById('editor');
-        let highlights = editor.querySelectorAll('.search-highlight');
-        
-        if (highlights.length) {
-            for (let i = 0; i < highlights.length; i++) {
-                let highlight = highlights[i];
-                unwrapHighlight(highlight);
+    // Matches get Ranges only while they are within SEARCH_PAINT_MARGIN
+    // viewport heights of the visible area, and never more than
+    // SEARCH_PAINT_LIMIT at once; the rest are painted as they scroll in
+    var SEARCH_PAINT_MARGIN = 1;
+    var SEARCH_PAINT_LIMIT = 2000;
+    var searchPaintFrame = 0;
+
+    // Redraw the match highlights on the next frame
+    function paintSearchHighlights() {
+        if (!searchHighlightsSupported || searchPaintFrame) return;
+        searchPaintFrame = requestAnimationFrame(function() {
+            searchPaintFrame = 0;
+            paintVisibleSearchResults();
+        });
+    }
+
+    function paintVisibleSearchResults() {
+        let index = searchResults.length > 0 ? getSearchTextIndex() : null;
+        if (!index || index.version !== searchResultsVersion) {
+            // Nothing to show, or the document changed under the offsets;
+            // stale matches are searched again on the next navigation
+            CSS.highlights.delete('search-results');
+            CSS.highlights.delete('search-current');
+            return;
+        }
+        let visible = visibleSearchOffsets(index);
+        let first = firstSearchResultEndingAfter(visible.start);
+        let last = Math.min(searchResults.length, first + SEARCH_PAINT_LIMIT);
+        let shown = new Highlight();
+        for (let i = first; i < last && searchResults[i].start <= visible.end; i++) {
+            try {
+                shown.add(searchResultRange(i));
+            } catch (e) {
+                console.error("Error painting match:", e);
             }
-            
-            // Clear the formatting info but keep replaced segments
-            originalFormattingInfo = [];
-            
-            editor.normalize();
-            return true;
         }
-        return false;
+        CSS.highlights.set('search-results', shown);
+        paintCurrentSearchResult();
     }
 
-    // Helper function to properly unwrap highlights
-    function unwrapHighlight(highlight) {
-        // Create a document fragment
-        let fragment = document.createDocumentFragment();
-        
-        // Move all children to the fragment
-        while (highlight.firstChild) {
-            fragment.appendChild(highlight.firstChild);
+    function paintCurrentSearchResult() {
+        if (!searchHighlightsSupported) return;
+        if (searchIndex >= 0 && searchIndex < searchResults.length &&
+                searchTextIndex && searchTextIndex.version === searchResultsVersion) {
+            try {
+                CSS.highlights.set('search-current', new Highlight(searchResultRange(searchIndex)));
+                return;
+            } catch (e) {
+                console.error("Error painting match:", e);
+            }
         }
-        
-        // Replace the highlight with its contents
-        if (highlight.parentNode) {
-            highlight.parentNode.replaceChild(fragment, highlight);
+        CSS.highlights.delete('search-current');
+    }
+
+    function searchEntryRect(entry) {
+        if (entry.block.nodeType === Node.ELEMENT_NODE) {
+            return entry.block.getBoundingClientRect();
         }
+        let range = document.createRange();
+        range.selectNodeContents(entry.block);
+        return range.getBoundingClientRect();
     }
 
-    // When creating highlights, store original formatting information
-    function storeFormattingInfo(range) {
-        let formattingInfo = [];
-        let fragment = range.cloneContents();
-        
-        // Process all nodes in the fragment
-        function processNode(node) {
-            if (node.nodeType === Node.TEXT_NODE) {
-                // Text node - add as plain text
-                formattingInfo.push({
-                    text: node.textContent,
-                    format: null
-                });
-            } else if (node.nodeType === Node.ELEMENT_NODE) {
-                // Element node - check for formatting elements
-                let format = null;
-                
-                // Identify formatting elements
-                if (node.nodeName === 'B' || node.nodeName === 'STRONG') {
-                    format = 'b';
-                } else if (node.nodeName === 'I' || node.nodeName === 'EM') {
-                    format = 'i';
-                } else if (node.nodeName === 'U') {
-                    format = 'u';
-                } else if (node.nodeName === 'STRIKE' || node.nodeName === 'S' || node.nodeName === 'DEL') {
-                    format = 'strike';
-                } else if (node.nodeName === 'SPAN') {
-                    format = 'span';
+    // Block extents relative to the editor's content, which scrolling does
+    // not change, so they are measured once per layout. Floats and columns
+    // can put a block above one that comes before it; the layout is then
+    // not sorted and has to be scanned rather than bisected.
+    var searchLayout = null;
+
+    function getSearchLayout(index) {
+        let editor = document.getElementById('editor');
+        let key = index.version + ':' + editor.scrollHeight + ':' + editor.clientWidth;
+        if (searchLayout && searchLayout.key === key) {
+            return searchLayout;
+        }
+        let entries = index.entries;
+        let origin = editor.getBoundingClientRect().top - editor.scrollTop;
+        let tops = new Array(entries.length);
+        let bottoms = new Array(entries.length);
+        let sorted = true;
+        let previousTop = -Infinity;
+        let previousBottom = -Infinity;
+        for (let i = 0; i < entries.length; i++) {
+            let rect = searchEntryRect(entries[i]);
+            if (rect.width === 0 && rect.height === 0) {
+                // Collapsed whitespace between blocks has no box; keep it
+                // where the previous block ends so it does not break the order
+                tops[i] = bottoms[i] = i > 0 ? bottoms[i - 1] : 0;
+                continue;
+            }
+            tops[i] = rect.top - origin;
+            bottoms[i] = rect.bottom - origin;
+            if (tops[i] < previousTop || bottoms[i] < previousBottom) {
+                sorted = false;
+            }
+            previousTop = tops[i];
+            previousBottom = bottoms[i];
+        }
+        searchLayout = { key: key, tops: tops, bottoms: bottoms, sorted: sorted };
+        return searchLayout;
+    }
+
+    // Document offsets from the first to the last block on screen, plus the
+    // margin. In a sorted layout both ends are found by binary search.
+    function visibleSearchOffsets(index) {
+        let entries = index.entries;
+        let layout = getSearchLayout(index);
+        let editor = document.getElementById('editor');
+        let margin = window.innerHeight * SEARCH_PAINT_MARGIN;
+        let origin = editor.getBoundingClientRect().top - editor.scrollTop;
+        let viewTop = -origin - margin;
+        let viewBottom = window.innerHeight - origin + margin;
+        let first = entries.length;
+        let last = -1;
+        if (layout.sorted) {
+            let low = 0;
+            let high = entries.length;
+            while (low < high) {
+                let mid = (low + high) >> 1;
+                if (layout.bottoms[mid] < viewTop) {
+                    low = mid + 1;
+                } else {
+                    high = mid;
                 }
-                
-                if (node.childNodes.length === 0) {
-                    // Empty element
-                    return;
-                } else if (node.childNodes.length === 1 && node.firstChild.nodeType === Node.TEXT_NODE) {
-                    // Simple case: single text node child
-                    formattingInfo.push({
-                        text: node.textContent,
-                        format: format
-                    });
+            }
+            first = low;
+            high = entries.length;
+            while (low < high) {
+                let mid = (low + high) >> 1;
+                if (layout.tops[mid] <= viewBottom) {
+                    low = mid + 1;
                 } else {
-                    // Complex case: multiple children or nested elements
-                    // For simplicity, we'll treat this as plain text with the outer format
-                    // A more complex implementation would recursively process children
-                    formattingInfo.push({
-                        text: node.textContent,
-                        format: format
-                    });
+                    high = mid;
+                }
+            }
+            last = low - 1;
+        } else {
+            for (let i = 0; i < entries.length; i++) {
+                if (layout.bottoms[i] >= viewTop && layout.tops[i] <= viewBottom) {
+                    if (first === entries.length) first = i;
+                    last = i;
                 }
             }
         }
-        
-        // Process all top-level nodes in the fragment
-        for (let i = 0; i < fragment.childNodes.length; i++) {
-            processNode(fragment.childNodes[i]);
+        if (first >= entries.length || last < first) {
+            return { start: 0, end: -1 };
         }
-        
-        // If the fragment is empty, try to create a text segment from the range
-        if (formattingInfo.length === 0 && range.toString()) {
-            formattingInfo.push({
-                text: range.toString(),
-                format: null
-            });
+        return { start: entries[first].start, end: entries[last].start + entries[last].text.length };
+    }
+
+    // First match that ends at or after offset
+    function firstSearchResultEndingAfter(offset) {
+        let low = 0;
+        let high = searchResults.length;
+        while (low < high) {
+            let mid = (low + high) >> 1;
+            if (searchResults[mid].end < offset) {
+                low = mid + 1;
+            } else {
+                high = mid;
+            }
         }
-        
-        return formattingInfo;
+        return low;
+    }
+
+    document.addEventListener('scroll', function() {
+        if (searchResults.length > 0) paintSearchHighlights();
+    }, { capture: true, passive: true });
+    window.addEventListener('resize', function() {
+        if (searchResults.length > 0) paintSearchHighlights();
+    });
+
+    // Search functions
+    function clearSearch() {
+        cancelWorkerSearch();
+        let hadResults = searchResults.length > 0;
+        searchResults = [];
+        searchResultsVersion = -1;
+        searchIndex = -1;
+        currentSearchText = "";
+        paintSearchHighlights();
+        return hadResults;
     }
 
     function normalizeSpaces(text) {
-        // Replace non-breaking spaces with regular spaces for search purposes
+        // Replace non-breaking spaces with regular spaces for search purposes.
+        // The replacement is one character for one, so offsets are unchanged.
         return text.replace(/\u00A0/g, ' ');
     }
 
+    // Persistent text index used by every search. The editor's top-level
+    // blocks each keep their text nodes (with offsets), their text and a
+    // case-folded copy; a MutationObserver marks only the blocks that change,
+    // and those are re-read on the next search.
+    var searchTextIndex = null;
+
+    function foldSearchCase(text) {
+        let folded = text.toLowerCase();
+        if (folded.length === text.length) return folded;
+        // A few characters change length when lowercased; keep those as they
+        // are so offsets in the folded copy still match the text nodes
+        return Array.from(text, function(c) {
+            let lower = c.toLowerCase();
+            return lower.length === c.length ? lower : c;
+        }).join('');
+    }
+
+    function indexSearchBlock(block) {
+        let nodes = [];
+        let parts = [];
+        let length = 0;
+        if (block.nodeType === Node.TEXT_NODE) {
+            nodes.push({ node: block, start: 0 });
+            parts.push(block.textContent);
+            length = block.textContent.length;
+        } else {
+            let walker = document.createTreeWalker(block, NodeFilter.SHOW_TEXT, null, false);
+            let node;
+            while (node = walker.nextNode()) {
+                let text = node.textContent;
+                if (!text.length) continue;
+                nodes.push({ node: node, start: length });
+                parts.push(text);
+                length += text.length;
+            }
+        }
+        let text = normalizeSpaces(parts.join(''));
+        return { block: block, nodes: nodes, text: text, folded: null, start: 0 };
+    }
+
+    function getSearchTextIndex() {
+        let editor = document.getElementById('editor');
+        if (!searchTextIndex) {
+            searchTextIndex = {
+                entries: [],
+                byBlock: new Map(),
+                dirty: new Set(),
+                structureDirty: true,
+                version: 0,
+                length: 0,
+                observer: new MutationObserver(onSearchTextMutations)
+            };
+            searchTextIndex.observer.observe(editor, {
+                childList: true, subtree: true, characterData: true
+            });
+        }
+        let index = searchTextIndex;
+        // Pick up anything the observer has seen but not yet delivered
+        markSearchTextIndexDirty(index.observer.takeRecords());
+        if (!index.structureDirty && index.dirty.size === 0) {
+            return index;
+        }
+
+        if (index.structureDirty) {
+            // Re-list the blocks, reusing entries for the ones that are unchanged
+            let byBlock = new Map();
+            let entries = [];
+            for (let block = editor.firstChild; block; block = block.nextSibling) {
+                let entry = index.byBlock.get(block);
+                if (!entry || index.dirty.has(block)) {
+                    entry = indexSearchBlock(block);
+                }
+                byBlock.set(block, entry);
+                entries.push(entry);
+            }
+            index.byBlock = byBlock;
+            index.entries = entries;
+        } else {
+            index.dirty.forEach(function(block) {
+                let old = index.byBlock.get(block);
+                if (!old) return;
+                let entry = indexSearchBlock(block);
+                index.byBlock.set(block, entry);
+                index.entries[index.entries.indexOf(old)] = entry;
+            });
+        }
+
+        // Offsets count one extra character after each block, matching the
+        // line breaks between blocks in the search snapshot
+        let start = 0;
+        for (let i = 0; i < index.entries.length; i++) {
+            index.entries[i].start = start;
+            start += index.entries[i].text.length + 1;
+        }
+        index.length = start;
+        index.dirty.clear();
+        index.structureDirty = false;
+        index.version++;
+        return index;
+    }
+
+    function onSearchTextMutations(records) {
+        markSearchTextIndexDirty(records);
+        // Drop highlights that no longer line up with the text
+        if (searchResults.length > 0) paintSearchHighlights();
+    }
+
+    function markSearchTextIndexDirty(records) {
+        let index = searchTextIndex;
+        let editor = document.getElementById('editor');
+        for (let i = 0; i < records.length; i++) {
+            let target = records[i].target;
+            if (target === editor) {
+                index.structureDirty = true;
+                continue;
+            }
+            // Walk up to the top-level block that owns the change
+            while (target && target.parentNode !== editor) {
+                target = target.parentNode;
+            }
+            if (target) {
+                index.dirty.add(target);
+            }
+        }
+    }
+
+    // Last position in a sorted array whose value is <= target
+    function searchFloorIndex(values, target, key) {
+        let low = 0;
+        let high = values.length - 1;
+        while (low < high) {
+            let mid = (low + high + 1) >> 1;
+            if (key(values[mid]) <= target) {
+                low = mid;
+            } else {
+                high = mid - 1;
+            }
+        }
+        return low;
+    }
+
+    // The indexed block holding a document offset, and the offset within it
+    function searchEntryAt(entries, offset) {
+        let entry = entries[searchFloorIndex(entries, offset, function(entry) { return entry.start; })];
+        return { entry: entry, offset: Math.max(0, Math.min(offset - entry.start, entry.text.length)) };
+    }
+
+    // DOM boundary point for an offset within an indexed block
+    function searchEntryBoundary(entry, offset) {
+        let nodes = entry.nodes;
+        if (!nodes.length) {
+            return { node: entry.block, offset: 0 };
+        }
+        let nodeInfo = nodes[searchFloorIndex(nodes, offset, function(info) { return info.start; })];
+        return {
+            node: nodeInfo.node,
+            offset: Math.min(offset - nodeInfo.start, nodeInfo.node.textContent.length)
+        };
+    }
+
+    // Range between two (entry, offset) positions
+    function createSearchRange(start, end) {
+        let startPoint = searchEntryBoundary(start.entry, start.offset);
+        let endPoint = searchEntryBoundary(end.entry, end.offset);
+        let range = document.createRange();
+        range.setStart(startPoint.node, startPoint.offset);
+        range.setEnd(endPoint.node, endPoint.offset);
+        return range;
+    }
+
+    // Range for match i, found by binary search however many matches there are
+    function searchResultRange(i) {
+        let entries = searchTextIndex.entries;
+        return createSearchRange(searchEntryAt(entries, searchResults[i].start),
+                                 searchEntryAt(entries, searchResults[i].end));
+    }
+
+    // The last query's matches, as (entry, offset) pairs, so that typing one
+    // more character only has to rescan the blocks that matched before
+    var lastSearch = null;
+
+    // Append the non-overlapping matches of searchPattern in one block
+    function scanSearchEntry(entry, searchPattern, isCaseSensitive, matches) {
+        let text = entry.text;
+        if (!isCaseSensitive) {
+            if (entry.folded === null) entry.folded = foldSearchCase(text);
+            text = entry.folded;
+        }
+        let offset = text.indexOf(searchPattern);
+        while (offset !== -1) {
+            matches.push({ entry: entry, offset: offset });
+            offset = text.indexOf(searchPattern, offset + searchPattern.length);
+        }
+    }
+
+    function findSearchMatches(index, searchPattern, isCaseSensitive) {
+        let previous = lastSearch;
+        let matches = [];
+        if (previous && previous.version === index.version &&
+                previous.isCaseSensitive === isCaseSensitive &&
+                searchPattern.startsWith(previous.pattern)) {
+            // A block holding the longer pattern holds its prefix, so only
+            // blocks that matched before can match now. They are scanned
+            // afresh: filtering the old offsets would miss matches that start
+            // inside an earlier one and keep matches that now overlap.
+            let lastEntry = null;
+            for (let i = 0; i < previous.matches.length; i++) {
+                let entry = previous.matches[i].entry;
+                if (entry !== lastEntry) {
+                    scanSearchEntry(entry, searchPattern, isCaseSensitive, matches);
+                    lastEntry = entry;
+                }
+            }
+        } else {
+            for (let i = 0; i < index.entries.length; i++) {
+                scanSearchEntry(index.entries[i], searchPattern, isCaseSensitive, matches);
+            }
+        }
+        lastSearch = {
+            version: index.version,
+            isCaseSensitive: isCaseSensitive,
+            pattern: searchPattern,
+            matches: matches
+        };
+        return matches;
+    }
+
     function searchAndHighlight(searchText, isCaseSensitive) {
         // First clear any existing search
         clearSearch();
         
-        // Reset formatting info array
-        originalFormattingInfo = [];
-        
         if (!searchText) return 0;
         currentSearchText = searchText;
         
@@ -607,251 +1443,234 @@ def search_functions_js(self):
         }
         
         // Normalize the search text - replace &nbsp; with space for searching
-        searchText = normalizeSpaces(searchText);
+        let searchPattern = normalizeSpaces(searchText);
+        if (!isCaseSensitive) {
+            searchPattern = foldSearchCase(searchPattern);
+        }
         
-        let editor = document.getElementById('editor');
-        searchResults = [];
-        searchIndex = -1;
-        let count = 0;
-        
-        // Simplified approach: get the full text content of the editor
-        let fullText = '';
-        let textNodes = [];  // Store all text nodes in order
-        
-        // Use TreeWalker to find all text nodes in correct order
-        let walker = document.createTreeWalker(
-            editor,
-            NodeFilter.SHOW_TEXT,
-            null,
-            false
-        );
-        
-        // Collect all text nodes and build the full text
-        let node;
-        while (node = walker.nextNode()) {
-            // Normalize the node text content to handle &nbsp;
-            let nodeText = normalizeSpaces(node.textContent);
-            
-            textNodes.push({
-                node: node,
-                startIndex: fullText.length,
-                text: nodeText,
-                originalText: node.textContent
-            });
-            fullText += nodeText;
+        // Only offsets are stored; Ranges are made when a match is painted
+        // or selected, so the count is known without touching the DOM
+        let index = getSearchTextIndex();
+        let matches = findSearchMatches(index, searchPattern, isCaseSensitive);
+        searchResults = new Array(matches.length);
+        for (let i = 0; i < matches.length; i++) {
+            let start = matches[i].entry.start + matches[i].offset;
+            searchResults[i] = { start: start, end: start + searchPattern.length };
         }
+        searchResultsVersion = index.version;
         
-        // Now search the full text
-        let searchPattern = searchText;
-        let textToSearch = fullText;
+        // Select first result if any found
+        if (searchResults.length > 0) {
+            paintSearchHighlights();
+            selectSearchResult(0);
+        }
         
-        // If case-insensitive, convert both to lowercase for comparison
-        if (!isCaseSensitive) {
-            searchPattern = searchText.toLowerCase();
-            textToSearch = fullText.toLowerCase();
+        return searchResults.length;
+    }
+
+    // ---- Worker search: regular expressions, whole words and matches that
+    // cross paragraph boundaries. The scan runs in search-worker.js over a
+    // snapshot of the text and streams match offsets back in batches. ----
+    var searchWorker = null;
+    var searchWorkerBusy = false;
+    var searchGeneration = 0;
+    var activeWorkerSearch = null;
+
+    // Plain queries use the index directly; the other modes go to the worker
+    function startSearch(searchText, options) {
+        searchGeneration++;
+        currentSearchOptions = options;
+        if (!options.regex && !options.wholeWord && !searchText.includes('\n')) {
+            return searchAndHighlight(searchText, !!options.caseSensitive);
         }
         
-        // Find all matches
-        let index = textToSearch.indexOf(searchPattern);
-        while (index !== -1) {
-            let startPos = index;
-            let endPos = index + searchText.length - 1;  // End position is inclusive
-            
-            // Find which text nodes contain our match
-            let startNode = null;
-            let startOffset = 0;
-            let endNode = null;
-            let endOffset = 0;
-            
-            // Find start node and offset
-            for (let i = 0; i < textNodes.length; i++) {
-                let nodeInfo = textNodes[i];
-                let nodeEndIndex = nodeInfo.startIndex + nodeInfo.text.length - 1;
-                
-                if (startPos >= nodeInfo.startIndex && startPos <= nodeEndIndex) {
-                    startNode = nodeInfo.node;
-                    // We need to account for any differences between original and normalized text
-                    let normalizedOffset = startPos - nodeInfo.startIndex;
-                    startOffset = mapNormalizedToOriginalOffset(nodeInfo.originalText, nodeInfo.text, normalizedOffset);
-                    break;
-                }
+        clearSearch();
+        if (!searchText) return 0;
+        currentSearchText = searchText;
+        window.isCaseSensitive = !!options.caseSensitive;
+        
+        let index = getSearchTextIndex();
+        let snapshot = getSearchSnapshot(index);
+        try {
+            if (!searchWorker) {
+                searchWorker = new Worker('search-worker.js');
+                searchWorker.onmessage = onSearchWorkerMessage;
             }
-            
-            // Find end node and offset
-            for (let i = 0; i < textNodes.length; i++) {
-                let nodeInfo = textNodes[i];
-                let nodeEndIndex = nodeInfo.startIndex + nodeInfo.text.length - 1;
-                
-                if (endPos >= nodeInfo.startIndex && endPos <= nodeEndIndex) {
-                    endNode = nodeInfo.node;
-                    // We need to account for any differences between original and normalized text
-                    let normalizedOffset = endPos - nodeInfo.startIndex;
-                    endOffset = mapNormalizedToOriginalOffset(nodeInfo.originalText, nodeInfo.text, normalizedOffset);
-                    break;
-                }
+        } catch (e) {
+            postSearchProgress({ count: 0, done: true, error: "search worker unavailable" });
+            return null;
+        }
+        
+        activeWorkerSearch = {
+            generation: searchGeneration,
+            options: options,
+            version: index.version,
+            index: index,
+            snapshot: snapshot
+        };
+        searchWorkerBusy = true;
+        searchWorker.postMessage({
+            generation: searchGeneration,
+            text: snapshot.text,
+            pattern: options.regex ? searchText : normalizeSpaces(searchText),
+            regex: !!options.regex,
+            wholeWord: !!options.wholeWord,
+            caseSensitive: !!options.caseSensitive
+        });
+        postSearchProgress({ count: 0, done: false });
+        return null;
+    }
+
+    // A scan still running is stopped outright rather than left to finish
+    function cancelWorkerSearch() {
+        activeWorkerSearch = null;
+        if (searchWorker && searchWorkerBusy) {
+            searchWorker.terminate();
+            searchWorker = null;
+        }
+        searchWorkerBusy = false;
+        settleSearchWaiters();
+    }
+
+    // Callers waiting for the current search to finish (see whenSearchDone)
+    var searchDoneWaiters = [];
+
+    function settleSearchWaiters() {
+        let waiters = searchDoneWaiters;
+        searchDoneWaiters = [];
+        waiters.forEach(function(resolve) { resolve(); });
+    }
+
+    // Resolves once no worker scan is running; a scan restarted because the
+    // document changed is waited for as well
+    async function whenSearchDone() {
+        while (activeWorkerSearch) {
+            await new Promise(function(resolve) { searchDoneWaiters.push(resolve); });
+        }
+    }
+
+    function postSearchProgress(progress) {
+        try {
+            window.webkit.messageHandlers.searchProgress.postMessage(JSON.stringify(progress));
+        } catch (e) {
+            console.log("Could not report search progress:", e);
+        }
+    }
+
+    // The whole document as one string, blocks separated by newlines, so
+    // offsets in it are document offsets; rebuilt only when the index has changed
+    function getSearchSnapshot(index) {
+        if (index.snapshot && index.snapshot.version === index.version) {
+            return index.snapshot;
+        }
+        let parts = index.entries.map(function(entry) { return entry.text; });
+        index.snapshot = { version: index.version, text: parts.join('\n') };
+        return index.snapshot;
+    }
+
+    function onSearchWorkerMessage(event) {
+        let data = event.data;
+        let search = activeWorkerSearch;
+        if (!search || data.generation !== search.generation) return;
+        if (data.done) {
+            searchWorkerBusy = false;
+            activeWorkerSearch = null;
+        }
+        if (data.error) {
+            if (pendingReplaceAll) {
+                pendingReplaceAll = null;
+                settleReplaceWaiters(0);
             }
-            
-            // Create range and highlight if we found both nodes
-            if (startNode && endNode) {
-                try {
-                    let range = document.createRange();
-                    range.setStart(startNode, startOffset);
-                    range.setEnd(endNode, endOffset + 1);  // +1 because setEnd is exclusive
-                    
-                    // Store original formatting before highlighting
-                    let formattingInfo = storeFormattingInfo(range);
-                    originalFormattingInfo.push(formattingInfo);
-                    
-                    // Create highlight span
-                    let highlightSpan = document.createElement('span');
-                    highlightSpan.className = 'search-highlight';
-                    highlightSpan.style.backgroundColor = '#FFFF00';
-                    highlightSpan.style.color = '#000000';
-                    
-                    // Add a unique ID to track this highlight
-                    let highlightId = 'highlight-' + Math.random().toString(36).substr(2, 9);
-                    highlightSpan.setAttribute('data-highlight-id', highlightId);
-                    
-                    // Apply highlight
-                    try {
-                        range.surroundContents(highlightSpan);
-                        searchResults.push(highlightSpan);
-                        count++;
-                    } catch (e) {
-                        console.error("Error highlighting range:", e);
-                        // This can fail if the range crosses element boundaries
-                        // Let's try with a more complex highlighting approach
-                        
-                        // We'll create a document fragment with a highlight span
-                        let fragment = document.createDocumentFragment();
-                        let span = document.createElement('span');
-                        span.className = 'search-highlight';
-                        span.style.backgroundColor = '#FFFF00';
-                        span.style.color = '#000000';
-                        
-                        // Add unique ID to track this highlight
-                        span.setAttribute('data-highlight-id', highlightId);
-                        
-                        fragment.appendChild(span);
-                        
-                        // Extract contents to the span
-                        span.appendChild(range.extractContents());
-                        
-                        // Insert the fragment
-                        range.insertNode(fragment);
-                        searchResults.push(span);
-                        count++;
-                    }
-                    
-                    // We need to rebuild after DOM changes
-                    textNodes = [];
-                    fullText = '';
-                    
-                    // Reset the TreeWalker
-                    walker = document.createTreeWalker(
-                        editor,
-                        NodeFilter.SHOW_TEXT,
-                        null,
-                        false
-                    );
-                    
-                    // Rebuild the text mapping
-                    while (node = walker.nextNode()) {
-                        let nodeText = normalizeSpaces(node.textContent);
-                        textNodes.push({
-                            node: node,
-                            startIndex: fullText.length,
-                            text: nodeText,
-                            originalText: node.textContent
-                        });
-                        fullText += nodeText;
-                    }
-                    
-                    // Update search text if case insensitive
-                    if (!isCaseSensitive) {
-                        textToSearch = fullText.toLowerCase();
+            postSearchProgress({ count: 0, done: true, error: data.error });
+            settleSearchWaiters();
+            return;
+        }
+        
+        // Offsets from a scan of an older snapshot no longer apply
+        if (getSearchTextIndex().version !== search.version) {
+            let count = startSearch(currentSearchText, search.options);
+            // A Replace All waiting for the stale scan moves to the new one
+            if (pendingReplaceAll && pendingReplaceAll.generation === search.generation) {
+                if (activeWorkerSearch) {
+                    pendingReplaceAll.generation = activeWorkerSearch.generation;
+                } else {
+                    let replaceText = pendingReplaceAll.replaceText;
+                    pendingReplaceAll = null;
+                    if (count === null) {
+                        settleReplaceWaiters(0);
                     } else {
-                        textToSearch = fullText;
+                        replaceSearchResults(replaceText, true);
                     }
-                    
-                    // Start looking from where we left off
-                    index = textToSearch.indexOf(searchPattern, index + 1);
-                } catch (e) {
-                    console.error("Error in search:", e);
-                    index = textToSearch.indexOf(searchPattern, index + 1);
                 }
-            } else {
-                index = textToSearch.indexOf(searchPattern, index + 1);
             }
+            settleSearchWaiters();
+            return;
         }
         
-        // Select first result if any found
-        if (searchResults.length > 0) {
-            searchIndex = 0;
-            selectSearchResult(0);
+        let matches = data.matches;
+        for (let i = 0; i < matches.length; i += 2) {
+            searchResults.push({ start: matches[i], end: matches[i + 1] });
         }
+        searchResultsVersion = search.version;
         
-        return count;
+        // Select the first result as soon as it arrives
+        if (searchIndex < 0 && searchResults.length > 0) {
+            selectSearchResult(0);
+        }
+        paintSearchHighlights();
+        postSearchProgress({ count: searchResults.length, done: !!data.done });
+        
+        // A Replace All was waiting for this scan
+        if (data.done && pendingReplaceAll && pendingReplaceAll.generation === search.generation) {
+            let replaceText = pendingReplaceAll.replaceText;
+            pendingReplaceAll = null;
+            replaceSearchResults(replaceText, true);
+        }
+        if (data.done) {
+            settleSearchWaiters();
+        }
     }
-    
-    // Helper function to map an offset in normalized text back to the original text
-    function mapNormalizedToOriginalOffset(originalText, normalizedText, normalizedOffset) {
-        // If no normalization happened, return the same offset
-        if (originalText === normalizedText) {
-            return normalizedOffset;
-        }
-        
-        // Count how many characters we've processed in both texts
-        let originalIndex = 0;
-        let normalizedIndex = 0;
-        
-        // Walk through the strings simultaneously
-        while (normalizedIndex < normalizedOffset && originalIndex < originalText.length) {
-            // Skip any characters that were normalized out
-            if (originalText.charCodeAt(originalIndex) === 0xA0 && normalizedText.charAt(normalizedIndex) === ' ') {
-                // We found a non-breaking space that was converted to space
-                originalIndex++;
-                normalizedIndex++;
-            } else if (originalText.charAt(originalIndex) === normalizedText.charAt(normalizedIndex)) {
-                // Character is the same in both
-                originalIndex++;
-                normalizedIndex++;
-            } else {
-                // Character was removed in normalization, skip in original only
-                originalIndex++;
-            }
+
+    // Offsets from before an edit no longer point at the matches; search
+    // again, staying near the current match. False while a worker scan is
+    // catching up (it selects its first match itself).
+    function refreshSearchResults() {
+        if (searchResults.length === 0 || getSearchTextIndex().version === searchResultsVersion) {
+            return true;
         }
-        
-        return originalIndex;
+        let position = searchIndex;
+        let count = startSearch(currentSearchText, currentSearchOptions);
+        if (count === null) return false;
+        postSearchProgress({ count: count, done: true });
+        searchIndex = Math.min(position, searchResults.length - 1);
+        return true;
     }
 
     function selectSearchResult(index) {
-        if (searchResults.length === 0) return false;
+        if (!refreshSearchResults() || searchResults.length === 0) return false;
         
         // Make sure index is within bounds
         index = Math.max(0, Math.min(index, searchResults.length - 1));
         searchIndex = index;
         
-        // Get the highlight span
-        let span = searchResults[index];
-        
-        // Create a range for the selection
-        let range = document.createRange();
-        range.selectNodeContents(span);
-        
-        // Apply the selection
+        let range = searchResultRange(index);
         let selection = window.getSelection();
         selection.removeAllRanges();
         selection.addRange(range);
+        paintCurrentSearchResult();
         
         // Scroll to the selection
-        span.scrollIntoView({ behavior: 'smooth', block: 'center' });
+        let container = range.startContainer;
+        let element = container.nodeType === Node.ELEMENT_NODE ? container : container.parentElement;
+        if (element) {
+            element.scrollIntoView({ behavior: 'smooth', block: 'center' });
+        }
         
         return true;
     }
 
     function findNext() {
-        if (searchResults.length === 0) return false;
+        if (!refreshSearchResults() || searchResults.length === 0) return false;
         
         searchIndex++;
         if (searchIndex >= searchResults.length) {
@@ -862,7 +1681,7 @@ def search_functions_js(self):
     }
 
     function findPrevious() {
-        if (searchResults.length === 0) return false;
+        if (!refreshSearchResults() || searchResults.length === 0) return false;
         
         searchIndex--;
         if (searchIndex < 0) {
@@ -872,37 +1691,117 @@ def search_functions_js(self):
         return selectSearchResult(searchIndex);
     }
 
+    // Put replaceText where a match was. It is written into the text node of
+    // the first matched character, so it keeps that character's formatting
+    // and no new nodes are created. Returns the length of the text put in.
+    function replaceSearchRange(range, replaceText) {
+        let container = range.startContainer;
+        let offset = range.startOffset;
+        range.deleteContents();
+        if (!replaceText) return 0;
+        if (container.nodeType === Node.TEXT_NODE && container.parentNode) {
+            container.insertData(offset, replaceText);
+        } else {
+            range.insertNode(document.createTextNode(replaceText));
+        }
+        return replaceText.length;
+    }
+
+    // The mode options of the current search, for regex replacements
+    var currentSearchOptions = {};
+
+    // The search's pattern as the worker built it (see buildSearchRegExp),
+    // sticky, so it can be run again at a match's offset in the snapshot
+    function searchReplaceRegExp() {
+        if (!currentSearchOptions.regex || !currentSearchText) return null;
+        let source = currentSearchText;
+        let wholeWord = !!currentSearchOptions.wholeWord;
+        let flags = 'my' + (currentSearchOptions.caseSensitive ? '' : 'i');
+        try {
+            return new RegExp(wholeWord ? '(?<![\\p{L}\\p{N}_])(?:' + source + ')(?![\\p{L}\\p{N}_])' : source,
+                              flags + 'u');
+        } catch (e) {
+            try {
+                return new RegExp(wholeWord ? '\\b(?:' + source + ')\\b' : source, flags);
+            } catch (e2) {
+                return null;
+            }
+        }
+    }
+
+    // The text for a regex match: $1, $<name>, $& and friends are expanded
+    // from the match at its offset in the search snapshot, so anchors and
+    // lookbehind see the same text the search did. If the pattern no longer
+    // matches there, the replacement is used as typed.
+    function expandRegExpReplacement(match, replaceText, regex) {
+        let text = getSearchSnapshot(getSearchTextIndex()).text;
+        regex.lastIndex = match.start;
+        let found = regex.exec(text);
+        if (!found || found[0].length !== match.end - match.start) {
+            return replaceText;
+        }
+        let groups = found.length - 1;
+        return replaceText.replace(/\$(\$|&|`|'|\d{1,2}|<([^>]*)>)/g, function(token, code, name) {
+            if (code === '$') return '$';
+            if (code === '&') return found[0];
+            if (code === '`') return text.slice(0, match.start);
+            if (code === "'") return text.slice(match.end);
+            if (name !== undefined) {
+                if (!found.groups) return token;
+                return found.groups[name] === undefined ? '' : found.groups[name];
+            }
+            // $nn when there are that many groups, otherwise $n and a digit
+            let n = parseInt(code, 10);
+            if (code.length === 2 && n >= 1 && n <= groups) {
+                return found[n] === undefined ? '' : found[n];
+            }
+            n = parseInt(code[0], 10);
+            if (n >= 1 && n <= groups) {
+                return (found[n] === undefined ? '' : found[n]) + code.slice(1);
+            }
+            return token;
+        });
+    }
+
     function replaceSelection(replaceText) {
-        if (searchResults.length === 0 || searchIndex < 0) return false;
+        if (!refreshSearchResults() || searchResults.length === 0 || searchIndex < 0) return false;
         
-        // Create history entry before change
+        // Close any open history entry so the replacement gets its own
         saveState();
         
-        // Get the current highlighted span
-        let highlightSpan = searchResults[searchIndex];
-        
-        // Check if the parent exists
-        if (!highlightSpan.parentNode) return false;
-        
-        // Step 1: Create a text node with the replacement text
-        let replacement = document.createTextNode(replaceText);
-        
-        // Step 2: Replace the highlighted span with the replacement text node
-        // This removes the highlight and inserts the new text
-        highlightSpan.parentNode.replaceChild(replacement, highlightSpan);
+        let match = searchResults[searchIndex];
+        let entries = searchTextIndex.entries;
+        let start = searchEntryAt(entries, match.start);
+        let end = searchEntryAt(entries, match.end);
+        let oldLength = searchTextIndex.length;
+        let regex = searchReplaceRegExp();
+        if (regex) {
+            replaceText = expandRegExpReplacement(match, replaceText, regex);
+        }
+        let inserted = replaceSearchRange(createSearchRange(start, end), replaceText);
+        saveState();
+        scheduleEditorState(true);
         
-        // Step 3: Update our search results array
+        // Drop the replaced match and keep the index in range
         searchResults.splice(searchIndex, 1);
         
-        // Step 4: Adjust the current search index if needed
-        if (searchIndex >= searchResults.length && searchResults.length > 0) {
+        // A replacement inside one block moves the later matches by a fixed
+        // amount; anything else is left stale and searched again when needed
+        let delta = inserted - (match.end - match.start);
+        let index = getSearchTextIndex();
+        if (start.entry === end.entry && index.length === oldLength + delta) {
+            for (let i = searchIndex; i < searchResults.length; i++) {
+                searchResults[i].start += delta;
+                searchResults[i].end += delta;
+            }
+            searchResultsVersion = index.version;
+        }
+        if (searchIndex >= searchResults.length) {
             searchIndex = searchResults.length - 1;
         }
+        paintSearchHighlights();
         
-        // Step 5: Normalize the DOM to merge adjacent text nodes
-        document.getElementById('editor').normalize();
-        
-        // Step 6: Select the next result if there are any left
+        // Select the next result if there are any left
         if (searchResults.length > 0) {
             selectSearchResult(searchIndex);
         }
@@ -910,52 +1809,334 @@ def search_functions_js(self):
         return true;
     }
 
-    function replaceAll(searchText, replaceText) {
+    // ---- Replace All: one undo entry for the whole run. Up to
+    // REPLACE_ALL_SYNC_LIMIT matches are replaced in a single pass (one
+    // reflow); larger runs are sliced across frames, report progress through
+    // replaceProgress and can be cancelled, which rolls back what was done. ----
+    var REPLACE_ALL_SYNC_LIMIT = 2000;
+    var REPLACE_ALL_SLICE_MS = 8;
+    var replaceAllJob = null;
+    var pendingReplaceAll = null;
+
+    // The page stays responsive between slices, but edits must wait: typing
+    // would split the run's undo entry and be rolled back by a cancel
+    document.addEventListener('beforeinput', function(e) {
+        if (replaceAllJob) {
+            e.preventDefault();
+            e.stopImmediatePropagation();
+        }
+    }, true);
+
+    function replaceAll(searchText, replaceText, options) {
         if (!searchText) return 0;
-        
-        // Normalize the search text
-        searchText = normalizeSpaces(searchText);
-        
-        // Check if this is a multi-line search
-        if (searchText.includes('\n')) {
-            // Return a special value to indicate multi-line search
-            return -1;
+        options = options || { caseSensitive: window.isCaseSensitive || false };
+        cancelReplaceAll();
+        
+        // Search afresh; a worker search finishes the job when its scan is done
+        let count = startSearch(searchText, options);
+        if (count === null) {
+            pendingReplaceAll = { generation: searchGeneration, replaceText: replaceText };
+            return null;
+        }
+        return replaceSearchResults(replaceText, false);
+    }
+
+    function replaceSearchResults(replaceText, reportProgress) {
+        // Positions are resolved to (block, offset) up front, and regex
+        // replacements expanded while the text is still as searched;
+        // replacing from the end leaves every earlier position valid
+        let entries = searchResults.length > 0 ? getSearchTextIndex().entries : [];
+        let regex = searchReplaceRegExp();
+        let matches = searchResults.map(function(match) {
+            return {
+                start: searchEntryAt(entries, match.start),
+                end: searchEntryAt(entries, match.end),
+                text: regex ? expandRegExpReplacement(match, replaceText, regex) : replaceText
+            };
+        });
+        let job = {
+            matches: matches,
+            next: matches.length - 1,
+            blocks: new Set(),
+            reportProgress: reportProgress
+        };
+        clearSearch();
+        if (job.matches.length === 0) {
+            finishReplaceAll(job);
+            return 0;
         }
         
-        // Create history entry before change
+        // Close any open history entry so the replacements get their own
         saveState();
-        
-        let editor = document.getElementById('editor');
-        let replacementCount = 0;
-        
-        // First perform the search to find all matches
-        let matches = searchAndHighlight(searchText, window.isCaseSensitive || false);
-        
-        // Now replace all highlights with the replacement text
-        let highlights = editor.querySelectorAll('.search-highlight');
-        
-        // Process each highlight
-        for (let i = 0; i < highlights.length; i++) {
-            let highlight = highlights[i];
-            
-            // Create a text node with the replacement
-            let textNode = document.createTextNode(replaceText);
-            
-            // Replace the highlight with the text node
-            if (highlight.parentNode) {
-                highlight.parentNode.replaceChild(textNode, highlight);
-                replacementCount++;
+        replaceAllJob = job;
+        if (job.matches.length <= REPLACE_ALL_SYNC_LIMIT) {
+            runReplaceAllSlice(job, Infinity);
+            return job.matches.length;
+        }
+        job.reportProgress = true;
+        runReplaceAllSlice(job, REPLACE_ALL_SLICE_MS);
+        return null;
+    }
+
+    function runReplaceAllSlice(job, budgetMs) {
+        if (replaceAllJob !== job) return;
+        let deadline = performance.now() + budgetMs;
+        // Replace from the end so earlier positions are unaffected
+        while (job.next >= 0) {
+            let match = job.matches[job.next];
+            try {
+                replaceSearchRange(createSearchRange(match.start, match.end), match.text);
+            } catch (e) {
+                console.error("Error replacing match:", e);
             }
+            job.blocks.add(match.start.entry.block);
+            job.next--;
+            if (performance.now() > deadline) break;
         }
         
-        // Clear search results since we've replaced all highlights
-        searchResults = [];
-        searchIndex = -1;
-        
-        // Normalize the DOM
-        editor.normalize();
+        if (job.next < 0) {
+            finishReplaceAll(job);
+            return;
+        }
+        postReplaceProgress(job, false);
+        setTimeout(function() { runReplaceAllSlice(job, REPLACE_ALL_SLICE_MS); }, 0);
+    }
+
+    function finishReplaceAll(job) {
+        replaceAllJob = null;
+        let replaced = job.matches.length;
+        if (replaced > 0) {
+            // Merge the text nodes the deletions split apart, block by block
+            job.blocks.forEach(function(block) {
+                if (block.isConnected && block.nodeType === Node.ELEMENT_NODE) {
+                    block.normalize();
+                }
+            });
+            saveState();
+            scheduleEditorState(true);
+        }
+        if (job.reportProgress) {
+            postReplaceProgress(job, true);
+        }
+        settleReplaceWaiters(replaced);
+    }
+
+    // Stop a running Replace All and undo the replacements it has made
+    function cancelReplaceAll() {
+        if (pendingReplaceAll) {
+            pendingReplaceAll = null;
+            settleReplaceWaiters(0);
+        }
+        let job = replaceAllJob;
+        if (!job) return false;
+        replaceAllJob = null;
+        let entry = buildJournalEntry(takeJournalRecords());
+        if (entry) {
+            applyJournalEntry(entry, true);
+        }
+        job.cancelled = true;
+        postReplaceProgress(job, true);
+        settleReplaceWaiters(0);
+        return true;
+    }
+
+    // Callers waiting for Replace All to finish, given the replacement count
+    var replaceDoneWaiters = [];
+
+    function settleReplaceWaiters(count) {
+        let waiters = replaceDoneWaiters;
+        replaceDoneWaiters = [];
+        waiters.forEach(function(resolve) { resolve(count); });
+    }
+
+    // ---- Entry points for searching all open documents. The app calls these
+    // in every window and collects the results (see search_all_documents). ----
+
+    // Text around a match, for the results list
+    function searchSnippet(range, context) {
+        let start = range.startContainer;
+        let end = range.endContainer;
+        let before = start.nodeType === Node.TEXT_NODE
+            ? start.data.slice(Math.max(0, range.startOffset - context), range.startOffset) : '';
+        let after = end.nodeType === Node.TEXT_NODE
+            ? end.data.slice(range.endOffset, range.endOffset + context) : '';
+        return {
+            before: normalizeSpaces(before),
+            match: normalizeSpaces(range.toString()),
+            after: normalizeSpaces(after)
+        };
+    }
+
+    // Offsets of every match, found without touching this page's own search:
+    // plain queries scan the index, the other modes run in a worker of their own
+    function scanSearchMatches(searchText, options) {
+        let index = getSearchTextIndex();
+        if (!searchText) return Promise.resolve([]);
+        if (!options.regex && !options.wholeWord && !searchText.includes('\n')) {
+            let isCaseSensitive = !!options.caseSensitive;
+            let searchPattern = normalizeSpaces(searchText);
+            if (!isCaseSensitive) searchPattern = foldSearchCase(searchPattern);
+            let found = [];
+            for (let i = 0; i < index.entries.length; i++) {
+                scanSearchEntry(index.entries[i], searchPattern, isCaseSensitive, found);
+            }
+            return Promise.resolve(found.map(function(match) {
+                let start = match.entry.start + match.offset;
+                return { start: start, end: start + searchPattern.length };
+            }));
+        }
+        return new Promise(function(resolve) {
+            let worker;
+            try {
+                worker = new Worker('search-worker.js');
+            } catch (e) {
+                resolve([]);
+                return;
+            }
+            let found = [];
+            worker.onmessage = function(event) {
+                let data = event.data;
+                for (let i = 0; i < data.matches.length; i += 2) {
+                    found.push({ start: data.matches[i], end: data.matches[i + 1] });
+                }
+                if (data.done) {
+                    worker.terminate();
+                    resolve(found);
+                }
+            };
+            worker.postMessage({
+                generation: 1,
+                text: getSearchSnapshot(index).text,
+                pattern: options.regex ? searchText : normalizeSpaces(searchText),
+                regex: !!options.regex,
+                wholeWord: !!options.wholeWord,
+                caseSensitive: !!options.caseSensitive
+            });
+        });
+    }
+
+    async function listSearchMatches(searchText, options, limit) {
+        let found = await scanSearchMatches(searchText, options);
+        let entries = getSearchTextIndex().entries;
+        let matches = [];
+        for (let i = 0; i < found.length && i < limit; i++) {
+            let range = createSearchRange(searchEntryAt(entries, found[i].start),
+                                          searchEntryAt(entries, found[i].end));
+            let snippet = searchSnippet(range, 40);
+            snippet.start = found[i].start;
+            snippet.end = found[i].end;
+            matches.push(snippet);
+        }
+        return JSON.stringify({ count: found.length, matches: matches });
+    }
+
+    // Select a match listed by listSearchMatches
+    function selectDocumentRange(start, end) {
+        let entries = getSearchTextIndex().entries;
+        if (entries.length === 0) return false;
+        let range = createSearchRange(searchEntryAt(entries, start), searchEntryAt(entries, end));
+        let selection = window.getSelection();
+        selection.removeAllRanges();
+        selection.addRange(range);
+        let container = range.startContainer;
+        let element = container.nodeType === Node.ELEMENT_NODE ? container : container.parentElement;
+        if (element) {
+            element.scrollIntoView({ behavior: 'smooth', block: 'center' });
+        }
+        return true;
+    }
+
+    async function replaceAllInDocument(searchText, replaceText, options) {
+        let count = replaceAll(searchText, replaceText, options);
+        if (count === null) {
+            count = await new Promise(function(resolve) { replaceDoneWaiters.push(resolve); });
+        }
+        return count;
+    }
+
+    function postReplaceProgress(job, done) {
+        try {
+            window.webkit.messageHandlers.replaceProgress.postMessage(JSON.stringify({
+                replaced: job.cancelled ? 0 : job.matches.length - 1 - job.next,
+                total: job.matches.length,
+                done: done,
+                cancelled: !!job.cancelled
+            }));
+        } catch (e) {
+            console.log("Could not report replace progress:", e);
+        }
+    }
+    """
+
+def search_worker_js(self):
+    """JavaScript for the search worker, served as search-worker.js"""
+    return r"""
+    // Scans a text snapshot of the document and streams match offsets back
+    // as flat [start, end, start, end, ...] batches. A newer request replaces
+    // the one in progress.
+    var currentGeneration = 0;
+    var BATCH_MATCHES = 500;
+    var SLICE_MS = 12;
+
+    function escapeRegExp(text) {
+        return text.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
+    }
+
+    function buildSearchRegExp(request) {
+        let source = request.regex ? request.pattern : escapeRegExp(request.pattern);
+        let flags = 'gm' + (request.caseSensitive ? '' : 'i');
+        try {
+            // Unicode mode lets whole-word matching see letters in any script
+            let unicodeSource = request.wholeWord
+                ? '(?<![\\p{L}\\p{N}_])(?:' + source + ')(?![\\p{L}\\p{N}_])'
+                : source;
+            return new RegExp(unicodeSource, flags + 'u');
+        } catch (e) {
+            // Patterns only valid outside Unicode mode (such as "\-") still work
+            return new RegExp(request.wholeWord ? '\\b(?:' + source + ')\\b' : source, flags);
+        }
+    }
+
+    function scan(request, regex) {
+        let text = request.text;
+        let batch = [];
+        
+        function slice() {
+            if (request.generation !== currentGeneration) return;
+            let deadline = performance.now() + SLICE_MS;
+            let match;
+            while ((match = regex.exec(text)) !== null) {
+                if (match[0].length === 0) {
+                    // Empty matches select nothing; step past them
+                    regex.lastIndex++;
+                } else {
+                    batch.push(match.index, match.index + match[0].length);
+                }
+                if (batch.length >= BATCH_MATCHES * 2 || performance.now() > deadline) {
+                    if (batch.length) {
+                        postMessage({ generation: request.generation, matches: batch, done: false });
+                        batch = [];
+                    }
+                    setTimeout(slice, 0);
+                    return;
+                }
+            }
+            postMessage({ generation: request.generation, matches: batch, done: true });
+        }
         
-        return replacementCount;
+        slice();
     }
-    """        
 
+    onmessage = function(event) {
+        let request = event.data;
+        currentGeneration = request.generation;
+        let regex;
+        try {
+            regex = buildSearchRegExp(request);
+        } catch (e) {
+            postMessage({ generation: request.generation, matches: [], done: true, error: e.message });
+            return;
+        }
+        scan(request, regex);
+    };
+    """
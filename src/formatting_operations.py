@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 # formatting_operations.py - formatting related methods
+import difflib
+import threading
 import gi
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
@@ -323,8 +325,26 @@ def on_superscript_toggled(self, win, button):
             button.handler_unblock(win.superscript_handler_id)
 
 
+def _set_active_quietly(button, handler_id, active):
+    """Set a toggle button's state without firing its handler, if it differs"""
+    if button.get_active() == active:
+        return
+    if handler_id is not None:
+        button.handler_block(handler_id)
+    button.set_active(active)
+    if handler_id is not None:
+        button.handler_unblock(handler_id)
+
+def _set_selected_quietly(dropdown, handler_id, index):
+    """Select a dropdown position without firing its handler, if it differs"""
+    if index is None or index < 0 or dropdown.get_selected() == index:
+        return
+    dropdown.handler_block(handler_id)
+    dropdown.set_selected(index)
+    dropdown.handler_unblock(handler_id)
+
 def on_formatting_changed(self, win, manager, result):
-    """Update toggle button states based on current formatting"""
+    """Update toolbar widgets from the formatting fields that changed"""
     try:
         # Extract the message differently based on WebKit version
         message = None
@@ -342,65 +362,39 @@ def on_formatting_changed(self, win, manager, result):
                 print("Could not extract message from result")
                 return
         
-        # Parse the JSON
+        # Parse the JSON; only the fields that changed are present
         import json
         format_state = json.loads(message)
         
         # Update basic formatting button states without triggering their handlers
-        if win.bold_handler_id is not None:
-            win.bold_button.handler_block(win.bold_handler_id)
-            win.bold_button.set_active(format_state.get('bold', False))
-            win.bold_button.handler_unblock(win.bold_handler_id)
-        
-        if win.italic_handler_id is not None:
-            win.italic_button.handler_block(win.italic_handler_id)
-            win.italic_button.set_active(format_state.get('italic', False))
-            win.italic_button.handler_unblock(win.italic_handler_id)
-        
-        if win.underline_handler_id is not None:
-            win.underline_button.handler_block(win.underline_handler_id)
-            win.underline_button.set_active(format_state.get('underline', False))
-            win.underline_button.handler_unblock(win.underline_handler_id)
-            
-        if win.strikeout_handler_id is not None:
-            win.strikeout_button.handler_block(win.strikeout_handler_id)
-            win.strikeout_button.set_active(format_state.get('strikeThrough', False))
-            win.strikeout_button.handler_unblock(win.strikeout_handler_id)
-        
-        # Update subscript and superscript buttons
-        if win.subscript_handler_id is not None:
-            win.subscript_button.handler_block(win.subscript_handler_id)
-            win.subscript_button.set_active(format_state.get('subscript', False))
-            win.subscript_button.handler_unblock(win.subscript_handler_id)
-            
-        if win.superscript_handler_id is not None:
-            win.superscript_button.handler_block(win.superscript_handler_id)
-            win.superscript_button.set_active(format_state.get('superscript', False))
-            win.superscript_button.handler_unblock(win.superscript_handler_id)
+        toggles = [
+            ('bold', 'bold_button', 'bold_handler_id'),
+            ('italic', 'italic_button', 'italic_handler_id'),
+            ('underline', 'underline_button', 'underline_handler_id'),
+            ('strikeThrough', 'strikeout_button', 'strikeout_handler_id'),
+            ('subscript', 'subscript_button', 'subscript_handler_id'),
+            ('superscript', 'superscript_button', 'superscript_handler_id'),
+        ]
+        for key, button_name, handler_name in toggles:
+            handler_id = getattr(win, handler_name, None)
+            if key in format_state and handler_id is not None:
+                _set_active_quietly(getattr(win, button_name), handler_id, bool(format_state[key]))
         
         # Update list button states if they exist
-        if hasattr(win, 'bullet_list_button') and hasattr(win.bullet_list_button, 'handler_id'):
-            win.bullet_list_button.handler_block(win.bullet_list_button.handler_id)
-            win.bullet_list_button.set_active(format_state.get('bulletList', False))
-            win.bullet_list_button.handler_unblock(win.bullet_list_button.handler_id)
-        
-        if hasattr(win, 'numbered_list_button') and hasattr(win.numbered_list_button, 'handler_id'):
-            win.numbered_list_button.handler_block(win.numbered_list_button.handler_id)
-            win.numbered_list_button.set_active(format_state.get('numberedList', False))
-            win.numbered_list_button.handler_unblock(win.numbered_list_button.handler_id)
+        for key, button_name in (('bulletList', 'bullet_list_button'), ('numberedList', 'numbered_list_button')):
+            button = getattr(win, button_name, None)
+            if key in format_state and button is not None and hasattr(button, 'handler_id'):
+                _set_active_quietly(button, button.handler_id, bool(format_state[key]))
         
         # Update alignment button states
-        if hasattr(win, 'alignment_buttons'):
-            current_alignment = format_state.get('alignment', 'left')
+        if 'alignment' in format_state and hasattr(win, 'alignment_buttons'):
+            current_alignment = format_state['alignment']
             for align_type, button in win.alignment_buttons.items():
                 if hasattr(button, 'handler_id'):
-                    button.handler_block(button.handler_id)
-                    button.set_active(align_type == current_alignment)
-                    button.handler_unblock(button.handler_id)
+                    _set_active_quietly(button, button.handler_id, align_type == current_alignment)
         
         # Update paragraph style dropdown
-        paragraph_style = format_state.get('paragraphStyle', 'Normal')
-        if win.paragraph_style_handler_id is not None and hasattr(win, 'paragraph_style_dropdown'):
+        if 'paragraphStyle' in format_state and win.paragraph_style_handler_id is not None and hasattr(win, 'paragraph_style_dropdown'):
             # Map paragraph style to dropdown index
             style_indices = {
                 'Normal': 0,
@@ -411,52 +405,20 @@ def on_formatting_changed(self, win, manager, result):
                 'Heading 5': 5,
                 'Heading 6': 6
             }
-            index = style_indices.get(paragraph_style, 0)
-            
-            # Update the dropdown without triggering the handler
-            win.paragraph_style_dropdown.handler_block(win.paragraph_style_handler_id)
-            win.paragraph_style_dropdown.set_selected(index)
-            win.paragraph_style_dropdown.handler_unblock(win.paragraph_style_handler_id)
-        
-        # Update font family dropdown
-        font_family = format_state.get('fontFamily', '')
-        if win.font_handler_id is not None and hasattr(win, 'font_dropdown') and font_family:
-            # Find the index of the font in the dropdown
-            font_model = win.font_dropdown.get_model()
-            found_index = -1
-            
-            # Iterate through the model to find the matching font
-            for i in range(font_model.get_n_items()):
-                item = font_model.get_item(i)
-                if item and item.get_string().lower() == font_family.lower():
-                    found_index = i
-                    break
-            
-            if found_index >= 0:
-                # Update the dropdown without triggering the handler
-                win.font_dropdown.handler_block(win.font_handler_id)
-                win.font_dropdown.set_selected(found_index)
-                win.font_dropdown.handler_unblock(win.font_handler_id)
-        
-        # Update font size dropdown
-        font_size = format_state.get('fontSize', '')
-        if win.font_size_handler_id is not None and hasattr(win, 'font_size_dropdown') and font_size:
-            # Find the index of the size in the dropdown
-            size_model = win.font_size_dropdown.get_model()
-            found_index = -1
-            
-            # Iterate through the model to find the matching size
-            for i in range(size_model.get_n_items()):
-                item = size_model.get_item(i)
-                if item and item.get_string() == font_size:
-                    found_index = i
-                    break
-            
-            if found_index >= 0:
-                # Update the dropdown without triggering the handler
-                win.font_size_dropdown.handler_block(win.font_size_handler_id)
-                win.font_size_dropdown.set_selected(found_index)
-                win.font_size_dropdown.handler_unblock(win.font_size_handler_id)
+            index = style_indices.get(format_state['paragraphStyle'], 0)
+            _set_selected_quietly(win.paragraph_style_dropdown, win.paragraph_style_handler_id, index)
+        
+        # Update font family dropdown using the name -> position index
+        font_family = format_state.get('fontFamily')
+        if font_family and win.font_handler_id is not None and hasattr(win, 'font_dropdown'):
+            index = self.font_index.get(font_family.lower())
+            _set_selected_quietly(win.font_dropdown, win.font_handler_id, index)
+        
+        # Update font size dropdown using the size -> position index
+        font_size = format_state.get('fontSize')
+        if font_size and win.font_size_handler_id is not None and hasattr(win, 'font_size_dropdown'):
+            index = win.font_size_index.get(font_size)
+            _set_selected_quietly(win.font_size_dropdown, win.font_size_handler_id, index)
             
     except Exception as e:
         print(f"Error updating formatting buttons: {e}")
@@ -816,186 +778,227 @@ def _update_alignment_buttons(self, win, active_alignment):
 def selection_change_js(self):
     """JavaScript to track selection changes and update formatting buttons"""
     return """
-    function updateFormattingState() {
-        try {
-            // Get basic formatting states
-            const isBold = document.queryCommandState('bold');
-            const isItalic = document.queryCommandState('italic');
-            const isUnderline = document.queryCommandState('underline');
-            const isStrikeThrough = document.queryCommandState('strikeThrough');
-            const isSubscript = document.queryCommandState('subscript');
-            const isSuperscript = document.queryCommandState('superscript');
-            
-            // Get list states
-            const isUnorderedList = document.queryCommandState('insertUnorderedList');
-            const isOrderedList = document.queryCommandState('insertOrderedList');
-            
-            // Get alignment states
-            const isJustifyLeft = document.queryCommandState('justifyLeft');
-            const isJustifyCenter = document.queryCommandState('justifyCenter');
-            const isJustifyRight = document.queryCommandState('justifyRight');
-            const isJustifyFull = document.queryCommandState('justifyFull');
-            
-            // Determine the current alignment
-            let currentAlignment = 'left'; // Default
-            if (isJustifyCenter) currentAlignment = 'center';
-            else if (isJustifyRight) currentAlignment = 'right';
-            else if (isJustifyFull) currentAlignment = 'justify';
-            
-            // Get the current paragraph formatting
-            let paragraphStyle = 'Normal'; // Default
-            const selection = window.getSelection();
-            let fontFamily = '';
-            let fontSize = '';
+    window.formattingSent = null;  // Last state posted to Python
+    window.formattingUpdatePending = false;
+    
+    function computeFormattingState() {
+        // Get basic formatting states
+        const isBold = document.queryCommandState('bold');
+        const isItalic = document.queryCommandState('italic');
+        const isUnderline = document.queryCommandState('underline');
+        const isStrikeThrough = document.queryCommandState('strikeThrough');
+        const isSubscript = document.queryCommandState('subscript');
+        const isSuperscript = document.queryCommandState('superscript');
+        
+        // Get list states
+        const isUnorderedList = document.queryCommandState('insertUnorderedList');
+        const isOrderedList = document.queryCommandState('insertOrderedList');
+        
+        // Get alignment states
+        const isJustifyLeft = document.queryCommandState('justifyLeft');
+        const isJustifyCenter = document.queryCommandState('justifyCenter');
+        const isJustifyRight = document.queryCommandState('justifyRight');
+        const isJustifyFull = document.queryCommandState('justifyFull');
+        
+        // Determine the current alignment
+        let currentAlignment = 'left'; // Default
+        if (isJustifyCenter) currentAlignment = 'center';
+        else if (isJustifyRight) currentAlignment = 'right';
+        else if (isJustifyFull) currentAlignment = 'justify';
+        
+        // Get the current paragraph formatting
+        let paragraphStyle = 'Normal'; // Default
+        const selection = window.getSelection();
+        let fontFamily = '';
+        let fontSize = '';
+        
+        if (selection.rangeCount > 0) {
+            const range = selection.getRangeAt(0);
+            const node = range.commonAncestorContainer;
             
-            if (selection.rangeCount > 0) {
-                const range = selection.getRangeAt(0);
-                const node = range.commonAncestorContainer;
-                
-                // Find the closest block element
-                const getNodeName = (node) => {
-                    return node.nodeType === 1 ? node.nodeName.toLowerCase() : null;
-                };
-                
-                const getParentBlockElement = (node) => {
-                    if (node.nodeType === 3) { // Text node
-                        return getParentBlockElement(node.parentNode);
-                    }
-                    const tagName = getNodeName(node);
-                    if (['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'div'].includes(tagName)) {
-                        return node;
-                    }
-                    if (node.parentNode && node.parentNode.id !== 'editor') {
-                        return getParentBlockElement(node.parentNode);
-                    }
-                    return null;
-                };
-                
-                const blockElement = getParentBlockElement(node);
-                if (blockElement) {
-                    const tagName = getNodeName(blockElement);
-                    switch (tagName) {
-                        case 'h1': paragraphStyle = 'Heading 1'; break;
-                        case 'h2': paragraphStyle = 'Heading 2'; break;
-                        case 'h3': paragraphStyle = 'Heading 3'; break;
-                        case 'h4': paragraphStyle = 'Heading 4'; break;
-                        case 'h5': paragraphStyle = 'Heading 5'; break;
-                        case 'h6': paragraphStyle = 'Heading 6'; break;
-                        default: paragraphStyle = 'Normal'; break;
-                    }
+            // Find the closest block element
+            const getNodeName = (node) => {
+                return node.nodeType === 1 ? node.nodeName.toLowerCase() : null;
+            };
+            
+            const getParentBlockElement = (node) => {
+                if (node.nodeType === 3) { // Text node
+                    return getParentBlockElement(node.parentNode);
                 }
-                
-                // Enhanced font size detection
-                // Start with the deepest element at cursor/selection
-                let currentElement = node;
-                if (currentElement.nodeType === 3) { // Text node
-                    currentElement = currentElement.parentNode;
+                const tagName = getNodeName(node);
+                if (['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'div'].includes(tagName)) {
+                    return node;
                 }
-                
-                // Work our way up the DOM tree to find font-size styles
-                while (currentElement && currentElement !== editor) {
-                    // Check for inline font size
-                    if (currentElement.style && currentElement.style.fontSize) {
-                        fontSize = currentElement.style.fontSize;
-                        break;
-                    }
-                    
-                    // Check for font elements with size attribute
-                    if (currentElement.tagName && currentElement.tagName.toLowerCase() === 'font' && currentElement.hasAttribute('size')) {
-                        // This is a rough conversion from HTML font size (1-7) to points
-                        const htmlSize = parseInt(currentElement.getAttribute('size'));
-                        const sizeMap = {1: '8', 2: '10', 3: '12', 4: '14', 5: '18', 6: '24', 7: '36'};
-                        fontSize = sizeMap[htmlSize] || '12';
-                        break;
-                    }
-                    
-                    // If we haven't found a font size yet, move up to parent
-                    currentElement = currentElement.parentNode;
+                if (node.parentNode && node.parentNode.id !== 'editor') {
+                    return getParentBlockElement(node.parentNode);
                 }
-                
-                // If we still don't have a font size, get it from computed style
-                if (!fontSize) {
-                    // Use computed style as a fallback
-                    const computedStyle = window.getComputedStyle(node.nodeType === 3 ? node.parentNode : node);
-                    fontSize = computedStyle.fontSize;
+                return null;
+            };
+            
+            const blockElement = getParentBlockElement(node);
+            if (blockElement) {
+                const tagName = getNodeName(blockElement);
+                switch (tagName) {
+                    case 'h1': paragraphStyle = 'Heading 1'; break;
+                    case 'h2': paragraphStyle = 'Heading 2'; break;
+                    case 'h3': paragraphStyle = 'Heading 3'; break;
+                    case 'h4': paragraphStyle = 'Heading 4'; break;
+                    case 'h5': paragraphStyle = 'Heading 5'; break;
+                    case 'h6': paragraphStyle = 'Heading 6'; break;
+                    default: paragraphStyle = 'Normal'; break;
                 }
-                
-                // Convert pixel sizes to points (approximate)
-                if (fontSize.endsWith('px')) {
-                    const pxValue = parseFloat(fontSize);
-                    fontSize = Math.round(pxValue * 0.75).toString();
-                } else if (fontSize.endsWith('pt')) {
-                    fontSize = fontSize.replace('pt', '');
-                } else {
-                    // For other units or no units, try to extract just the number
-                    fontSize = fontSize.replace(/[^0-9.]/g, '');
+            }
+            
+            // Enhanced font size detection
+            // Start with the deepest element at cursor/selection
+            let currentElement = node;
+            if (currentElement.nodeType === 3) { // Text node
+                currentElement = currentElement.parentNode;
+            }
+            
+            // Work our way up the DOM tree to find font-size styles
+            while (currentElement && currentElement !== editor) {
+                // Check for inline font size
+                if (currentElement.style && currentElement.style.fontSize) {
+                    fontSize = currentElement.style.fontSize;
+                    break;
                 }
                 
-                // Get font family using a similar approach
-                currentElement = node;
-                if (currentElement.nodeType === 3) {
-                    currentElement = currentElement.parentNode;
+                // Check for font elements with size attribute
+                if (currentElement.tagName && currentElement.tagName.toLowerCase() === 'font' && currentElement.hasAttribute('size')) {
+                    // This is a rough conversion from HTML font size (1-7) to points
+                    const htmlSize = parseInt(currentElement.getAttribute('size'));
+                    const sizeMap = {1: '8', 2: '10', 3: '12', 4: '14', 5: '18', 6: '24', 7: '36'};
+                    fontSize = sizeMap[htmlSize] || '12';
+                    break;
                 }
                 
-                while (currentElement && currentElement !== editor) {
-                    if (currentElement.style && currentElement.style.fontFamily) {
-                        fontFamily = currentElement.style.fontFamily;
-                        // Clean up quotes and fallbacks
-                        fontFamily = fontFamily.split(',')[0].replace(/["']/g, '');
-                        break;
-                    }
-                    
-                    // Check for font elements with face attribute
-                    if (currentElement.tagName && currentElement.tagName.toLowerCase() === 'font' && currentElement.hasAttribute('face')) {
-                        fontFamily = currentElement.getAttribute('face');
-                        break;
-                    }
-                    
-                    currentElement = currentElement.parentNode;
+                // If we haven't found a font size yet, move up to parent
+                currentElement = currentElement.parentNode;
+            }
+            
+            // If we still don't have a font size, get it from computed style
+            if (!fontSize) {
+                // Use computed style as a fallback
+                const computedStyle = window.getComputedStyle(node.nodeType === 3 ? node.parentNode : node);
+                fontSize = computedStyle.fontSize;
+            }
+            
+            // Convert pixel sizes to points (approximate)
+            if (fontSize.endsWith('px')) {
+                const pxValue = parseFloat(fontSize);
+                fontSize = Math.round(pxValue * 0.75).toString();
+            } else if (fontSize.endsWith('pt')) {
+                fontSize = fontSize.replace('pt', '');
+            } else {
+                // For other units or no units, try to extract just the number
+                fontSize = fontSize.replace(/[^0-9.]/g, '');
+            }
+            
+            // Get font family using a similar approach
+            currentElement = node;
+            if (currentElement.nodeType === 3) {
+                currentElement = currentElement.parentNode;
+            }
+            
+            while (currentElement && currentElement !== editor) {
+                if (currentElement.style && currentElement.style.fontFamily) {
+                    fontFamily = currentElement.style.fontFamily;
+                    // Clean up quotes and fallbacks
+                    fontFamily = fontFamily.split(',')[0].replace(/["']/g, '');
+                    break;
                 }
                 
-                // If we still don't have a font family, get it from computed style
-                if (!fontFamily) {
-                    const computedStyle = window.getComputedStyle(node.nodeType === 3 ? node.parentNode : node);
-                    fontFamily = computedStyle.fontFamily.split(',')[0].replace(/["']/g, '');
+                // Check for font elements with face attribute
+                if (currentElement.tagName && currentElement.tagName.toLowerCase() === 'font' && currentElement.hasAttribute('face')) {
+                    fontFamily = currentElement.getAttribute('face');
+                    break;
                 }
+                
+                currentElement = currentElement.parentNode;
             }
             
-            // Send the state to Python - Now including list and alignment states
-            window.webkit.messageHandlers.formattingChanged.postMessage(
-                JSON.stringify({
-                    bold: isBold, 
-                    italic: isItalic, 
-                    underline: isUnderline,
-                    strikeThrough: isStrikeThrough,
-                    subscript: isSubscript,
-                    superscript: isSuperscript,
-                    paragraphStyle: paragraphStyle,
-                    fontFamily: fontFamily,
-                    fontSize: fontSize,
-                    bulletList: isUnorderedList,
-                    numberedList: isOrderedList,
-                    alignment: currentAlignment
-                })
-            );
+            // If we still don't have a font family, get it from computed style
+            if (!fontFamily) {
+                const computedStyle = window.getComputedStyle(node.nodeType === 3 ? node.parentNode : node);
+                fontFamily = computedStyle.fontFamily.split(',')[0].replace(/["']/g, '');
+            }
+        }
+        
+        return {
+            bold: isBold, 
+            italic: isItalic, 
+            underline: isUnderline,
+            strikeThrough: isStrikeThrough,
+            subscript: isSubscript,
+            superscript: isSuperscript,
+            paragraphStyle: paragraphStyle,
+            fontFamily: fontFamily,
+            fontSize: fontSize,
+            bulletList: isUnorderedList,
+            numberedList: isOrderedList,
+            alignment: currentAlignment
+        };
+    }
+    
+    // Send only the fields that differ from the last posted state
+    function updateFormattingState() {
+        try {
+            const state = computeFormattingState();
+            const last = window.formattingSent || {};
+            const delta = {};
+            let changed = false;
+            for (const key in state) {
+                if (state[key] !== last[key]) {
+                    delta[key] = state[key];
+                    changed = true;
+                }
+            }
+            if (!changed) return;
+            window.formattingSent = state;
+            window.webkit.messageHandlers.formattingChanged.postMessage(JSON.stringify(delta));
         } catch(e) {
             console.log("Error updating formatting state:", e);
         }
     }
     
-    document.addEventListener('selectionchange', function() {
-        // Only update if the selection is in our editor
-        const selection = window.getSelection();
-        if (selection.rangeCount > 0) {
-            const range = selection.getRangeAt(0);
-            const editor = document.getElementById('editor');
-            
-            // Check if the selection is within our editor
-            if (editor.contains(range.commonAncestorContainer)) {
-                updateFormattingState();
+    // Coalesce selection changes into one update per animation frame
+    function scheduleFormattingState() {
+        if (window.formattingUpdatePending) return;
+        window.formattingUpdatePending = true;
+        requestAnimationFrame(function() {
+            window.formattingUpdatePending = false;
+            const selection = window.getSelection();
+            if (selection.rangeCount > 0) {
+                const range = selection.getRangeAt(0);
+                const editor = document.getElementById('editor');
+                
+                // Only update if the selection is in our editor
+                if (editor.contains(range.commonAncestorContainer)) {
+                    updateFormattingState();
+                }
             }
-        }
-    });
+        });
+    }
+    
+    // Forget what was sent so the next update carries every field
+    function resetFormattingState() {
+        window.formattingSent = null;
+        scheduleFormattingState();
+    }
+    
+    // Toolbar commands can leave the widgets out of step with the last
+    // posted state, so resend everything after each command
+    (function() {
+        const nativeExecCommand = document.execCommand.bind(document);
+        document.execCommand = function(command, showUI, value) {
+            const result = nativeExecCommand(command, showUI, value);
+            resetFormattingState();
+            return result;
+        };
+    })();
+    
+    document.addEventListener('selectionchange', scheduleFormattingState);
     """
 # ---- PARAGRAPH STYLE HANDLER ----
 def on_paragraph_style_changed(self, win, dropdown):
@@ -1029,11 +1032,81 @@ def on_paragraph_style_changed(self, win, dropdown):
     win.statusbar.set_text(f"Applied {dropdown.get_selected_item().get_string()} style")
     win.webview.grab_focus()
 
+# ---- FONT CATALOG ----
+def setup_font_catalog(self):
+    """Create the font family model shared by every window and fill it in the background"""
+    self.font_catalog = Gtk.StringList()
+    self.font_index = {}  # lowercased family name -> position in font_catalog
+    self.font_catalog_serial = 0
+    
+    # Fontconfig bumps this timestamp when fonts are installed or removed
+    settings = Gtk.Settings.get_default()
+    if settings is not None:
+        settings.connect("notify::gtk-fontconfig-timestamp",
+                         lambda settings, param: self.refresh_font_catalog())
+    
+    self.refresh_font_catalog()
+
+def refresh_font_catalog(self):
+    """List font families on a worker thread and merge them into the catalog"""
+    self.font_catalog_serial += 1
+    serial = self.font_catalog_serial
+    
+    def list_families():
+        try:
+            # A private font map: Pango objects must not be shared across threads
+            font_map = PangoCairo.FontMap.new()
+            names = sorted({family.get_name() for family in font_map.list_families()})
+        except Exception as e:
+            print(f"Error listing font families: {e}")
+            return
+        GLib.idle_add(self._merge_font_families, serial, names)
+    
+    threading.Thread(target=list_families, daemon=True).start()
+
+def _merge_font_families(self, serial, names):
+    """Apply a sorted family list to the shared catalog with the fewest splices"""
+    if serial != self.font_catalog_serial:
+        return False  # A newer refresh is already on its way
+    
+    catalog = self.font_catalog
+    current = [catalog.get_string(i) for i in range(catalog.get_n_items())]
+    
+    # Shifting positions must not look like a font choice to the dropdowns
+    dropdowns = [(win.font_dropdown, win.font_handler_id) for win in self.windows
+                 if getattr(win, 'font_handler_id', None) is not None and hasattr(win, 'font_dropdown')]
+    for dropdown, handler_id in dropdowns:
+        dropdown.handler_block(handler_id)
+    try:
+        if not current:
+            catalog.splice(0, 0, names)
+        else:
+            # Work backwards so earlier positions stay valid
+            matcher = difflib.SequenceMatcher(None, current, names, autojunk=False)
+            for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+                if tag != 'equal':
+                    catalog.splice(i1, i2 - i1, names[j1:j2])
+    finally:
+        for dropdown, handler_id in dropdowns:
+            dropdown.handler_unblock(handler_id)
+    
+    font_index = {}
+    for position, family in enumerate(names):
+        font_index.setdefault(family.lower(), position)
+    self.font_index = font_index
+    
+    # Positions may have moved, so have each page resend its formatting state
+    for win in self.windows:
+        self.execute_js(win, "resetFormattingState();")
+    return False
+
 # ---- FONT FAMILY HANDLER ----
 def on_font_changed(self, win, dropdown):
     """Handle font family dropdown change"""
     # Get the selected font
     selected_item = dropdown.get_selected_item()
+    if selected_item is None:
+        return
     
     # Skip if it's a separator
     if selected_item.get_string() == "──────────":
@@ -1094,7 +1167,6 @@ def on_font_size_changed(self, win, dropdown):
                 
                 // Record undo state
                 saveState();
-                window.lastContent = editor.innerHTML;
                 window.redoStack = [];
                 try {{
                     window.webkit.messageHandlers.contentChanged.postMessage("changed");
@@ -1145,7 +1217,6 @@ def on_font_size_changed(self, win, dropdown):
                                 
                                 // Record state
                                 saveState();
-                                window.lastContent = editor.innerHTML;
                                 window.redoStack = [];
                                 try {{
                                     window.webkit.messageHandlers.contentChanged.postMessage("changed");
@@ -1223,6 +1294,7 @@ def on_font_size_changed(self, win, dropdown):
     
     # Execute the JavaScript code
     self.execute_js(win, js_code)
+    self.execute_js(win, "resetFormattingState();")
     
     # Run another cleanup after a short delay to catch any remaining issues
     GLib.timeout_add(100, lambda: self.cleanup_editor_tags(win))
@@ -1429,7 +1501,6 @@ def apply_font_color(self, win, color_hex):
                 
                 // Record undo state
                 saveState();
-                window.lastContent = editor.innerHTML;
                 window.redoStack = [];
                 try {{
                     window.webkit.messageHandlers.contentChanged.postMessage("changed");
@@ -1473,7 +1544,6 @@ def apply_font_color(self, win, color_hex):
                                 
                                 // Record state
                                 saveState();
-                                window.lastContent = editor.innerHTML;
                                 window.redoStack = [];
                                 try {{
                                     window.webkit.messageHandlers.contentChanged.postMessage("changed");
@@ -1613,7 +1683,6 @@ def apply_bg_color(self, win, color_hex):
                 
                 // Record undo state
                 saveState();
-                window.lastContent = editor.innerHTML;
                 window.redoStack = [];
                 try {{
                     window.webkit.messageHandlers.contentChanged.postMessage("changed");
@@ -1657,7 +1726,6 @@ def apply_bg_color(self, win, color_hex):
                                 
                                 // Record state
                                 saveState();
-                                window.lastContent = editor.innerHTML;
                                 window.redoStack = [];
                                 try {{
                                     window.webkit.messageHandlers.contentChanged.postMessage("changed");
@@ -1767,7 +1835,6 @@ def on_clear_formatting_clicked(self, win, button):
                         // Record undo state
                         if (window.saveState) {
                             saveState();
-                            window.lastContent = editor.innerHTML;
                             window.redoStack = [];
                             try {
                                 window.webkit.messageHandlers.contentChanged.postMessage("changed");
@@ -1943,7 +2010,6 @@ def on_change_case(self, win, case_type):
                 
                 // Record undo state
                 saveState();
-                window.lastContent = editor.innerHTML;
                 window.redoStack = [];
                 try {{
                     window.webkit.messageHandlers.contentChanged.postMessage("changed");
@@ -2516,7 +2582,6 @@ def on_line_spacing_shortcut(self, win, spacing):
             // Record undo state if the function exists
             if (typeof saveState === 'function') {{
                 saveState();
-                window.lastContent = document.getElementById('editor').innerHTML;
                 window.redoStack = [];
             }}
         }}
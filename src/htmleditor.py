@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
+import time
+STARTUP_T0 = time.perf_counter()  # Reference point for --profile-startup
+
 import sys
 import gi
 import re
 import os
+import json
 
 # Hardware Acclerated Rendering (0); Software Rendering (1)
 os.environ['WEBKIT_DISABLE_COMPOSITING_MODE'] = '1'
@@ -11,7 +15,7 @@ gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
 gi.require_version('WebKit', '6.0')
 
-from gi.repository import Gtk, Adw, Gdk, WebKit, GLib, Gio, Pango, PangoCairo, Gdk
+from gi.repository import Gtk, Adw, Gdk, WebKit, GLib, Gio, Pango, Gdk
 
 # Import file operation functions directly
 import file_operations # open, save, save as
@@ -20,6 +24,14 @@ import formatting_operations
 import insert_table
 import show_html
 import keyboard_shortcuts
+import libreoffice_service
+import conversion_cache
+import image_store
+STARTUP_IMPORTS_DONE = time.perf_counter()
+
+# The editor page and its runtime are served from this scheme
+EDITOR_SCHEME = 'htmleditor'
+EDITOR_PAGE_URI = f'{EDITOR_SCHEME}://editor/index.html'
  
 class HTMLEditorApp(Adw.Application):
     def __init__(self, **kwargs):
@@ -37,12 +49,16 @@ class HTMLEditorApp(Adw.Application):
         self.auto_save_interval = 60
         self.current_file = None
         self.auto_save_source_id = None
+        self.editor_runtime = None  # Editor page assets, built on first request
+        self.profile_startup = False  # Set by --profile-startup
+        self.startup_marks = [('imports', STARTUP_IMPORTS_DONE)]
         
         # Import methods from file_operations module
         file_operation_methods = [
             # File opening methods
             'on_open_clicked', 'on_open_new_window_response',
-            'on_open_current_window_response', 'load_file',
+            'on_open_current_window_response', 'load_file', 'read_document_content',
+            'open_files',
             '_process_image_references', '_get_mime_type', 'cleanup_temp_files',
             'convert_with_libreoffice', 'show_loading_dialog',
             
@@ -60,6 +76,9 @@ class HTMLEditorApp(Adw.Application):
             'save_as_mhtml', '_restore_editable_after_save', '_restore_editable_state', 
             '_do_mhtml_save_with_non_editable_content', 'save_webkit_callback', 'save_as_html',
             'save_as_text','save_as_markdown', '_simple_markdown_to_html',
+            'get_image_store', 'export_document', 'save_html_content',
+            'save_to_file', 'save_document', 'on_document_saved',
+            'start_export_stream', 'on_export_chunk',
 
             # Save as PDF
             'save_as_pdf', '_save_pdf_step1', '_save_pdf_step2', '_pdf_save_success',
@@ -94,12 +113,17 @@ class HTMLEditorApp(Adw.Application):
         find_methods = [
             'create_find_bar', 'on_find_shortcut', 'on_find_clicked',
             'on_close_find_clicked', 'on_case_sensitive_toggled',
-            'on_find_text_changed', 'on_search_result', 'on_find_next_clicked',
+            'on_find_text_changed', '_run_find', 'on_search_result', 'on_find_next_clicked',
             'on_find_previous_clicked', 'on_replace_clicked', 
             'on_replace_all_clicked', 'on_replace_all_result', 
             'on_find_key_pressed', 'on_find_button_toggled',
             'populate_find_field_from_selection', '_on_get_selection_for_find',
-            'search_functions_js'
+            'search_functions_js', 'search_worker_js', 'on_search_mode_toggled',
+            'on_search_progress', '_show_match_count', '_get_search_options',
+            'on_replace_progress', '_set_replace_all_running',
+            'on_all_documents_toggled', '_call_page_function', '_clear_all_documents_results',
+            'search_all_documents', '_on_document_matches', 'on_search_result_activated',
+            'replace_all_documents', 'on_batch_replace', 'show_batch_replace_dialog'
         ]
         
         # Import methods from find module
@@ -143,6 +167,7 @@ class HTMLEditorApp(Adw.Application):
             'set_box_color', 'on_clear_formatting_clicked', 'on_change_case',
             'on_drop_cap_clicked', '_handle_drop_cap_result', 'on_show_formatting_marks_toggled',
             'on_line_spacing_shortcut', 'on_font_size_change_shortcut',
+            'setup_font_catalog', 'refresh_font_catalog', '_merge_font_families',
             
         ]
 
@@ -206,8 +231,121 @@ class HTMLEditorApp(Adw.Application):
         # Set up CSS provider
         self.setup_css_provider()
         
+        # Serve the editor runtime to every window's WebView
+        self.register_editor_scheme()
+        
+        # Start listing fonts; windows share the catalog as it fills in
+        self.setup_font_catalog()
+        
         # Create actions
         self.create_actions()
+        self.mark_startup('do_startup')
+
+    def do_shutdown(self):
+        """Stop background services before the application exits"""
+        libreoffice_service.shutdown()
+        # Stores of windows still open when the application quits
+        image_store.cleanup_all()
+        Adw.Application.do_shutdown(self)
+
+    def mark_startup(self, phase):
+        """Record the first time a startup phase completes (--profile-startup)"""
+        if not self.profile_startup or any(name == phase for name, _ in self.startup_marks):
+            return
+        self.startup_marks.append((phase, time.perf_counter()))
+        recorded = {name for name, _ in self.startup_marks}
+        if {'webview load', 'DOMContentLoaded'} <= recorded:
+            self.report_startup_profile()
+
+    def report_startup_profile(self):
+        """Print the per-phase startup timing breakdown"""
+        print("Startup profile (ms):")
+        print(f"  {'phase':<20}{'phase':>10}{'total':>10}")
+        previous = STARTUP_T0
+        for phase, timestamp in sorted(self.startup_marks, key=lambda mark: mark[1]):
+            print(f"  {phase:<20}{(timestamp - previous) * 1000:>10.1f}{(timestamp - STARTUP_T0) * 1000:>10.1f}")
+            previous = timestamp
+
+    def register_editor_scheme(self):
+        """Register the URI scheme the editor page and its assets load from"""
+        context = WebKit.WebContext.get_default()
+        context.register_uri_scheme(EDITOR_SCHEME, self.on_editor_scheme_request)
+        security_manager = context.get_security_manager()
+        security_manager.register_uri_scheme_as_secure(EDITOR_SCHEME)
+        security_manager.register_uri_scheme_as_local(EDITOR_SCHEME)
+
+    def on_editor_scheme_request(self, request):
+        """Answer htmleditor:// requests from the prebuilt runtime assets"""
+        name = request.get_path().lstrip('/')
+        if name == 'document':
+            asset = self._take_staged_document(request.get_web_view(), request.get_uri())
+        elif name.startswith('blob/'):
+            blob_id = name[len('blob/'):]
+            path = self._claim_blob(request.get_web_view(), blob_id)
+            if path is not None:
+                # Streamed from disk; WebKit caches the decoded image itself
+                stream = Gio.File.new_for_path(path).read(None)
+                request.finish(stream, os.path.getsize(path), image_store.mime_type_for(blob_id))
+                return
+            asset = None
+        else:
+            asset = self.get_editor_runtime().get(name)
+        if asset is None:
+            request.finish_error(GLib.Error.new_literal(
+                Gio.io_error_quark(), f"Not found: {request.get_uri()}", Gio.IOErrorEnum.NOT_FOUND))
+            return
+        data, mime_type = asset
+        stream = Gio.MemoryInputStream.new_from_bytes(data)
+        request.finish(stream, data.get_size(), mime_type)
+
+    def _claim_blob(self, webview, blob_id):
+        """Return the file for an image a page asks for, keeping a copy in its window's store"""
+        for win in self.windows:
+            if win.webview is webview:
+                return self.get_image_store(win).claim(blob_id)
+        return image_store.find_blob(blob_id)
+
+    def stage_document_content(self, win, html):
+        """Hold a document body for the page to fetch and return the JS that loads it
+
+        The body travels through the htmleditor:// scheme instead of a
+        JavaScript string literal, so script size does not depend on it.
+        """
+        win.document_transfer_count = getattr(win, 'document_transfer_count', 0) + 1
+        if not hasattr(win, 'staged_documents'):
+            win.staged_documents = {}
+        win.staged_documents[win.document_transfer_count] = GLib.Bytes.new(html.encode('utf-8'))
+        return f'loadDocument("{EDITOR_SCHEME}://editor/document?n={win.document_transfer_count}");'
+
+    def _take_staged_document(self, webview, uri):
+        """Hand over, and forget, the document a WebView asks for by its ?n= number
+
+        Loads staged close together are each served their own body; bodies
+        staged before the one taken are dropped, as a later load supersedes them.
+        """
+        match = re.search(r'[?&]n=(\d+)', uri)
+        if not match:
+            return None
+        number = int(match.group(1))
+        for win in self.windows:
+            staged = getattr(win, 'staged_documents', None)
+            if win.webview is webview and staged and number in staged:
+                data = staged.pop(number)
+                for older in [n for n in staged if n < number]:
+                    del staged[older]
+                return (data, 'text/html; charset=utf-8')
+        return None
+
+    def get_editor_runtime(self):
+        """Return the editor page, styles and script, assembled once per process"""
+        if self.editor_runtime is None:
+            self.editor_runtime = {
+                'index.html': (GLib.Bytes.new(self.get_editor_html().encode('utf-8')), 'text/html'),
+                'editor.css': (GLib.Bytes.new(self.get_editor_css().encode('utf-8')), 'text/css'),
+                'editor.js': (GLib.Bytes.new(self.get_editor_js().encode('utf-8')), 'text/javascript'),
+                'search-worker.js': (GLib.Bytes.new(self.search_worker_js().encode('utf-8')), 'text/javascript'),
+            }
+        return self.editor_runtime
 
 
     def setup_css_provider(self):
@@ -331,6 +469,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
     def on_open(self, app, files, n_files, hint):
         """Handle file opening"""
         windows_added = False
+        new_paths = []
         
         for file in files:
             file_path = file.get_path()
@@ -342,11 +481,17 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             
             if existing_win:
                 existing_win.present()
-            else:
-                win = self.create_window()
-                self.load_file(win, file_path)
-                win.present()
-                windows_added = True
+            elif file_path not in new_paths:
+                new_paths.append(file_path)
+        
+        # Several files share one progress dialog and get windows as they finish
+        if len(new_paths) > 1:
+            self.open_files(new_paths)
+        elif new_paths:
+            win = self.create_window()
+            self.load_file(win, new_paths[0])
+            win.present()
+            windows_added = True
                 
         if windows_added:
             self.update_window_menu()
@@ -368,6 +513,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         file_section.append("Open", "app.open") # You'll need to add this action
         file_section.append("Save", "app.save") # You'll need to add this action
         file_section.append("Save As", "app.save-as") # You'll need to add this action
+        file_section.append("Replace in Folder…", "app.batch-replace")
         menu.append_section("File", file_section)
         
         # View menu section
@@ -555,15 +701,13 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
 
 ######### get_editor_html and it's sub methods;                 
 
-    def get_editor_html(self, content=""):
-        """Return HTML for the editor with improved table and text box styles"""
-        content = self._prepare_content(content)
-        
+    def get_editor_html(self):
+        """Return the editor page; styles and script load as separate assets"""
         return f"""
         <!DOCTYPE html>
         <html style="height: 100%;">
         <head>
-            {self._get_editor_head(content)}
+            {self._get_editor_head()}
         </head>
         <body>
             {self._get_editor_body()}
@@ -571,27 +715,26 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         </html>
         """
 
-    def _prepare_content(self, content):
-        """Prepare content for HTML embedding by escaping special characters"""
-        return content.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
-
-    def _get_editor_head(self, content):
+    def _get_editor_head(self):
         """Return the head section of the editor HTML"""
-        return f"""
+        return """
+            <meta charset="utf-8">
             <title>HTML Editor</title>
-            <style>
-                {self._get_base_styles()}
-                {self._get_table_styles()}
-                {self._get_floating_table_styles()}
-                {self._get_text_box_styles()}
-                {self._get_selection_styles()}
-                {self._get_dark_mode_styles()}
-                {self._get_light_mode_styles()}
-            </style>
-            <script>
-                window.initialContent = "{content or '<div><font face="Sans" style="font-size: 11pt;"><br></font></div>'}";
-                {self.get_editor_js()}
-            </script>
+            <link rel="stylesheet" href="editor.css">
+            <script src="editor.js"></script>
+        """
+
+    def get_editor_css(self):
+        """Return the combined CSS for the editor page"""
+        return f"""
+            {self._get_base_styles()}
+            {self._get_table_styles()}
+            {self._get_floating_table_styles()}
+            {self._get_text_box_styles()}
+            {self._get_selection_styles()}
+            {self._get_search_styles()}
+            {self._get_dark_mode_styles()}
+            {self._get_light_mode_styles()}
         """
 
     def _get_editor_body(self):
@@ -739,6 +882,19 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             }
         """
 
+    def _get_search_styles(self):
+        """Return CSS styles for search matches (drawn as highlights, not markup)"""
+        return """
+            ::highlight(search-results) {
+                background-color: #FFFF00;
+                color: #000000;
+            }
+            ::highlight(search-current) {
+                background-color: #FF9632;
+                color: #000000;
+            }
+        """
+
     def _get_dark_mode_styles(self):
         """Return CSS styles for dark mode"""
         return """
@@ -781,23 +937,28 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
     def get_editor_js(self):
         """Return the combined JavaScript logic for the editor."""
         return f"""
+        // Content shown in a new, empty document
+        window.initialContent = '<div><font face="Sans" style="font-size: 11pt;"><br></font></div>';
+
         // Global scope for persistence
         window.undoStack = [];
         window.redoStack = [];
         window.isUndoRedo = false;
-        window.lastContent = "";
         
         // Search variables
         var searchResults = [];
         var searchIndex = -1;
         var currentSearchText = "";
 
+        {self.undo_journal_js()}
         {self.save_state_js()}
         {self.perform_undo_js()}
         {self.perform_redo_js()}
         {self.find_last_text_node_js()}
         {self.get_stack_sizes_js()}
+        {self.editor_state_js()}
         {self.set_content_js()}
+        {self.export_document_js()}
         {self.selection_change_js()}
         {self.search_functions_js()}
         {self.paragraph_and_line_spacing_js()}
@@ -811,15 +972,311 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         {self.init_editor_js()}
         """
 
+    def undo_journal_js(self):
+        """JavaScript for the mutation-based undo journal.
+
+        Undo entries hold reversible DOM operations (text, attribute and
+        child list changes) recorded by a MutationObserver instead of full
+        innerHTML snapshots, and the stacks are trimmed by estimated size.
+        """
+        return """
+        window.undoJournal = {
+            observer: null,
+            pending: [],
+            budgetBytes: 32 * 1024 * 1024,  // Combined undo + redo memory budget
+            truncated: false                // True once the oldest entries were dropped
+        };
+
+        function startUndoJournal(editor) {
+            const journal = window.undoJournal;
+            if (journal.observer) {
+                journal.observer.disconnect();
+            }
+            journal.pending = [];
+            journal.observer = new MutationObserver(function(records) {
+                for (const record of records) {
+                    journal.pending.push(record);
+                }
+            });
+            journal.observer.observe(editor, {
+                childList: true,
+                subtree: true,
+                characterData: true,
+                characterDataOldValue: true,
+                attributes: true,
+                attributeOldValue: true
+            });
+        }
+
+        function takeJournalRecords() {
+            const journal = window.undoJournal;
+            if (!journal.observer) return [];
+            const records = journal.pending.concat(journal.observer.takeRecords());
+            journal.pending = [];
+            return records;
+        }
+
+        // Move queued records into pending; returns how many are pending
+        function collectJournalRecords() {
+            const journal = window.undoJournal;
+            if (!journal.observer) return 0;
+            for (const record of journal.observer.takeRecords()) {
+                journal.pending.push(record);
+            }
+            return journal.pending.length;
+        }
+
+        function estimateNodeBytes(node) {
+            if (node.nodeType === 1) {
+                return node.outerHTML.length * 2;
+            }
+            return (node.nodeValue ? node.nodeValue.length : 0) * 2 + 16;
+        }
+
+        // Convert MutationRecords into reversible operations. Consecutive edits
+        // of the same text node or attribute collapse into a single operation.
+        // Records before splitAt and from splitAt on become separate entries.
+        function buildJournalEntries(records, splitAt) {
+            if (!records.length) return [];
+            const ops = [];
+            records.forEach(function(record, index) {
+                const segment = splitAt && index >= splitAt ? 1 : 0;
+                const last = ops[ops.length - 1];
+                const sameSegment = last && last.segment === segment;
+                if (record.type === 'characterData') {
+                    if (sameSegment && last.type === 'text' && last.node === record.target) return;
+                    ops.push({ type: 'text', segment: segment, node: record.target,
+                               oldValue: record.oldValue, newValue: null });
+                } else if (record.type === 'attributes') {
+                    if (sameSegment && last.type === 'attr' && last.node === record.target &&
+                        last.name === record.attributeName) return;
+                    ops.push({ type: 'attr', segment: segment, node: record.target,
+                               name: record.attributeName, oldValue: record.oldValue, newValue: null });
+                } else {
+                    ops.push({ type: 'children', segment: segment, target: record.target,
+                               added: Array.from(record.addedNodes),
+                               removed: Array.from(record.removedNodes),
+                               next: record.nextSibling });
+                }
+            });
+
+            // Walk backwards from the live DOM to find each operation's new value
+            const textAfter = new Map();
+            const attrAfter = new Map();
+            const entries = [{ ops: [], bytes: 0 }, { ops: [], bytes: 0 }];
+            for (let i = ops.length - 1; i >= 0; i--) {
+                const op = ops[i];
+                let bytes = 32;
+                if (op.type === 'text') {
+                    op.newValue = textAfter.has(op.node) ? textAfter.get(op.node) : op.node.data;
+                    textAfter.set(op.node, op.oldValue);
+                    bytes += ((op.oldValue || '').length + (op.newValue || '').length) * 2;
+                } else if (op.type === 'attr') {
+                    let values = attrAfter.get(op.node);
+                    if (!values) {
+                        values = {};
+                        attrAfter.set(op.node, values);
+                    }
+                    op.newValue = (op.name in values) ? values[op.name] : op.node.getAttribute(op.name);
+                    values[op.name] = op.oldValue;
+                    bytes += ((op.oldValue || '').length + (op.newValue || '').length) * 2;
+                } else {
+                    for (const node of op.added) bytes += estimateNodeBytes(node);
+                    for (const node of op.removed) bytes += estimateNodeBytes(node);
+                }
+                entries[op.segment].ops.push(op);
+                entries[op.segment].bytes += bytes;
+            }
+            for (const entry of entries) entry.ops.reverse();
+            return entries.filter(entry => entry.ops.length > 0);
+        }
+
+        function buildJournalEntry(records) {
+            return buildJournalEntries(records)[0] || null;
+        }
+
+        function setJournalAttribute(node, name, value) {
+            if (value === null || value === undefined) {
+                node.removeAttribute(name);
+            } else {
+                node.setAttribute(name, value);
+            }
+        }
+
+        function revertJournalOp(op) {
+            if (op.type === 'text') {
+                op.node.data = op.oldValue;
+            } else if (op.type === 'attr') {
+                setJournalAttribute(op.node, op.name, op.oldValue);
+            } else {
+                for (const node of op.added) {
+                    if (node.parentNode === op.target) op.target.removeChild(node);
+                }
+                const ref = op.next && op.next.parentNode === op.target ? op.next : null;
+                for (const node of op.removed) {
+                    op.target.insertBefore(node, ref);
+                }
+            }
+        }
+
+        function replayJournalOp(op) {
+            if (op.type === 'text') {
+                op.node.data = op.newValue;
+            } else if (op.type === 'attr') {
+                setJournalAttribute(op.node, op.name, op.newValue);
+            } else {
+                for (const node of op.removed) {
+                    if (node.parentNode === op.target) op.target.removeChild(node);
+                }
+                const ref = op.next && op.next.parentNode === op.target ? op.next : null;
+                for (const node of op.added) {
+                    op.target.insertBefore(node, ref);
+                }
+            }
+        }
+
+        // Apply an entry in place; returns the operation applied last
+        function applyJournalEntry(entry, revert) {
+            const ops = entry.ops;
+            window.isUndoRedo = true;
+            try {
+                if (revert) {
+                    for (let i = ops.length - 1; i >= 0; i--) {
+                        try { revertJournalOp(ops[i]); } catch (e) { console.log("Undo step skipped:", e); }
+                    }
+                } else {
+                    for (let i = 0; i < ops.length; i++) {
+                        try { replayJournalOp(ops[i]); } catch (e) { console.log("Redo step skipped:", e); }
+                    }
+                }
+                // Our own patches must not be journaled again
+                takeJournalRecords();
+            } finally {
+                window.isUndoRedo = false;
+            }
+            return revert ? ops[0] : ops[ops.length - 1];
+        }
+
+        // Fold changes recorded since the last saveState() into the newest entry
+        function absorbPendingRecords() {
+            const entry = buildJournalEntry(takeJournalRecords());
+            const top = window.undoStack[window.undoStack.length - 1];
+            if (entry && top) {
+                top.ops = top.ops.concat(entry.ops);
+                top.bytes += entry.bytes;
+            }
+        }
+
+        function trimUndoJournal() {
+            const journal = window.undoJournal;
+            let total = 0;
+            for (const entry of window.undoStack) total += entry.bytes;
+            for (const entry of window.redoStack) total += entry.bytes;
+            while (total > journal.budgetBytes && window.undoStack.length > 1) {
+                total -= window.undoStack.shift().bytes;
+                journal.truncated = true;
+            }
+            while (total > journal.budgetBytes && window.redoStack.length > 0) {
+                total -= window.redoStack.shift().bytes;
+            }
+            return total;
+        }
+
+        function isJournalAtBaseline() {
+            return window.undoStack.length === 0 && !window.undoJournal.truncated;
+        }
+
+        function resetUndoJournal() {
+            closeTypingBurst();
+            takeJournalRecords();
+            window.undoStack = [];
+            window.redoStack = [];
+            window.undoJournal.truncated = false;
+            scheduleEditorState(false);
+        }
+
+        // Place the caret at the end of the region touched by an operation
+        function restoreJournalCaret(op, reverted) {
+            const editor = document.getElementById('editor');
+            const sel = window.getSelection();
+            const range = document.createRange();
+            try {
+                if (op && op.type === 'text' && editor.contains(op.node)) {
+                    const from = reverted ? op.newValue : op.oldValue;
+                    const to = reverted ? op.oldValue : op.newValue;
+                    let suffix = 0;
+                    const limit = Math.min(from.length, to.length);
+                    while (suffix < limit && from[from.length - 1 - suffix] === to[to.length - 1 - suffix]) {
+                        suffix++;
+                    }
+                    range.setStart(op.node, to.length - suffix);
+                } else if (op && op.type === 'children') {
+                    const nodes = (reverted ? op.removed : op.added).filter(n => editor.contains(n));
+                    if (nodes.length) {
+                        range.setStartAfter(nodes[nodes.length - 1]);
+                    } else if (editor.contains(op.target)) {
+                        const textNode = findLastTextNode(op.target);
+                        if (textNode) range.setStart(textNode, textNode.length);
+                        else range.setStart(op.target, op.target.childNodes.length);
+                    } else {
+                        throw new Error("target detached");
+                    }
+                } else if (op && editor.contains(op.node)) {
+                    const textNode = findLastTextNode(op.node);
+                    if (textNode) range.setStart(textNode, textNode.length);
+                    else range.setStart(op.node, 0);
+                } else {
+                    throw new Error("no caret target");
+                }
+            } catch (e) {
+                const textNode = findLastTextNode(editor) || editor;
+                const offset = textNode.nodeType === 3 ? textNode.length : 0;
+                range.setStart(textNode, offset);
+            }
+            range.collapse(true);
+            sel.removeAllRanges();
+            sel.addRange(range);
+        }
+        """
     
     def save_state_js(self):
         """JavaScript to save the editor state to the undo stack."""
         return """
+        // An open typing burst keeps collecting keystrokes until a word
+        // boundary or a pause, so a whole word becomes one undo entry.
+        window.typingBurst = { kind: null, recordCount: 0, timer: null };
+        window.typingPauseMs = 1000;
+
+        function closeTypingBurst() {
+            const burst = window.typingBurst;
+            if (burst.timer) {
+                clearTimeout(burst.timer);
+                burst.timer = null;
+            }
+            const recordCount = burst.kind ? burst.recordCount : 0;
+            burst.kind = null;
+            burst.recordCount = 0;
+            return recordCount;
+        }
+
+        function flushTypingBurst() {
+            if (window.typingBurst.kind) {
+                saveState();
+            }
+        }
+
         function saveState() {
-            window.undoStack.push(document.getElementById('editor').innerHTML);
-            if (window.undoStack.length > 100) {
-                window.undoStack.shift();
+            // Changes made after the open burst get an entry of their own
+            const burstRecords = closeTypingBurst();
+            const entries = buildJournalEntries(takeJournalRecords(), burstRecords);
+            if (!entries.length) return false;
+            for (const entry of entries) {
+                window.undoStack.push(entry);
             }
+            window.redoStack = [];
+            trimUndoJournal();
+            scheduleEditorState(false);
+            return true;
         }
         """
 
@@ -828,34 +1285,27 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         return """
         function performUndo() {
             const editor = document.getElementById('editor');
-            if (window.undoStack.length > 1) {
-                let selection = window.getSelection();
-                let range = selection.rangeCount > 0 ? selection.getRangeAt(0) : null;
-                let cursorNode = range ? range.startContainer : null;
-                let cursorOffset = range ? range.startOffset : 0;
-
-                window.redoStack.push(window.undoStack.pop());
-                window.isUndoRedo = true;
-                editor.innerHTML = window.undoStack[window.undoStack.length - 1];
-                window.lastContent = editor.innerHTML;
-                window.isUndoRedo = false;
+            // Like typing, history waits for a running Replace All (see find.py)
+            if (replaceAllJob) {
+                return { success: false, isInitialState: isJournalAtBaseline() };
+            }
+            flushTypingBurst();
+            absorbPendingRecords();
+            if (window.undoStack.length > 0) {
+                const entry = window.undoStack.pop();
+                const lastOp = applyJournalEntry(entry, true);
+                window.redoStack.push(entry);
+                scheduleEditorState(false);
 
                 editor.focus();
                 try {
-                    const newRange = document.createRange();
-                    const sel = window.getSelection();
-                    const textNode = findLastTextNode(editor) || editor;
-                    const offset = textNode.nodeType === 3 ? textNode.length : 0;
-                    newRange.setStart(textNode, offset);
-                    newRange.setEnd(textNode, offset);
-                    sel.removeAllRanges();
-                    sel.addRange(newRange);
+                    restoreJournalCaret(lastOp, true);
                 } catch (e) {
                     console.log("Could not restore cursor position:", e);
                 }
-                return { success: true, isInitialState: window.undoStack.length === 1 };
+                return { success: true, isInitialState: isJournalAtBaseline() };
             }
-            return { success: false, isInitialState: window.undoStack.length === 1 };
+            return { success: false, isInitialState: isJournalAtBaseline() };
         }
         """
 
@@ -864,35 +1314,27 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         return """
         function performRedo() {
             const editor = document.getElementById('editor');
+            // Like typing, history waits for a running Replace All (see find.py)
+            if (replaceAllJob) {
+                return { success: false, isInitialState: isJournalAtBaseline() };
+            }
+            flushTypingBurst();
+            absorbPendingRecords();
             if (window.redoStack.length > 0) {
-                let selection = window.getSelection();
-                let range = selection.rangeCount > 0 ? selection.getRangeAt(0) : null;
-                let cursorNode = range ? range.startContainer : null;
-                let cursorOffset = range ? range.startOffset : 0;
-
-                const state = window.redoStack.pop();
-                window.undoStack.push(state);
-                window.isUndoRedo = true;
-                editor.innerHTML = state;
-                window.lastContent = editor.innerHTML;
-                window.isUndoRedo = false;
+                const entry = window.redoStack.pop();
+                const lastOp = applyJournalEntry(entry, false);
+                window.undoStack.push(entry);
+                scheduleEditorState(false);
 
                 editor.focus();
                 try {
-                    const newRange = document.createRange();
-                    const sel = window.getSelection();
-                    const textNode = findLastTextNode(editor) || editor;
-                    const offset = textNode.nodeType === 3 ? textNode.length : 0;
-                    newRange.setStart(textNode, offset);
-                    newRange.setEnd(textNode, offset);
-                    sel.removeAllRanges();
-                    sel.addRange(newRange);
+                    restoreJournalCaret(lastOp, false);
                 } catch (e) {
                     console.log("Could not restore cursor position:", e);
                 }
-                return { success: true, isInitialState: window.undoStack.length === 1 };
+                return { success: true, isInitialState: isJournalAtBaseline() };
             }
-            return { success: false, isInitialState: window.undoStack.length === 1 };
+            return { success: false, isInitialState: isJournalAtBaseline() };
         }
         """
 
@@ -915,14 +1357,180 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         function getStackSizes() {
             return {
                 undoSize: window.undoStack.length,
-                redoSize: window.redoStack.length
+                redoSize: window.redoStack.length,
+                journalBytes: trimUndoJournal()
             };
         }
         """
 
+    def editor_state_js(self):
+        """JavaScript that pushes the coalesced editor state to Python."""
+        return """
+        window.editorState = { modified: false, pending: false, selectionCollapsed: true };
+
+        // Post at most one editorState message per animation frame
+        function scheduleEditorState(contentChanged) {
+            const state = window.editorState;
+            if (contentChanged) state.modified = true;
+            if (state.pending) return;
+            state.pending = true;
+            requestAnimationFrame(postEditorState);
+        }
+
+        function postEditorState() {
+            const state = window.editorState;
+            state.pending = false;
+            const selection = window.getSelection();
+            const collapsed = selection.rangeCount === 0 || selection.isCollapsed;
+            state.selectionCollapsed = collapsed;
+            const message = {
+                modified: state.modified,
+                undoSize: window.undoStack.length,
+                redoSize: window.redoStack.length,
+                atBaseline: isJournalAtBaseline(),
+                selection: {
+                    collapsed: collapsed,
+                    chars: collapsed ? 0 : selection.toString().length
+                },
+                journalBytes: trimUndoJournal(),
+                keystrokes: window.keystrokeStats.count
+            };
+            state.modified = false;
+            try {
+                window.webkit.messageHandlers.editorState.postMessage(JSON.stringify(message));
+            } catch(e) {
+                console.log("Could not send editor state:", e);
+            }
+        }
+
+        document.addEventListener('selectionchange', function() {
+            // Only a selection that is or was non-empty changes the summary
+            const selection = window.getSelection();
+            const collapsed = selection.rangeCount === 0 || selection.isCollapsed;
+            if (!collapsed || !window.editorState.selectionCollapsed) {
+                scheduleEditorState(false);
+            }
+        });
+        """
+
+    def export_document_js(self):
+        """JavaScript that streams the editor content to Python for saving."""
+        return """
+        // Serialize the editor a top-level block at a time and post the HTML
+        // to the exportChunk handler in pieces of about EXPORT_CHUNK_CHARS,
+        // as "<id> chunk\\n<html>", then "<id> done\\n" (or "<id> error\\n<message>").
+        // Elements with many children are opened and descended into, so a
+        // document wrapped in one <div> still streams. The whole document
+        // never exists as a single string.
+        const EXPORT_CHUNK_CHARS = 256 * 1024;
+        const EXPORT_SPLIT_CHILDREN = 32;
+
+        function escapeExportText(text) {
+            return text.replace(/&/g, '&amp;').replace(/</g, '&lt;')
+                       .replace(/>/g, '&gt;').replace(/\\u00a0/g, '&nbsp;');
+        }
+
+        function exportDocument(id) {
+            const handler = window.webkit.messageHandlers.exportChunk;
+            const editor = document.getElementById('editor');
+            let parts = [];
+            let size = 0;
+
+            function emit(html) {
+                parts.push(html);
+                size += html.length;
+                if (size >= EXPORT_CHUNK_CHARS) flush();
+            }
+
+            function flush() {
+                if (parts.length) handler.postMessage(id + ' chunk\\n' + parts.join(''));
+                parts = [];
+                size = 0;
+            }
+
+            function serialize(node) {
+                if (node.nodeType === Node.TEXT_NODE) {
+                    emit(escapeExportText(node.data));
+                } else if (node.nodeType === Node.COMMENT_NODE) {
+                    emit('<!--' + node.data + '-->');
+                } else if (node.nodeType !== Node.ELEMENT_NODE) {
+                    return;
+                } else if (node.childNodes.length > EXPORT_SPLIT_CHILDREN) {
+                    const shell = node.cloneNode(false).outerHTML;
+                    const closeAt = shell.lastIndexOf('</');
+                    emit(shell.slice(0, closeAt));
+                    for (let child = node.firstChild; child; child = child.nextSibling) {
+                        serialize(child);
+                    }
+                    emit(shell.slice(closeAt));
+                } else {
+                    emit(node.outerHTML);
+                }
+            }
+
+            try {
+                for (let node = editor.firstChild; node; node = node.nextSibling) {
+                    serialize(node);
+                }
+                flush();
+                handler.postMessage(id + ' done\\n');
+            } catch (e) {
+                handler.postMessage(id + ' error\\n' + e);
+            }
+            return true;
+        }
+        """
+
     def set_content_js(self):
         """JavaScript to set the editor content and reset stacks."""
         return """
+        // Fetch a staged document and insert its top-level blocks a batch per
+        // animation frame, so the first screen shows before the rest is added.
+        // documentsLoaded counts completed loads (read by benchmark.py).
+        function loadDocument(url) {
+            const editor = document.getElementById('editor');
+            // A later load supersedes this one, even while it is still inserting
+            const generation = window.documentLoadGeneration = (window.documentLoadGeneration || 0) + 1;
+            return fetch(url).then(function(response) {
+                if (!response.ok) throw new Error("Document request failed: " + response.status);
+                return response.text();
+            }).then(function(html) {
+                if (generation !== window.documentLoadGeneration) return false;
+                const template = document.createElement('template');
+                template.innerHTML = html;
+                const fragment = template.content;
+                editor.innerHTML = '';
+                return new Promise(function(resolve) {
+                    function insertBatch() {
+                        if (generation !== window.documentLoadGeneration) {
+                            resolve(false);
+                            return;
+                        }
+                        const deadline = performance.now() + 8;
+                        while (fragment.firstChild && performance.now() < deadline) {
+                            editor.appendChild(fragment.firstChild);
+                        }
+                        if (fragment.firstChild) {
+                            requestAnimationFrame(insertBatch);
+                            return;
+                        }
+                        if (!editor.firstChild) {
+                            editor.innerHTML = '<div><br></div>';
+                        }
+                        resetUndoJournal();
+                        editor.focus();
+                        window.documentsLoaded = (window.documentsLoaded || 0) + 1;
+                        resolve(true);
+                    }
+                    insertBatch();
+                });
+            }).catch(function(e) {
+                console.log("Could not load document:", e);
+                return false;
+            });
+        }
+
+
         function setContent(html) {
             const editor = document.getElementById('editor');
             if (!html || html.trim() === '') {
@@ -932,9 +1540,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             } else {
                 editor.innerHTML = html;
             }
-            window.lastContent = editor.innerHTML;
-            window.undoStack = [window.lastContent];
-            window.redoStack = [];
+            resetUndoJournal();
             editor.focus();
         }
         """
@@ -1318,26 +1924,80 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         """
 
     def setup_input_handler_js(self):
-        """JavaScript to handle input events and content changes."""
+        """JavaScript to handle input events and content changes.
+
+        Changes are detected from the undo journal's MutationObserver rather
+        than by serializing the document, so the cost of a keystroke does not
+        grow with the document. window.keystrokeStats records that cost.
+        """
         return """
+        window.keystrokeStats = { count: 0, totalMs: 0, maxMs: 0, overBudget: 0, budgetMs: 2 };
+        function typingBurstKind(e) {
+            switch (e.inputType) {
+                case 'insertText':
+                    return 'insert';
+                case 'deleteContentBackward':
+                case 'deleteContentForward':
+                    return 'delete';
+                default:
+                    return null;
+            }
+        }
+
+        function recordKeystrokeCost(elapsed) {
+            const stats = window.keystrokeStats;
+            stats.count++;
+            stats.totalMs += elapsed;
+            if (elapsed > stats.maxMs) stats.maxMs = elapsed;
+            if (elapsed > stats.budgetMs) stats.overBudget++;
+        }
+
+        function getKeystrokeStats() {
+            const stats = window.keystrokeStats;
+            return {
+                count: stats.count,
+                averageMs: stats.count ? stats.totalMs / stats.count : 0,
+                maxMs: stats.maxMs,
+                overBudget: stats.overBudget,
+                budgetMs: stats.budgetMs
+            };
+        }
+
         function setupInputHandler(editor) {
+            // Close the open burst before an edit of a different kind lands
+            editor.addEventListener('beforeinput', function(e) {
+                const burst = window.typingBurst;
+                if (burst.kind && burst.kind !== typingBurstKind(e)) {
+                    saveState();
+                }
+            });
+
             editor.addEventListener('input', function(e) {
+                const start = performance.now();
                 if (document.getSelection().anchorNode === editor) {
                     document.execCommand('formatBlock', false, 'div');
                 }
                 if (!window.isUndoRedo) {
-                    const currentContent = editor.innerHTML;
-                    if (currentContent !== window.lastContent) {
-                        saveState();
-                        window.lastContent = currentContent;
-                        window.redoStack = [];
-                        try {
-                            window.webkit.messageHandlers.contentChanged.postMessage("changed");
-                        } catch(e) {
-                            console.log("Could not notify about changes:", e);
+                    const recordCount = collectJournalRecords();
+                    if (recordCount > 0) {
+                        const kind = typingBurstKind(e);
+                        const burst = window.typingBurst;
+                        if (kind && (!burst.kind || burst.kind === kind)) {
+                            burst.kind = kind;
+                            burst.recordCount = recordCount;
+                            if (kind === 'insert' && /[\\s.,;:!?]/.test(e.data || '')) {
+                                saveState();
+                            } else {
+                                if (burst.timer) clearTimeout(burst.timer);
+                                burst.timer = setTimeout(saveState, window.typingPauseMs);
+                            }
+                        } else {
+                            saveState();
                         }
+                        scheduleEditorState(true);
                     }
                 }
+                recordKeystrokeCost(performance.now() - start);
             });
         }
         """
@@ -1357,7 +2017,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             setupInputHandler(editor);
             
             // Initialize content state
-            window.lastContent = editor.innerHTML;
+            startUndoJournal(editor);
             saveState();
             editor.focus();
             
@@ -1365,12 +2025,14 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             if (window.initialContent) {
                 setContent(window.initialContent);
             }
+            
+            // Only listened to when started with --profile-startup
+            try {
+                window.webkit.messageHandlers.editorReady.postMessage("ready");
+            } catch(e) {}
         });
         """
         
-    def get_initial_html(self):
-        return self.get_editor_html('<div><font face="Sans" style="font-size: 11pt;"><br></font></div>')
-    
     def execute_js(self, win, script):
         """Execute JavaScript in the WebView"""
         win.webview.evaluate_javascript(script, -1, None, None, None, None, None)
@@ -1390,78 +2052,41 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
     
     # Undo/Redo related methods
     def on_content_changed(self, win, manager, result):
-        # Check current modified state before changing it
-        was_modified = win.modified
-        
-        # Set new state and update window title
-        win.modified = True
-        self.update_window_title(win)
-        self.update_undo_redo_state(win)
+        """Mark the document modified for code paths that post contentChanged directly"""
+        self._apply_editor_state(win, {'modified': True})
+
+    def on_editor_state_changed(self, win, manager, result):
+        """Apply the coalesced editor state pushed by the page"""
+        try:
+            if hasattr(result, 'get_js_value'):
+                message = result.get_js_value().to_string()
+            else:
+                message = result.to_string()
+            state = json.loads(message)
+        except Exception as e:
+            print(f"Error reading editor state: {e}")
+            return
+        self._apply_editor_state(win, state)
+
+    def _apply_editor_state(self, win, state):
+        """Update only the widgets whose backing value changed"""
+        previous = win.editor_state
         
-        # Only update window menu if the modified state changed
-        if not was_modified:  # If it wasn't modified before but now is
+        if state.get('modified') and not win.modified:
+            win.modified = True
+            self.update_window_title(win)
             self.update_window_menu()
         
-    def update_undo_redo_state(self, win):
-        try:
-            # Get stack sizes to update button states
-            win.webview.evaluate_javascript(
-                "JSON.stringify(getStackSizes());",  # Ensure we get a proper JSON string
-                -1, None, None, None,
-                lambda webview, result, data: self._on_get_stack_sizes(win, webview, result, data), 
-                None
-            )
-        except Exception as e:
-            print(f"Error updating undo/redo state: {e}")
-            # Fallback - enable buttons
-            win.undo_button.set_sensitive(True)
-            win.redo_button.set_sensitive(False)
+        if 'undoSize' in state and state['undoSize'] != previous.get('undoSize'):
+            win.undo_button.set_sensitive(state['undoSize'] > 0)
+        if 'redoSize' in state and state['redoSize'] != previous.get('redoSize'):
+            win.redo_button.set_sensitive(state['redoSize'] > 0)
         
-    def _on_get_stack_sizes(self, win, webview, result, user_data):
-        try:
-            js_result = webview.evaluate_javascript_finish(result)
-            if js_result:
-                # Try different approaches to get the result based on WebKit version
-                try:
-                    # Newer WebKit APIs
-                    if hasattr(js_result, 'get_js_value'):
-                        stack_sizes = js_result.get_js_value().to_string()
-                    # Direct value access - works in some WebKit versions
-                    elif hasattr(js_result, 'to_string'):
-                        stack_sizes = js_result.to_string()
-                    elif hasattr(js_result, 'get_string'):
-                        stack_sizes = js_result.get_string()
-                    else:
-                        # Fallback - try converting to string directly
-                        stack_sizes = str(js_result)
-                    
-                    # Parse the JSON result
-                    import json
-                    try:
-                        # Remove any surrounding quotes if present
-                        if stack_sizes.startswith('"') and stack_sizes.endswith('"'):
-                            stack_sizes = stack_sizes[1:-1]
-                        
-                        # Try to parse as JSON
-                        sizes = json.loads(stack_sizes)
-                        # Update button states
-                        win.undo_button.set_sensitive(sizes.get('undoSize', 0) > 1)
-                        win.redo_button.set_sensitive(sizes.get('redoSize', 0) > 0)
-                    except json.JSONDecodeError as je:
-                        print(f"Error parsing JSON: {je}, value was: {stack_sizes}")
-                        # Set reasonable defaults
-                        win.undo_button.set_sensitive(True)
-                        win.redo_button.set_sensitive(False)
-                except Exception as inner_e:
-                    print(f"Inner error processing JS result: {inner_e}")
-                    # Set reasonable defaults
-                    win.undo_button.set_sensitive(True)
-                    win.redo_button.set_sensitive(False)
-        except Exception as e:
-            print(f"Error getting stack sizes: {e}")
-            # Set reasonable defaults in case of error
-            win.undo_button.set_sensitive(True)
-            win.redo_button.set_sensitive(False)
+        previous.update(state)
+        
+    def update_undo_redo_state(self, win):
+        """Ask the page to push a fresh editor state"""
+        self.execute_js(win, "scheduleEditorState(false);")
             
     def on_undo_clicked(self, win, button):
         self.perform_undo(win)
@@ -1530,8 +2155,6 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
                         
                         # Only update window menu if modified state changed
                         self.update_window_menu()
-                    
-                    self.update_undo_redo_state(win)
                 else:
                     win.statusbar.set_text(f"No more {operation} actions available")
         except Exception as e:
@@ -1604,12 +2227,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             # Save and then close
             if win.current_file:
                 # We have a file path, save directly
-                win.webview.evaluate_javascript(
-                    "document.getElementById('editor').innerHTML;",
-                    -1, None, None, None,
-                    lambda webview, result, data: self._on_save_before_close(win, webview, result, data),
-                    None
-                )
+                self._save_before_close(win)
             else:
                 # No file path, show save dialog
                 dialog = Gtk.FileDialog()
@@ -1634,33 +2252,20 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             win.close()
         # If response is "cancel", do nothing and keep the window open
 
-    def _on_save_before_close(self, win, webview, result, data):
-        """Save the content and then close the window"""
+    def _save_before_close(self, win):
+        """Save the document and then close the window"""
         try:
-            js_result = webview.evaluate_javascript_finish(result)
-            if js_result:
-                editor_content = (js_result.get_js_value().to_string() if hasattr(js_result, 'get_js_value') else
-                               js_result.to_string() if hasattr(js_result, 'to_string') else str(js_result))
-                
-                # Define a callback that will close the window after saving
-                def after_save(file, result):
-                    try:
-                        success, _ = file.replace_contents_finish(result)
-                        if success:
-                            win.modified = False  # Mark as unmodified
-                            self.update_window_title(win)
-                            # Now close the window
-                            self.remove_window(win)
-                            win.close()
-                    except Exception as e:
-                        print(f"Error during save before close: {e}")
-                        # Close anyway in case of error
-                        self.remove_window(win)
-                        win.close()
-                
-                self.save_html_content(win, editor_content, win.current_file, after_save)
+            # Define a callback that will close the window after saving;
+            # on failure the window stays open with the error in the statusbar
+            def after_save(success, error):
+                if success:
+                    self.remove_window(win)
+                    win.close()
+            
+            # Streamed from the page in the file's own format
+            self.save_to_file(win, win.current_file, after_save)
         except Exception as e:
-            print(f"Error getting HTML content: {e}")
+            print(f"Error saving before close: {e}")
             # Close anyway in case of error
             self.remove_window(win)
             win.close()
@@ -1684,12 +2289,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             file = dialog.save_finish(result)
             if file:
                 win.current_file = file
-                win.webview.evaluate_javascript(
-                    "document.getElementById('editor').innerHTML;",
-                    -1, None, None, None,
-                    lambda webview, result, data: self._on_save_before_close(win, webview, result, data),
-                    None
-                )
+                self._save_before_close(win)
             else:
                 # User cancelled save dialog, keep window open
                 pass
@@ -1785,6 +2385,11 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         close_other_windows_action.connect("activate", self.on_close_other_windows)
         self.add_action(close_other_windows_action)
 
+        # Folder-wide search and replace
+        batch_replace_action = Gio.SimpleAction.new("batch-replace", None)
+        batch_replace_action.connect("activate", self.on_batch_replace)
+        self.add_action(batch_replace_action)
+
         # Window switching action
         switch_window_action = Gio.SimpleAction.new(
             "switch-window", 
@@ -1990,6 +2595,8 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         if window in self.windows:
             # Remove window from list
             self.windows.remove(window)
+            # Its conversion output and images go with it
+            self.cleanup_temp_files(window)
             # Clean up button reference
             if id(window) in self.window_buttons:
                 del self.window_buttons[id(window)]
@@ -2050,13 +2657,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             # Save and then close this window
             if win.current_file:
                 # We have a file path, save directly
-                win.webview.evaluate_javascript(
-                    "document.getElementById('editor').innerHTML;",
-                    -1, None, None, None,
-                    lambda webview, result, data: self._on_save_continue_quit(
-                        win, webview, result, windows_with_changes),
-                    None
-                )
+                self._save_continue_quit(win, windows_with_changes)
             else:
                 # No file path, show save dialog
                 dialog = Gtk.FileDialog()
@@ -2093,51 +2694,30 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             # Continue with other windows that might be open but not modified
             pass
 
-    def _on_save_continue_quit(self, win, webview, result, windows_with_changes):
-        """Save the content, close this window, and continue with the quit process"""
+    def _save_continue_quit(self, win, windows_with_changes):
+        """Save the document, close this window, and continue with the quit process"""
         try:
-            js_result = webview.evaluate_javascript_finish(result)
-            if js_result:
-                editor_content = (js_result.get_js_value().to_string() if hasattr(js_result, 'get_js_value') else
-                               js_result.to_string() if hasattr(js_result, 'to_string') else str(js_result))
+            # Define a callback for after saving
+            def after_save(success, error):
+                if not success:
+                    print(f"Error saving during quit: {error}")
                 
-                # Define a callback for after saving
-                def after_save(file, result):
-                    try:
-                        success, _ = file.replace_contents_finish(result)
-                        if success:
-                            win.modified = False  # Mark as unmodified
-                            self.update_window_title(win)
-                        
-                        # Close this window
-                        self.remove_window(win)
-                        win.close()
-                        
-                        # Continue with remaining windows
-                        remaining_windows = windows_with_changes[1:]
-                        if remaining_windows:
-                            GLib.idle_add(lambda: self._handle_quit_with_unsaved_changes(remaining_windows))
-                        elif not self.windows:
-                            # If all windows are closed, quit the application
-                            self.quit()
-                    except Exception as e:
-                        print(f"Error saving during quit: {e}")
-                        # Close anyway and continue
-                        self.remove_window(win)
-                        win.close()
-                        
-                        # Continue with remaining windows
-                        remaining_windows = windows_with_changes[1:]
-                        if remaining_windows:
-                            GLib.idle_add(lambda: self._handle_quit_with_unsaved_changes(remaining_windows))
-                        elif not self.windows:
-                            # If all windows are closed, quit the application
-                            self.quit()
+                # Close this window
+                self.remove_window(win)
+                win.close()
                 
-                # Save with our callback
-                self.save_html_content(win, editor_content, win.current_file, after_save)
+                # Continue with remaining windows
+                remaining_windows = windows_with_changes[1:]
+                if remaining_windows:
+                    GLib.idle_add(lambda: self._handle_quit_with_unsaved_changes(remaining_windows))
+                elif not self.windows:
+                    # If all windows are closed, quit the application
+                    self.quit()
+            
+            # Save with our callback, streamed from the page
+            self.save_to_file(win, win.current_file, after_save)
         except Exception as e:
-            print(f"Error getting HTML content during quit: {e}")
+            print(f"Error saving during quit: {e}")
             # Close anyway and continue
             self.remove_window(win)
             win.close()
@@ -2156,13 +2736,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             file = dialog.save_finish(result)
             if file:
                 win.current_file = file
-                win.webview.evaluate_javascript(
-                    "document.getElementById('editor').innerHTML;",
-                    -1, None, None, None,
-                    lambda webview, result, data: self._on_save_continue_quit(
-                        win, webview, result, windows_with_changes),
-                    None
-                )
+                self._save_continue_quit(win, windows_with_changes)
             else:
                 # User cancelled save dialog, cancel quit for this window
                 # but continue with other windows that might need attention
@@ -2320,6 +2894,33 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         interval_box.append(spinner)
         content_box.append(interval_box)
         
+        # Conversion cache
+        cache_section = Gtk.Label()
+        cache_section.set_markup("<b>Documents</b>")
+        cache_section.set_halign(Gtk.Align.START)
+        cache_section.set_margin_bottom(12)
+        cache_section.set_margin_top(24)
+        content_box.append(cache_section)
+        
+        cache_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=12)
+        cache_box.set_margin_start(12)
+        
+        cache_label = Gtk.Label(label="Conversion Cache:")
+        cache_label.set_halign(Gtk.Align.START)
+        cache_label.set_hexpand(True)
+        
+        cache_size_label = Gtk.Label(label=GLib.format_size(conversion_cache.cache_size()))
+        cache_size_label.add_css_class("dim-label")
+        
+        clear_cache_button = Gtk.Button(label="Clear")
+        clear_cache_button.set_valign(Gtk.Align.CENTER)
+        clear_cache_button.connect("clicked", lambda btn: self.clear_conversion_cache(active_win, cache_size_label))
+        
+        cache_box.append(cache_label)
+        cache_box.append(cache_size_label)
+        cache_box.append(clear_cache_button)
+        content_box.append(cache_box)
+        
         # Dialog buttons
         button_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
         button_box.set_halign(Gtk.Align.END)
@@ -2354,6 +2955,12 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         if hasattr(win, 'preferences_dialog'):
             win.preferences_dialog = None
 
+    def clear_conversion_cache(self, win, size_label):
+        """Remove cached LibreOffice conversions"""
+        conversion_cache.clear()
+        size_label.set_text(GLib.format_size(conversion_cache.cache_size()))
+        win.statusbar.set_text("Conversion cache cleared")
+
     def save_preferences(self, dialog, win, auto_save_enabled, auto_save_interval):
         """Save preferences settings"""
         previous_auto_save = win.auto_save_enabled
@@ -2396,43 +3003,21 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
 
     def auto_save(self, win):
         """Perform auto-save if needed"""
-        if win.modified and win.current_file:
+        # PDF is an export; autosaving it would reopen the page setup dialog
+        if (win.modified and win.current_file and
+                not win.current_file.get_path().lower().endswith('.pdf')):
             win.statusbar.set_text("Auto-saving...")
-            win.webview.evaluate_javascript(
-                "document.getElementById('editor').innerHTML;",
-                -1, None, None, None,
-                lambda webview, result, file: self._on_get_html_content_auto_save(win, webview, result, win.current_file),
-                None
-            )
+            # The document streams from the page into the file in its own format
+            self.save_to_file(win, win.current_file,
+                              lambda success, error: self._on_auto_save_completed(win, success, error))
         return win.auto_save_enabled  # Continue timer if enabled
 
-    def _on_get_html_content_auto_save(self, win, webview, result, file):
-        """Handle auto-save content retrieval"""
-        try:
-            js_result = webview.evaluate_javascript_finish(result)
-            if js_result:
-                editor_content = (js_result.get_js_value().to_string() if hasattr(js_result, 'get_js_value') else
-                                js_result.to_string() if hasattr(js_result, 'to_string') else str(js_result))
-                
-                self.save_html_content(win, editor_content, file, 
-                                      lambda file, result: self._on_auto_save_completed(win, file, result))
-        except Exception as e:
-            print(f"Error getting HTML content for auto-save: {e}")
-            win.statusbar.set_text(f"Auto-save failed: {e}")
-
-    def _on_auto_save_completed(self, win, file, result):
+    def _on_auto_save_completed(self, win, success, error):
         """Handle auto-save completion"""
-        try:
-            success, _ = file.replace_contents_finish(result)
-            if success:
-                win.modified = False  # Reset modified flag after save
-                self.update_window_title(win)
-                win.statusbar.set_text(f"Auto-saved at {GLib.DateTime.new_now_local().format('%H:%M:%S')}")
-            else:
-                win.statusbar.set_text("Auto-save failed")
-        except GLib.Error as error:
-            print(f"Error during auto-save: {error.message}")
-            win.statusbar.set_text(f"Auto-save failed: {error.message}")
+        if success:
+            win.statusbar.set_text(f"Auto-saved at {GLib.DateTime.new_now_local().format('%H:%M:%S')}")
+        else:
+            win.statusbar.set_text(f"Auto-save failed: {error}")
 
     def show_error_dialog(self, message):
         """Show error message dialog"""
@@ -3205,6 +3790,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         win.auto_save_interval = 60
         win.current_file = None
         win.auto_save_source_id = None
+        win.editor_state = {}  # Last state pushed by the page
         
         win.set_default_size(1000, 768)
         win.set_title("Untitled - HTML Editor")
@@ -3520,23 +4106,14 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         win.paragraph_style_dropdown.set_size_request(64, -1)
         
         # ---- FONT FAMILY DROPDOWN ----
-        # Get available fonts from Pango
-        font_map = PangoCairo.FontMap.get_default()
-        font_families = font_map.list_families()
-        
-        # Create string list and sort alphabetically
-        font_names = Gtk.StringList()
-        sorted_families = sorted([family.get_name() for family in font_families])
-        
-        # Add all fonts in alphabetical order
-        for family in sorted_families:
-            font_names.append(family)
-        
-        # Create dropdown with fixed width
+        # Create dropdown with fixed width and type-to-filter search. All
+        # windows share the app's font catalog, which fills in the background
         win.font_dropdown = Gtk.DropDown()
         win.font_dropdown.set_tooltip_text("Font Family")
         win.font_dropdown.set_focus_on_click(False)
-        win.font_dropdown.set_model(font_names)
+        win.font_dropdown.set_model(self.font_catalog)
+        win.font_dropdown.set_expression(Gtk.PropertyExpression.new(Gtk.StringObject, None, "string"))
+        win.font_dropdown.set_enable_search(True)
 
         # Set fixed width and prevent expansion
         win.font_dropdown.set_size_request(163, -1)  # Reduced width in flat layout
@@ -3557,9 +4134,8 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             list_item.set_child(label)
         
         def bind_button_label(factory, list_item):
-            position = list_item.get_position()
             label = list_item.get_child()
-            label.set_text(font_names.get_string(position))
+            label.set_text(list_item.get_item().get_string())
         
         button_factory.connect("setup", setup_button_label)
         button_factory.connect("bind", bind_button_label)
@@ -3578,9 +4154,8 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             list_item.set_child(label)
         
         def bind_list_label(factory, list_item):
-            position = list_item.get_position()
             label = list_item.get_child()
-            label.set_text(font_names.get_string(position))
+            label.set_text(list_item.get_item().get_string())
         
         list_factory.connect("setup", setup_list_label)
         list_factory.connect("bind", bind_list_label)
@@ -3598,8 +4173,10 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         # ---- FONT SIZE DROPDOWN ----
         # Create string list for font sizes
         font_sizes = Gtk.StringList()
-        for size in [6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 18, 20, 21, 22, 24, 26, 28, 32, 36, 40, 42, 44, 48, 54, 60, 66, 72, 80, 88, 96]:
+        win.font_size_index = {}
+        for position, size in enumerate([6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 18, 20, 21, 22, 24, 26, 28, 32, 36, 40, 42, 44, 48, 54, 60, 66, 72, 80, 88, 96]):
             font_sizes.append(str(size))
+            win.font_size_index[str(size)] = position
         
         # Create dropdown
         win.font_size_dropdown = Gtk.DropDown()
@@ -4135,7 +4712,6 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         win.webview = WebKit.WebView()
         win.webview.set_vexpand(True)
         win.webview.set_hexpand(True) 
-        win.webview.load_html(self.get_editor_html(), None)
         settings = win.webview.get_settings()
         try:
             settings.set_enable_developer_extras(True)
@@ -4148,11 +4724,29 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             user_content_manager.connect("script-message-received::contentChanged", 
                                         lambda mgr, res: self.on_content_changed(win, mgr, res))
             
+            # Coalesced modified flag, undo/redo depths and selection summary
+            user_content_manager.register_script_message_handler("editorState")
+            user_content_manager.connect("script-message-received::editorState", 
+                                        lambda mgr, res: self.on_editor_state_changed(win, mgr, res))
+            
             # Add handler for formatting changes
             user_content_manager.register_script_message_handler("formattingChanged")
             user_content_manager.connect("script-message-received::formattingChanged", 
                                         lambda mgr, res: self.on_formatting_changed(win, mgr, res))
             
+            # Match counts streamed while the search worker scans
+            user_content_manager.register_script_message_handler("searchProgress")
+            user_content_manager.connect("script-message-received::searchProgress", 
+                                        lambda mgr, res: self.on_search_progress(win, mgr, res))
+            user_content_manager.register_script_message_handler("replaceProgress")
+            user_content_manager.connect("script-message-received::replaceProgress", 
+                                        lambda mgr, res: self.on_replace_progress(win, mgr, res))
+            
+            # Document content streamed to the save engine
+            user_content_manager.register_script_message_handler("exportChunk")
+            user_content_manager.connect("script-message-received::exportChunk", 
+                                        lambda mgr, res: self.on_export_chunk(win, mgr, res))
+            
             # ADD THESE TABLE-RELATED MESSAGE HANDLERS
             user_content_manager.register_script_message_handler("tableClicked")
             user_content_manager.register_script_message_handler("tableDeleted")
@@ -4172,7 +4766,16 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         win.key_controller.connect("key-pressed", self.on_webview_key_pressed)
         win.webview.add_controller(win.key_controller)
         
-        win.webview.load_html(self.get_initial_html(), None)
+        if self.profile_startup:
+            user_content_manager = win.webview.get_user_content_manager()
+            user_content_manager.register_script_message_handler("editorReady")
+            user_content_manager.connect("script-message-received::editorReady",
+                                        lambda mgr, res: self.mark_startup('DOMContentLoaded'))
+            win.webview.connect("load-changed", lambda view, event:
+                                self.mark_startup('webview load') if event == WebKit.LoadEvent.FINISHED else None)
+        
+        # Load the editor page once, after the message handlers exist
+        win.webview.load_uri(EDITOR_PAGE_URI)
         content_box.append(win.webview)
         # Set up event to initialize RTL state when editor loads
         win.webview.connect("load-changed", lambda view, event: 
@@ -4298,6 +4901,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         self.windows.append(win)
         self.setup_spacing_actions(win)
         
+        self.mark_startup('create_window')
         return win
 ############# /Create Window
 ############### Text box related methods
@@ -4658,6 +5262,28 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         caption_check.set_active(True)
         content_box.append(caption_check)
         
+        # JPEG quality used when the image is resampled to the chosen width
+        quality_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
+        quality_label = Gtk.Label(label="JPEG quality:")
+        quality_label.set_halign(Gtk.Align.START)
+        quality_label.set_hexpand(True)
+        
+        quality_adjustment = Gtk.Adjustment(value=image_store.DEFAULT_QUALITY, lower=30, upper=100, step_increment=5)
+        quality_spin = Gtk.SpinButton()
+        quality_spin.set_adjustment(quality_adjustment)
+        
+        quality_box.append(quality_label)
+        quality_box.append(quality_spin)
+        content_box.append(quality_box)
+        
+        # Shown while the image is decoded and resampled
+        progress_bar = Gtk.ProgressBar()
+        progress_bar.set_text("Preparing image...")
+        progress_bar.set_show_text(True)
+        progress_bar.set_visible(False)
+        content_box.append(progress_bar)
+        dialog.progress_bar = progress_bar
+        
         # Button box
         button_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
         button_box.set_halign(Gtk.Align.END)
@@ -4669,6 +5295,7 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         insert_button = Gtk.Button(label="Insert")
         insert_button.add_css_class("suggested-action")
         insert_button.set_sensitive(False)  # Disabled until image is selected
+        dialog.insert_button = insert_button
         
         # Connect the insert button
         insert_button.connect("clicked", lambda btn: self._on_image_table_response(
@@ -4677,7 +5304,8 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             width_spin.get_value_as_int(),
             border_spin.get_value_as_int(),
             float_check.get_active(),
-            caption_check.get_active()
+            caption_check.get_active(),
+            quality_spin.get_value_as_int()
         ))
         
         # Connect to enable insert button when image is selected
@@ -4747,27 +5375,58 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
             if error.domain != 'gtk-dialog-error-quark' or error.code != 2:  # Ignore cancel
                 print(f"Error selecting image: {error.message}")
 
-    def _on_image_table_response(self, win, dialog, image_path, width, border_width, is_floating, add_caption):
-        """Handle response from the image table dialog"""
+    def _on_image_table_response(self, win, dialog, image_path, width, border_width, is_floating, add_caption,
+                                 quality=image_store.DEFAULT_QUALITY):
+        """Handle response from the image table dialog
+
+        The image is decoded and resampled to the chosen width on a worker
+        thread while the dialog shows progress; the original is kept in the
+        blob store for full-resolution export.
+        """
         if not image_path:
             dialog.close()
             return
         
-        # Create base64 of the image
-        import base64
-        with open(image_path, "rb") as image_file:
-            encoded_image = base64.b64encode(image_file.read()).decode("utf-8")
+        store = self.get_image_store(win)
+        state = {'closed': False}
+        dialog.connect("closed", lambda d: state.update(closed=True))
+        dialog.insert_button.set_sensitive(False)
+        dialog.progress_bar.set_visible(True)
         
-        # Get image mime type
-        import mimetypes
-        mime_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
-        
-        # Get image filename for caption
-        import os
-        filename = os.path.basename(image_path)
+        def pulse():
+            if state['closed'] or not dialog.progress_bar.get_visible():
+                return False
+            dialog.progress_bar.pulse()
+            return True
+        GLib.timeout_add(100, pulse)
         
-        dialog.close()
+        def image_ready(image_uri, error):
+            dialog.progress_bar.set_visible(False)
+            if state['closed']:
+                return False
+            dialog.close()
+            if error:
+                win.statusbar.set_text(f"Error inserting image: {error}")
+                self.show_error_dialog(win, f"Could not insert image: {error}")
+            else:
+                self._insert_image_table(win, image_uri, os.path.basename(image_path),
+                                         width, border_width, is_floating, add_caption)
+            return False
         
+        def prepare():
+            try:
+                original_id = store.add_file(image_path)
+                resampled = image_store.prepare_image(image_path, width, quality)
+                blob_id = store.add_resampled(*resampled, original_id) if resampled else original_id
+                GLib.idle_add(image_ready, image_store.blob_uri(blob_id), None)
+            except Exception as e:
+                print(f"Error preparing image {image_path}: {e}")
+                GLib.idle_add(image_ready, None, str(e))
+        
+        file_operations.get_load_pool().submit(prepare)
+    
+    def _insert_image_table(self, win, image_uri, filename, width, border_width, is_floating, add_caption):
+        """Insert a single-cell table holding a stored image at the selection"""
         # Insert a table with the image at the current selection point
         js_code = f"""
         (function() {{
@@ -4819,9 +5478,9 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
                         containerDiv.style.overflow = 'hidden'; // Prevent overflow
                         containerDiv.style.position = 'relative'; // For absolute positioning
                         
-                        // Create the image HTML with embedded data
+                        // Create the image, served from the document's blob store
                         const img = document.createElement('img');
-                        img.src = 'data:{mime_type};base64,{encoded_image}';
+                        img.src = '{image_uri}';
                         img.style.maxWidth = '100%';
                         img.style.display = 'block';
                         img.style.width = '100%';
@@ -6287,7 +6946,6 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
                 
                 // Record state
                 saveState();
-                window.lastContent = editor.innerHTML;
                 window.redoStack = [];
                 
                 try {{
@@ -6412,7 +7070,6 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
                         
                         // Record state
                         saveState();
-                        window.lastContent = editor.innerHTML;
                         window.redoStack = [];
                         
                         try {{
@@ -6459,7 +7116,11 @@ dropdown.flat:hover { background: rgba(127, 127, 127, 0.25); }
         win.webview.grab_focus()
 def main():
     app = HTMLEditorApp()
-    return app.run(sys.argv)
+    argv = sys.argv
+    if '--profile-startup' in argv:
+        app.profile_startup = True
+        argv = [arg for arg in argv if arg != '--profile-startup']
+    return app.run(argv)
 
 if __name__ == "__main__":
     Adw.init()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# image_store.py - document images kept out of the editor's HTML
+"""
+Content-addressed storage for the images in open documents.
+
+While a document is edited, its images live as files in a per-document store
+and the HTML refers to them as htmleditor://editor/blob/<sha256>.<ext>, which
+the app serves from the store. The DOM, undo history, autosaves and searches
+then carry a short URI instead of megabytes of base64.
+
+Images are brought in when a document is loaded (data: URLs, files next to an
+HTML file, MHTML parts) or inserted, and written back out only on export:
+inlined as data: URLs, copied into a folder next to the file, or packaged as
+MHTML parts.
+
+Inserted images are resampled to the size they are shown at (prepare_image).
+The store remembers the original of each resampled image, so an export can
+still use full resolution.
+
+A store lives as long as its window. An image pasted from another document is
+copied into the pasting window's store when the page first asks for it
+(claim), so closing the source window cannot break it. Store directories carry
+the owning process id, and those left behind by a process that died are
+removed when the next store is created.
+"""
+
+import atexit
+import base64
+import email.header
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import threading
+import urllib.parse
+import uuid
+
+BLOB_URI_PREFIX = 'htmleditor://editor/blob/'
+BLOB_ID = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]{1,8}$')
+BLOB_URI = re.compile(re.escape(BLOB_URI_PREFIX) + r'([0-9a-f]{64}\.[a-z0-9]{1,8})')
+
+# <img ... src="..."> with the attribute value as group 3
+IMG_SRC = re.compile(r'(<img\b[^>]*?\bsrc\s*=\s*)(["\'])(.*?)\2', re.IGNORECASE | re.DOTALL)
+DATA_URL = re.compile(r'^data:(image/[\w.+-]+);base64,(.*)$', re.IGNORECASE | re.DOTALL)
+
+EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/svg+xml': '.svg',
+    'image/bmp': '.bmp',
+    'image/tiff': '.tif',
+}
+
+HIDPI_SCALE = 2  # Pixels per CSS pixel kept for inserted images
+DEFAULT_QUALITY = 85  # JPEG quality for resampled images
+
+STORE_PREFIX = 'htmleditor-images-'
+
+_stores = []
+_stores_lock = threading.Lock()
+_swept = False
+
+
+def mime_type_for(blob_id):
+    """Return the MIME type of a blob from its extension"""
+    return mimetypes.guess_type('x' + os.path.splitext(blob_id)[1])[0] or 'application/octet-stream'
+
+
+class ImageStore:
+    """The images of one document, as files named by their SHA-256"""
+
+    def __init__(self):
+        global _swept
+        self.root = tempfile.mkdtemp(prefix=f'{STORE_PREFIX}{os.getpid()}-')
+        self.originals = {}  # Resampled blob id -> blob id of the original
+        with _stores_lock:
+            _stores.append(self)
+            sweep, _swept = not _swept, True
+        if sweep:
+            threading.Thread(target=sweep_stale_stores, name='image-store-sweep', daemon=True).start()
+
+    def add_bytes(self, data, mime_type):
+        """Store image data and return its blob id"""
+        extension = EXTENSIONS.get(mime_type.lower()) or mimetypes.guess_extension(mime_type) or '.bin'
+        blob_id = hashlib.sha256(data).hexdigest() + extension.lower()
+        path = os.path.join(self.root, blob_id)
+        if not os.path.exists(path):
+            fd, temp_path = tempfile.mkstemp(dir=self.root, prefix='.add-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        return blob_id
+
+    def add_file(self, path, mime_type=None):
+        """Store an image file and return its blob id"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        return self.add_bytes(data, mime_type or mimetypes.guess_type(path)[0] or 'application/octet-stream')
+
+    def adopt_file(self, blob_id, path):
+        """Store a file already known to hold blob_id, without hashing it again"""
+        if not BLOB_ID.match(blob_id):
+            raise ValueError(f"Not a blob id: {blob_id}")
+        target = os.path.join(self.root, blob_id)
+        if not os.path.exists(target):
+            fd, temp_path = tempfile.mkstemp(dir=self.root, prefix='.add-')
+            os.close(fd)
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, target)
+        return blob_id
+
+    def add_resampled(self, data, mime_type, original_id):
+        """Store a resampled image, remembering which blob it was made from"""
+        blob_id = self.add_bytes(data, mime_type)
+        if blob_id != original_id:
+            self.originals[blob_id] = original_id
+        return blob_id
+
+    def add_image(self, data, mime_type):
+        """Store image data and return the URI the editor refers to it by"""
+        return BLOB_URI_PREFIX + self.add_bytes(data, mime_type)
+
+    def path(self, blob_id):
+        """Return the file holding a blob, or None if this store lacks it"""
+        if not BLOB_ID.match(blob_id):
+            return None
+        path = os.path.join(self.root, blob_id)
+        return path if os.path.exists(path) else None
+
+    def claim(self, blob_id):
+        """Return the file for a blob, copying it in from another open store
+
+        Used when the page asks for an image, so a document keeps the images
+        pasted into it after their source document is closed.
+        """
+        path = self.path(blob_id)
+        if path:
+            return path
+        foreign = find_blob(blob_id)
+        if foreign is None:
+            return None
+        try:
+            self.adopt_file(blob_id, foreign)
+            # Keep the full-resolution original with it, for exports
+            original_id = original_blob(blob_id)
+            original = find_blob(original_id) if original_id != blob_id else None
+            if original:
+                self.adopt_file(original_id, original)
+                self.originals[blob_id] = original_id
+        except OSError as e:
+            # The other store was removed meanwhile
+            print(f"Could not copy image {blob_id}: {e}")
+        return self.path(blob_id)
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        with _stores_lock:
+            if self in _stores:
+                _stores.remove(self)
+
+
+def blob_uri(blob_id):
+    return BLOB_URI_PREFIX + blob_id
+
+
+def find_blob(blob_id):
+    """Return the file for a blob from any open store, or None
+
+    Blobs are named by content, so a copy pasted between documents resolves
+    from whichever store has it.
+    """
+    with _stores_lock:
+        stores = list(_stores)
+    for store in stores:
+        path = store.path(blob_id)
+        if path:
+            return path
+    return None
+
+
+def original_blob(blob_id):
+    """Return the blob a resampled image was made from, or blob_id itself"""
+    with _stores_lock:
+        stores = list(_stores)
+    for store in stores:
+        original_id = store.originals.get(blob_id)
+        if original_id and store.path(original_id):
+            return original_id
+    return blob_id
+
+
+def sweep_stale_stores():
+    """Remove store directories left behind by editor processes that died"""
+    temp_dir = tempfile.gettempdir()
+    try:
+        names = os.listdir(temp_dir)
+    except OSError:
+        return
+    for name in names:
+        if not name.startswith(STORE_PREFIX):
+            continue
+        pid = name[len(STORE_PREFIX):].split('-', 1)[0]
+        if not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(temp_dir, name), ignore_errors=True)
+        except OSError:
+            pass  # Running, or not ours to check
+
+
+def cleanup_all():
+    """Remove every store; called when the application exits"""
+    with _stores_lock:
+        stores = list(_stores)
+    for store in stores:
+        store.cleanup()
+
+
+atexit.register(cleanup_all)
+
+
+# ---- Bringing images into a store ----
+
+def absorb_data_urls(html, store):
+    """Move images embedded as data: URLs into store"""
+    if 'data:' not in html:
+        return html
+
+    def replace(match):
+        data_url = DATA_URL.match(match.group(3))
+        if not data_url:
+            return match.group(0)
+        try:
+            data = base64.b64decode(re.sub(r'\s+', '', data_url.group(2)), validate=True)
+        except ValueError:
+            return match.group(0)
+        uri = store.add_image(data, data_url.group(1).lower())
+        return f'{match.group(1)}{match.group(2)}{uri}{match.group(2)}'
+
+    return IMG_SRC.sub(replace, html)
+
+
+def absorb_file_images(html, base_dir, store):
+    """Move images referenced by relative path or file: URL into store"""
+
+    def replace(match):
+        src = match.group(3)
+        parsed = urllib.parse.urlparse(src)
+        if parsed.scheme == 'file':
+            path = urllib.parse.unquote(parsed.path)
+        elif parsed.scheme or src.startswith('//') or not src:
+            return match.group(0)
+        else:
+            path = os.path.join(base_dir, urllib.parse.unquote(parsed.path))
+        path = os.path.normpath(path)
+        mime_type = mimetypes.guess_type(path)[0]
+        if not mime_type or not mime_type.startswith('image/') or not os.path.isfile(path):
+            return match.group(0)
+        try:
+            uri = blob_uri(store.add_file(path, mime_type))
+        except OSError:
+            return match.group(0)
+        return f'{match.group(1)}{match.group(2)}{uri}{match.group(2)}'
+
+    return IMG_SRC.sub(replace, html)
+
+
+def prepare_image(path, display_width, quality=DEFAULT_QUALITY, scale=HIDPI_SCALE):
+    """Decode and resample an image for display at display_width CSS pixels
+
+    Returns (data, mime_type) of the re-encoded image, or None when the
+    original should be used as is: it is no wider than display_width * scale,
+    or it is an SVG or GIF (vector, or possibly animated). JPEG decoders
+    downscale while decoding, so large photos never exist at full size in
+    memory. Meant to run on a worker thread.
+    """
+    mime_type = mimetypes.guess_type(path)[0]
+    if mime_type in ('image/svg+xml', 'image/gif'):
+        return None
+
+    import gi
+    gi.require_version('GdkPixbuf', '2.0')
+    from gi.repository import GdkPixbuf
+
+    info, width, height = GdkPixbuf.Pixbuf.get_file_info(path)
+    if info is None:
+        return None
+    target = max(1, int(display_width * scale))
+    if width <= target and height <= target:
+        return None
+
+    pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(path, min(width, target), -1, True)
+    if pixbuf.get_option('orientation') in ('5', '6', '7', '8'):
+        # Rotated a quarter turn: the stored height is the displayed width
+        if height <= target:
+            return None
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(path, -1, target, True)
+    elif width <= target:
+        return None
+    pixbuf = pixbuf.apply_embedded_orientation() or pixbuf
+
+    if pixbuf.get_has_alpha() or mime_type == 'image/png':
+        success, data = pixbuf.save_to_bufferv('png', ['compression'], ['6'])
+        mime_type = 'image/png'
+    else:
+        success, data = pixbuf.save_to_bufferv('jpeg', ['quality'], [str(int(quality))])
+        mime_type = 'image/jpeg'
+    if not success:
+        return None
+    return bytes(data), mime_type
+
+
+# ---- Writing images out on export ----
+
+def _export_blob(blob_id, full_resolution):
+    """Return (blob id, file) to write for a blob, or (blob_id, None) if it is missing"""
+    if full_resolution:
+        blob_id = original_blob(blob_id)
+    return blob_id, find_blob(blob_id)
+
+
+def inline_blobs(html, full_resolution=False):
+    """Replace blob URIs with data: URLs, for a self-contained document"""
+    def replace(match):
+        blob_id, path = _export_blob(match.group(1), full_resolution)
+        if not path:
+            return match.group(0)
+        with open(path, 'rb') as f:
+            data = base64.b64encode(f.read()).decode('ascii')
+        return f'data:{mime_type_for(blob_id)};base64,{data}'
+
+    return BLOB_URI.sub(replace, html)
+
+
+def package_blobs(html, target_dir, folder_name, full_resolution=False):
+    """Copy the images into target_dir/folder_name and point the HTML at them"""
+    copied = {}
+
+    def replace(match):
+        if match.group(1) not in copied:
+            blob_id, path = _export_blob(match.group(1), full_resolution)
+            if not path:
+                return match.group(0)
+            os.makedirs(os.path.join(target_dir, folder_name), exist_ok=True)
+            # A prefix of the hash keeps names short and still unique in practice
+            name = blob_id[:16] + os.path.splitext(blob_id)[1]
+            shutil.copyfile(path, os.path.join(target_dir, folder_name, name))
+            copied[match.group(1)] = urllib.parse.quote(f'{folder_name}/{name}')
+        return copied[match.group(1)]
+
+    return BLOB_URI.sub(replace, html)
+
+
+MHTML_LINE_BYTES = 57  # Raw bytes per 76-character base64 line
+MHTML_READ_BYTES = MHTML_LINE_BYTES * 1024
+
+
+def _base64_lines(chunks):
+    """Yield base64 lines (bytes) for data arriving as bytes chunks"""
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        whole = len(pending) - len(pending) % MHTML_LINE_BYTES
+        if whole:
+            data = memoryview(pending)[:whole]
+            yield b''.join(base64.b64encode(data[i:i + MHTML_LINE_BYTES]) + b'\n'
+                           for i in range(0, whole, MHTML_LINE_BYTES))
+            pending = pending[whole:]
+    if pending:
+        yield base64.b64encode(pending) + b'\n'
+
+
+def _read_file_chunks(path):
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(MHTML_READ_BYTES), b''):
+            yield data
+
+
+def mhtml_chunks(html_chunks, subject='Document', full_resolution=False):
+    """Yield an MHTML archive (bytes) of an HTML document arriving in pieces
+
+    Each image becomes a part whose Content-Location is its blob URI, so the
+    HTML is stored unchanged and readers resolve the references themselves.
+    The pieces are encoded as they arrive and must not split a blob URI;
+    the images referenced along the way are appended once the HTML is done.
+    """
+    boundary = f'----=_htmleditor_{uuid.uuid4().hex}'
+    separator = f'\n--{boundary}\n'.encode('ascii')
+    yield (f'Subject: {email.header.Header(subject, "utf-8").encode()}\n'
+           'MIME-Version: 1.0\n'
+           f'Content-Type: multipart/related; type="text/html"; boundary="{boundary}"\n'
+           '\n'
+           'This is a multi-part message in MIME format.\n').encode('ascii')
+
+    referenced = {}
+
+    def html_bytes():
+        for chunk in html_chunks:
+            referenced.update(dict.fromkeys(BLOB_URI.findall(chunk)))
+            yield chunk.encode('utf-8')
+
+    yield separator
+    yield (b'Content-Type: text/html; charset="utf-8"\n'
+           b'MIME-Version: 1.0\n'
+           b'Content-Transfer-Encoding: base64\n'
+           b'Content-Location: index.html\n\n')
+    yield from _base64_lines(html_bytes())
+
+    for referenced_id in referenced:
+        blob_id, path = _export_blob(referenced_id, full_resolution)
+        if not path:
+            continue
+        yield separator
+        yield (f'Content-Type: {mime_type_for(blob_id)}\n'
+               'MIME-Version: 1.0\n'
+               'Content-Transfer-Encoding: base64\n'
+               f'Content-Location: {blob_uri(referenced_id)}\n\n').encode('ascii')
+        yield from _base64_lines(_read_file_chunks(path))
+
+    yield f'\n--{boundary}--\n'.encode('ascii')
+
+
+def build_mhtml(html_document, subject='Document', full_resolution=False):
+    """Return an MHTML archive (bytes) of an HTML document and its images"""
+    return b''.join(mhtml_chunks([html_document], subject, full_resolution))
@@ -1003,16 +1003,7 @@ def table_floating_js(self):
 def table_event_handlers_js(self):
     """JavaScript for table event handlers with handle hiding during editing and tab navigation"""
     return """
-    // Function to save editor state
-    function saveState() {
-        const editor = document.getElementById('editor');
-        if (!editor) return;
-        
-        window.undoStack.push(editor.innerHTML);
-        if (window.undoStack.length > 100) {
-            window.undoStack.shift();
-        }
-    }
+    // saveState() comes from the editor's undo journal
     
     // Function to handle dark mode changes
     function handleColorSchemeChange(e) {
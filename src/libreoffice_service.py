@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# libreoffice_service.py - a long-lived LibreOffice for document conversions
+"""
+Runs one headless soffice in the background and converts documents through
+it over UNO, so a conversion does not pay for starting LibreOffice each time.
+
+The listener is started by the first conversion. It accepts connections on a
+named pipe private to this process and uses its own user profile, so it is
+never handed off to (or blocked by) a LibreOffice the user has open. Jobs are
+queued and run one at a time on a worker thread. Before each job the
+connection is checked, and LibreOffice is restarted if it has died. After
+IDLE_TIMEOUT seconds without work it is shut down, to be started again by the
+next conversion.
+
+The UNO Python bridge (python3-uno) is optional. Without it, or when the
+listener cannot be started, convert() returns None and the caller falls back
+to a one-shot `libreoffice --convert-to`. A document the running service
+fails on, or that times out, raises ConversionFailed instead: running it
+again through a one-shot process would only fail or hang a second time.
+"""
+
+import atexit
+import importlib
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+STARTUP_TIMEOUT = 30  # Seconds to wait for a new soffice to accept connections
+JOB_TIMEOUT = 60  # Seconds a conversion may run once the worker starts it
+QUEUE_TIMEOUT = 600  # Seconds a conversion may wait behind others before it is given up
+POLL_INTERVAL = 0.25  # Seconds between checks of a waiting caller's cancel event
+IDLE_TIMEOUT = 300  # Seconds without jobs before soffice is shut down
+MAX_START_FAILURES = 2  # Failed starts before the service is given up on
+
+# Export filter for each output format convert() accepts
+EXPORT_FILTERS = {
+    'html': 'HTML (StarWriter)',
+    'pdf': 'writer_pdf_Export',
+    'odt': 'writer8',
+    'docx': 'MS Word 2007 XML',
+    'doc': 'MS Word 97',
+    'rtf': 'Rich Text Format',
+    'txt': 'Text',
+}
+
+_uno = None
+_uno_checked = False
+
+
+def _load_uno():
+    """Import the UNO bridge on first use; returns None if it is not installed"""
+    global _uno, _uno_checked
+    if not _uno_checked:
+        try:
+            _uno = importlib.import_module('uno')
+        except ImportError:
+            _uno = None
+        _uno_checked = True
+    return _uno
+
+
+def _soffice_path():
+    return shutil.which('soffice') or shutil.which('libreoffice')
+
+
+class ConversionFailed(Exception):
+    """The service ran a conversion and it failed or timed out"""
+
+
+class ConversionJob:
+    """One queued conversion
+
+    started is set when the worker takes the job up, done when result holds
+    the output path.
+    """
+
+    def __init__(self, input_path, output_dir, output_format, cancel=None):
+        self.input_path = os.path.abspath(input_path)
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.cancel = cancel or threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.started = threading.Event()
+        self.done = threading.Event()
+
+
+class LibreOfficeService:
+    """A headless soffice listener and the queue of jobs it works through"""
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.worker = None
+        self.process = None
+        self.desktop = None
+        self.current_job = None
+        self.profile_dir = None
+        self.pipe_name = f'htmleditor-{os.getpid()}'
+        self.start_failures = 0
+
+    def available(self):
+        """Whether conversions can be attempted through the service"""
+        return (self.start_failures < MAX_START_FAILURES and
+                _load_uno() is not None and _soffice_path() is not None)
+
+    def convert(self, input_path, output_dir, output_format='html', timeout=JOB_TIMEOUT, cancel=None):
+        """Convert input_path into output_dir and return the output file's path
+
+        Blocks until the job is done. Returns None when the service is not
+        available, the format has no export filter, or the job was cancelled.
+        Raises ConversionFailed when the conversion failed, timed out, or
+        waited QUEUE_TIMEOUT seconds without being started. The timeout
+        counts from when the worker starts the job, not from when it was
+        queued behind other conversions. Setting the cancel event drops a
+        queued job and aborts a running one.
+        """
+        if output_format not in EXPORT_FILTERS or not self.available():
+            return None
+
+        job = ConversionJob(input_path, output_dir, output_format, cancel)
+        with self.lock:
+            # Queued under the lock so an idle worker cannot exit past it
+            self.jobs.put(job)
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, name='libreoffice-service', daemon=True)
+                self.worker.start()
+
+        # Waiting in slices lets a cancel from the caller take effect at once
+        queued_until = time.monotonic() + QUEUE_TIMEOUT
+        while not job.started.wait(POLL_INTERVAL):
+            if job.cancel.is_set() or time.monotonic() > queued_until:
+                with self.lock:
+                    if not job.started.is_set():
+                        # Never started: the worker will skip it
+                        job.cancelled = True
+                        if job.cancel.is_set():
+                            return None
+                        raise ConversionFailed("LibreOffice service is busy; gave up waiting to convert "
+                                               f"{input_path}")
+                break
+
+        deadline = time.monotonic() + timeout
+        while not job.done.wait(POLL_INTERVAL):
+            if job.cancel.is_set() or time.monotonic() > deadline:
+                with self.lock:
+                    if job.done.is_set():
+                        break
+                    job.cancelled = True
+                    running = self.current_job is job
+                if running:
+                    if job.cancel.is_set():
+                        print(f"Cancelled converting {input_path}; restarting LibreOffice")
+                    # Killing soffice makes the worker's pending UNO call fail
+                    self._kill()
+                if job.cancel.is_set():
+                    return None
+                raise ConversionFailed(f"LibreOffice service timed out converting {input_path}")
+        if job.error:
+            raise ConversionFailed(job.error)
+        return job.result
+
+    def shutdown(self):
+        """Stop the worker and LibreOffice and remove the private profile"""
+        with self.lock:
+            if self.worker is not None and self.worker.is_alive():
+                self.jobs.put(None)
+            self.worker = None
+        self._stop()
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def _run(self):
+        while True:
+            try:
+                job = self.jobs.get(timeout=IDLE_TIMEOUT)
+            except queue.Empty:
+                with self.lock:
+                    if self.jobs.empty():
+                        self.worker = None
+                        self._stop()
+                        return
+                continue
+            if job is None:
+                return
+            with self.lock:
+                if job.cancelled or job.cancel.is_set():
+                    job.done.set()
+                    continue
+                self.current_job = job
+                job.started.set()
+            try:
+                job.result = self._convert(job)
+            finally:
+                with self.lock:
+                    self.current_job = None
+                job.done.set()
+
+    def _convert(self, job):
+        # A second attempt after a restart covers a listener that died idle
+        for attempt in range(2):
+            desktop = self._ensure_running()
+            if desktop is None or job.cancelled or job.cancel.is_set():
+                return None
+            try:
+                return self._store(desktop, job)
+            except Exception as e:
+                if job.cancelled:
+                    return None
+                if self._healthy():
+                    job.error = f"LibreOffice service could not convert {job.input_path}: {e}"
+                    return None
+                print("LibreOffice service stopped responding; restarting it")
+                self._kill()
+        return None
+
+    def _store(self, desktop, job):
+        uno = _load_uno()
+
+        def prop(name, value):
+            value_struct = uno.createUnoStruct('com.sun.star.beans.PropertyValue')
+            value_struct.Name = name
+            value_struct.Value = value
+            return value_struct
+
+        base_name = os.path.splitext(os.path.basename(job.input_path))[0]
+        output_path = os.path.join(job.output_dir, f"{base_name}.{job.output_format}")
+        document = desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(job.input_path), '_blank', 0,
+            (prop('Hidden', True), prop('ReadOnly', True)))
+        if document is None:
+            raise RuntimeError("LibreOffice could not open the document")
+        try:
+            document.storeToURL(
+                uno.systemPathToFileUrl(output_path),
+                (prop('FilterName', EXPORT_FILTERS[job.output_format]), prop('Overwrite', True)))
+        finally:
+            try:
+                document.close(True)
+            except Exception:
+                document.dispose()
+        return output_path
+
+    def _healthy(self):
+        """Check that soffice is running and still answers over the bridge"""
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getFrames()
+            return True
+        except Exception:
+            return False
+
+    def _ensure_running(self):
+        """Return the Desktop of a running listener, starting one if needed"""
+        if self._healthy():
+            return self.desktop
+        self._kill()
+
+        uno = _load_uno()
+        if self.profile_dir is None:
+            self.profile_dir = tempfile.mkdtemp(prefix='htmleditor-libreoffice-')
+        connection = f'pipe,name={self.pipe_name};urp;StarOffice.ComponentContext'
+        cmd = [
+            _soffice_path(),
+            '--headless', '--invisible', '--nologo', '--norestore', '--nodefault', '--nolockcheck',
+            f'-env:UserInstallation={uno.systemPathToFileUrl(self.profile_dir)}',
+            f'--accept={connection}',
+        ]
+        try:
+            self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            print(f"Could not start the LibreOffice service: {e}")
+            self.start_failures += 1
+            return None
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline and self.process.poll() is None:
+            try:
+                context = resolver.resolve(f'uno:{connection}')
+                self.desktop = context.ServiceManager.createInstanceWithContext(
+                    'com.sun.star.frame.Desktop', context)
+                self.start_failures = 0
+                return self.desktop
+            except Exception:
+                time.sleep(0.25)
+
+        print("LibreOffice service did not start; using one-shot conversions")
+        self.start_failures += 1
+        self._kill()
+        return None
+
+    def _stop(self):
+        """Ask soffice to exit, killing it if it does not"""
+        desktop, process = self.desktop, self.process
+        self.desktop = None
+        if desktop is not None:
+            try:
+                desktop.terminate()
+            except Exception:
+                pass
+        if process is not None:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        self.process = None
+
+    def _kill(self):
+        process = self.process
+        self.desktop = None
+        self.process = None
+        if process is not None and process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """Return the process-wide service, created on first use"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = LibreOfficeService()
+        return _service
+
+
+def convert(input_path, output_dir, output_format='html', cancel=None):
+    """Convert through the shared service; None means use the one-shot fallback
+
+    Raises ConversionFailed when the service ran the conversion and it failed.
+    """
+    return get_service().convert(input_path, output_dir, output_format, cancel=cancel)
+
+
+def shutdown():
+    """Stop the shared service if it was started"""
+    if _service is not None:
+        _service.shutdown()
+
+
+atexit.register(shutdown)
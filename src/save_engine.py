@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# save_engine.py - atomic, coalesced document writes off the main thread
+"""
+Every document save goes through one SaveEngine.
+
+A save names a target path, a function producing the bytes to write and a
+callback. The bytes are produced and written on a worker thread: into a
+temporary file next to the target, flushed and fsync'd, then renamed over the
+target. A crash or a full disk therefore leaves either the old file or the
+new one, never a truncated mix.
+
+Saves to a path that is already being written coalesce. Only the most recent
+waiting request runs once the current write finishes, and every request it
+replaced is reported with that write's outcome, since its content is covered
+by the later state. Repeated Ctrl+S or an autosave during a manual save thus
+cost at most one extra write.
+
+Callbacks receive (success, error message or None) and run through the
+dispatch function given to the engine, so the GTK app gets them on the main
+loop.
+
+produce may return an iterable of byte chunks instead of bytes; each chunk is
+written as it arrives. Together with a ChunkStream fed from the main loop, a
+document streams from the editor page into the file without ever being held
+whole.
+"""
+
+import os
+import queue
+import stat
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SAVE_POOL_SIZE = 2
+STREAM_TIMEOUT = 60  # Seconds a streamed save waits for its next chunk
+
+
+def atomic_write(path, data):
+    """Replace path with data so that readers see the old or new file, never a mix
+
+    data is bytes or an iterable of bytes chunks.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                f.write(data)
+            else:
+                for chunk in data:
+                    f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            # Keep the permissions of the file being replaced
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o666 & ~_umask())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    # Make the rename itself durable
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+class StreamFailed(Exception):
+    """The producer of a ChunkStream reported an error"""
+
+
+class ChunkStream:
+    """Chunks handed over by one thread and consumed, in order, by another
+
+    The producer calls put() for each chunk and then close(), or fail() with
+    a message. Iterating yields the chunks as they arrive; it raises
+    StreamFailed on fail() or when no chunk arrives within timeout seconds.
+    """
+
+    _END = object()
+
+    def __init__(self, timeout=STREAM_TIMEOUT):
+        self.queue = queue.Queue()
+        self.timeout = timeout
+
+    def put(self, chunk):
+        self.queue.put(chunk)
+
+    def close(self):
+        self.queue.put(self._END)
+
+    def fail(self, message):
+        self.queue.put(StreamFailed(message))
+
+    def __iter__(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.timeout)
+            except queue.Empty:
+                raise StreamFailed("Timed out waiting for document content")
+            if item is self._END:
+                return
+            if isinstance(item, StreamFailed):
+                raise item
+            yield item
+
+
+class SaveRequest:
+    """One requested save and the callbacks waiting on its outcome"""
+
+    def __init__(self, path, produce, callback):
+        self.path = os.path.abspath(path)
+        self.produce = produce
+        self.callbacks = [callback] if callback else []
+
+
+class SaveEngine:
+    """Runs saves on worker threads, one write at a time per target path"""
+
+    def __init__(self, dispatch=None):
+        self.dispatch = dispatch or (lambda callback, *args: callback(*args))
+        self.lock = threading.Lock()
+        self.pending = {}  # path -> request waiting behind the running write, or None
+        self.pool = ThreadPoolExecutor(max_workers=SAVE_POOL_SIZE, thread_name_prefix='save')
+
+    def save(self, path, produce, callback=None):
+        """Write produce() to path; callback(success, error) reports the outcome
+
+        produce runs on the worker thread and returns bytes or an iterable
+        of bytes; an exception raised while producing fails the save like a
+        write error does, and leaves the target untouched.
+        """
+        request = SaveRequest(path, produce, callback)
+        with self.lock:
+            if request.path in self.pending:
+                # A write is running: wait behind it, replacing any waiting request
+                replaced = self.pending[request.path]
+                if replaced is not None:
+                    request.callbacks = replaced.callbacks + request.callbacks
+                self.pending[request.path] = request
+                return
+            self.pending[request.path] = None
+        self.pool.submit(self._run, request)
+
+    def is_saving(self, path):
+        with self.lock:
+            return os.path.abspath(path) in self.pending
+
+    def _run(self, request):
+        while request is not None:
+            try:
+                atomic_write(request.path, request.produce())
+                success, error = True, None
+            except Exception as e:
+                print(f"Error saving {request.path}: {e}")
+                success, error = False, str(e)
+            for callback in request.callbacks:
+                self.dispatch(callback, success, error)
+            with self.lock:
+                path = request.path
+                request = self.pending.get(path)
+                if request is None:
+                    del self.pending[path]
+                else:
+                    self.pending[path] = None
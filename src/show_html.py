@@ -203,10 +203,10 @@ def apply_html_changes(self, win, dialog, text_buffer, is_full_html):
         end_iter = text_buffer.get_end_iter()
         html_content = text_buffer.get_text(start_iter, end_iter, True)
         
-        # Escape for JavaScript
-        js_content = html_content.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
-        
         if is_full_html:
+            # Escape for JavaScript
+            js_content = html_content.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            
             # For full HTML, extract just the content of the editor from the full HTML
             # This is a more conservative approach that doesn't try to replace the entire page
             js_code = """
@@ -242,9 +242,10 @@ def apply_html_changes(self, win, dialog, text_buffer, is_full_html):
                 None
             )
         else:
-            # For editor content only, set only the editor's content
-            js_code = f'setContent("{js_content}");'
-            self.execute_js(win, js_code)
+            # For editor content only, hand the body to the page out of band
+            if html_content.strip() and not re.match(r'\s*<(div|p|h[1-6]|ul|ol|table)', html_content, re.IGNORECASE):
+                html_content = f"<div>{html_content}</div>"
+            self.execute_js(win, self.stage_document_content(win, html_content))
         
         # Mark document as modified
         win.modified = True
@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+import batch_replace  # noqa: E402
+
+ENTITIES = '<p>Tom &amp; Jerry&nbsp;at &copy;</p>'
+
+
+def replace_in(tmp_path, content, search, replacement, **options):
+    path = tmp_path / 'doc.html'
+    path.write_text(content, encoding='utf-8')
+    result = batch_replace.process_file(str(path), dict(options, search=search, replacement=replacement))
+    assert result['error'] is None
+    return path.read_text(encoding='utf-8'), result
+
+
+def test_entity_names_are_not_matched(tmp_path):
+    text, result = replace_in(tmp_path, ENTITIES, 'a', 'X')
+    assert text == '<p>Tom &amp; Jerry&nbsp;Xt &copy;</p>'
+    assert result['matches'] == 1
+
+
+def test_whole_word_skips_entity_names(tmp_path):
+    text, result = replace_in(tmp_path, ENTITIES, 'copy', 'Z', whole_word=True)
+    assert text == ENTITIES
+    assert result['matches'] == 0
+
+
+def test_nbsp_matches_a_space(tmp_path):
+    text, result = replace_in(tmp_path, ENTITIES, 'Jerry at', 'Spike')
+    assert text == '<p>Tom &amp; Spike &copy;</p>'
+    assert result['snippets'] == [['Tom & ', 'Jerry at', ' ©']]
+
+
+def test_references_match_their_characters(tmp_path):
+    text, _ = replace_in(tmp_path, ENTITIES, '& Jerry', 'and Jerry')
+    assert text == '<p>Tom and Jerry&nbsp;at &copy;</p>'
+    text, _ = replace_in(tmp_path, ENTITIES, '©', '(c)')
+    assert text == '<p>Tom &amp; Jerry&nbsp;at (c)</p>'
+
+
+def test_replacements_are_escaped_in_both_modes(tmp_path):
+    text, _ = replace_in(tmp_path, '<p>a1</p>', '1', '<b>&</b>')
+    assert text == '<p>a&lt;b&gt;&amp;&lt;/b&gt;</p>'
+    text, _ = replace_in(tmp_path, '<p>a1</p>', r'(\d)', r'<b>\1</b>', regex=True)
+    assert text == '<p>a&lt;b&gt;1&lt;/b&gt;</p>'
+
+
+def test_text_files_are_matched_as_is(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('Tom &amp; Jerry', encoding='utf-8')
+    batch_replace.process_file(str(path), {'search': '&amp;', 'replacement': '<&>'})
+    assert path.read_text(encoding='utf-8') == 'Tom <&> Jerry'